@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Saves and loads a large setup using config_xml.
+
+A setup with 100 MRCs and 16 devices per MRC is generated from the known
+device profiles. The setup is serialized using the minidom pretty printing
+round trip (the previous implementation, used as reference) and the
+streaming serializer. Both outputs must be identical. The setup is then
+written to a file and read back using both a complete ElementTree (the
+previous reader) and the incremental iterparse based read_setup(). The loaded
+setups are compared against the original. Finally the setup is written and
+read using the binary format of config_binary.
+
+Usage (from src/client): python -m benchmarks.config_xml
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from xml.dom import minidom
+from xml.etree import ElementTree as ET
+
+from mesycontrol import config_binary
+from mesycontrol import config_model as cm
+from mesycontrol import config_xml
+from mesycontrol import device_registry
+
+def make_setup(registry, n_mrcs, n_devices):
+    profiles = [p for p in registry.get_device_profiles() if len(p.get_config_parameters())]
+    setup    = cm.Setup()
+
+    for m in range(n_mrcs):
+        mrc = cm.ConfigMrc(url="mc://mrc-%03d:23000" % m)
+        mrc.name = "mrc %d" % m
+
+        for d in range(n_devices):
+            profile = profiles[(m + d) % len(profiles)]
+            bus, address = divmod(d, 16)
+            device = cm.Device(bus=bus, address=address, idc=profile.idc)
+            device.name = "%s #%d" % (profile.name, d)
+
+            for pp in profile.get_config_parameters():
+                device.set_parameter(pp.address, (m * 31 + d * 7 + pp.address) % 1000)
+
+            mrc.add_device(device)
+
+        setup.add_mrc(mrc)
+
+    return setup
+
+def build_tree(setup, names):
+    tb = config_xml.CommentTreeBuilder()
+    tb.start('mesycontrol', {'version': str(config_xml.version)})
+    config_xml._build_setup_tree(setup, names, tb)
+    tb.end('mesycontrol')
+    return ET.ElementTree(tb.close())
+
+def serialize_minidom(setup, names):
+    tree = build_tree(setup, names)
+    return minidom.parseString(ET.tostring(tree.getroot())).toprettyxml(indent='  ')
+
+def serialize_streaming(setup, names):
+    return config_xml._xml_tree_to_string(build_tree(setup, names))
+
+def measure(fn, *args):
+    """Returns (result, elapsed seconds, peak traced memory). The peak is
+    measured in a separate run as tracing slows down execution."""
+    t_start = time.perf_counter()
+    result  = fn(*args)
+    elapsed = time.perf_counter() - t_start
+
+    tracemalloc.start()
+    fn(*args)
+    peak    = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, elapsed, peak
+
+def read_setup_tree(filename):
+    """Reads the setup from a fully parsed ElementTree."""
+    setup_node = ET.parse(filename).getroot().find('setup')
+    mrcs = list()
+
+    for mrc_node in setup_node.findall('mrc_config'):
+        attrs   = dict((n.tag, n.text) for n in mrc_node if n.tag in config_xml.MRC_ATTRIBUTES)
+        devices = [config_xml._device_config_from_node(n) for n in mrc_node.findall('device_config')]
+        mrcs.append(config_xml._mrc_config_from_values(attrs, devices))
+
+    return config_xml._setup_from_values(dict(), mrcs)
+
+def compare_setups(a, b):
+    assert len(a) == len(b)
+
+    for mrc_a in a:
+        mrc_b = b.get_mrc(mrc_a.url)
+        assert mrc_b is not None, mrc_a.url
+        assert mrc_a.name == mrc_b.name
+
+        for dev_a in mrc_a:
+            dev_b = mrc_b.get_device(dev_a.bus, dev_a.address)
+            assert dev_b is not None
+            assert (dev_a.idc, dev_a.name) == (dev_b.idc, dev_b.name)
+            assert dict(dev_a.get_memory_snapshot()) == dict(dev_b.get_memory_snapshot())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mrcs', type=int, default=100)
+    parser.add_argument('--devices', type=int, default=16)
+    args = parser.parse_args()
+
+    registry = device_registry.DeviceRegistry(auto_load_modules=True)
+    names    = registry.get_parameter_name_mapping()
+    setup    = make_setup(registry, args.mrcs, args.devices)
+
+    reference, t_ref, m_ref = measure(serialize_minidom, setup, names)
+    data, t_new, m_new      = measure(serialize_streaming, setup, names)
+
+    assert data == reference, "streaming output differs from minidom output"
+
+    print("setup: %d MRCs, %d devices, %.1f MB of XML" % (
+        args.mrcs, args.mrcs * args.devices, len(data) / 1e6))
+    print("minidom round trip: %8.1f ms, peak %7.1f MB" % (t_ref * 1000.0, m_ref / 1e6))
+    print("streaming writer:   %8.1f ms, peak %7.1f MB" % (t_new * 1000.0, m_new / 1e6))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "setup.xml")
+
+        t_start = time.perf_counter()
+        config_xml.write_setup(setup, filename, names)
+        t_write = time.perf_counter() - t_start
+
+        loaded_tree, t_tree, m_tree = measure(read_setup_tree, filename)
+        loaded, t_read, m_read      = measure(config_xml.read_setup, filename)
+
+        compare_setups(setup, loaded_tree)
+        compare_setups(setup, loaded)
+
+        binary_filename = os.path.join(tmpdir, "setup" + config_binary.FILE_EXTENSION)
+
+        t_start = time.perf_counter()
+        config_binary.write_setup(setup, binary_filename)
+        t_write_binary = time.perf_counter() - t_start
+
+        loaded_binary, t_read_binary, m_read_binary = measure(
+                config_binary.read_setup, binary_filename)
+
+        compare_setups(setup, loaded_binary)
+        binary_size = os.path.getsize(binary_filename)
+
+    print("write_setup (file): %8.1f ms" % (t_write * 1000.0))
+    print("read (ElementTree): %8.1f ms, peak %7.1f MB" % (t_tree * 1000.0, m_tree / 1e6))
+    print("read_setup (file):  %8.1f ms, peak %7.1f MB" % (t_read * 1000.0, m_read / 1e6))
+    print("binary: %.2f MB, write %8.1f ms, read %8.1f ms, peak %7.1f MB" % (
+        binary_size / 1e6, t_write_binary * 1000.0, t_read_binary * 1000.0, m_read_binary / 1e6))
+    print("round trip: OK")
+
+if __name__ == "__main__":
+    main()
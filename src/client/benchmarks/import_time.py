@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Measures the import time of the headless scripting path.
+
+The module is imported in fresh interpreters using 'python -X importtime' and
+the best cumulative time of several runs is compared against the budget. The
+slowest imports of the best run are listed. In addition a script context is
+created in a fresh interpreter and the loaded modules are checked: the GUI
+modules (QtWidgets, QtGui, pyqtgraph, resources and the device widget modules)
+must not be imported.
+
+The exit status is non-zero if the budget is exceeded or GUI modules were
+loaded, so the benchmark can be used as a CI check.
+
+Usage (from src/client): python -m benchmarks.import_time [--budget-ms MS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULE      = 'mesycontrol.script'
+DEFAULT_BUDGET_MS   = 500.0
+
+GUI_MODULES = (
+    'PySide2.QtWidgets',
+    'PySide2.QtGui',
+    'pyqtgraph',
+    'mesycontrol.resources',
+    'mesycontrol.specialized_device',
+    'mesycontrol.parameter_binding',
+    'mesycontrol.gui',
+    'mesycontrol.devices.mcfd16',
+    'mesycontrol.devices.mhv4',
+    'mesycontrol.devices.mhv4_v20',
+    'mesycontrol.devices.mscf16',
+    'mesycontrol.devices.stm16',
+    )
+
+CHECK_SCRIPT = """
+import sys
+from mesycontrol.script import get_script_context
+with get_script_context() as ctx:
+    ctx.get_device_profile(27)
+    print('\\n'.join(sorted(sys.modules)))
+"""
+
+def parse_importtime(output):
+    """Returns a list of (self_us, cumulative_us, depth, name) tuples from the
+    stderr output of 'python -X importtime'."""
+    ret = list()
+
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        ret.append((int(self_us), int(cumulative_us), depth, name.strip()))
+
+    return ret
+
+def measure(module):
+    """Imports module in a fresh interpreter. Returns the parsed importtime
+    output."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True,
+            check=True)
+    return parse_importtime(result.stderr)
+
+def get_loaded_gui_modules():
+    result = subprocess.run([sys.executable, '-c', CHECK_SCRIPT],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+            check=True)
+    loaded = result.stdout.split()
+    return sorted(m for m in loaded if any(m == g or m.startswith(g + '.') for g in GUI_MODULES))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default=DEFAULT_MODULE)
+    parser.add_argument('--budget-ms', type=float,
+            default=float(os.environ.get('MESYCONTROL_IMPORT_BUDGET_MS', DEFAULT_BUDGET_MS)),
+            help="Maximum cumulative import time (default: $MESYCONTROL_IMPORT_BUDGET_MS or %g)"
+            % DEFAULT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    best = None
+
+    for i in range(args.repeat):
+        entries = measure(args.module)
+        total   = sum(e[1] for e in entries if e[2] == 0)
+
+        if best is None or total < best[0]:
+            best = (total, entries)
+
+    total_ms, entries = best[0] / 1000.0, best[1]
+
+    print("Slowest imports (cumulative, best of %d runs):" % args.repeat)
+    for self_us, cumulative_us, depth, name in sorted(entries, key=lambda e: -e[1])[:args.top]:
+        print("  %8.1f ms  %8.1f ms self  %s" % (cumulative_us / 1000.0, self_us / 1000.0, name))
+
+    print("import %s: %.1f ms (budget %.1f ms)" % (args.module, total_ms, args.budget_ms))
+
+    gui_modules = get_loaded_gui_modules()
+
+    if gui_modules:
+        print("GUI modules loaded by a script context: %s" % ', '.join(gui_modules))
+
+    ok = total_ms <= args.budget_ms and not gui_modules
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
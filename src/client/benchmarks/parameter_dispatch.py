@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Simulates a poll storm against open MCFD-16 and MSCF-16 device widgets.
+
+Every polled address of the device changes its value on each poll cycle. The
+time spent dispatching the changes to the widgets bindings is measured.
+Additionally the address indexed dispatcher is compared against connecting
+every observer to the parameter_changed signal.
+
+Usage (from src/client): QT_QPA_PLATFORM=offscreen python -m benchmarks.parameter_dispatch
+"""
+
+import argparse
+import time
+
+from mesycontrol.qt import QtWidgets
+
+from mesycontrol import app_model as am
+from mesycontrol import basic_model as bm
+from mesycontrol import device_registry
+from mesycontrol import hardware_controller
+from mesycontrol import hardware_model as hm
+from mesycontrol import model_util
+from mesycontrol import mrc_connection
+from mesycontrol import util
+
+def make_widget(registry, idc):
+    module  = registry.get_device_module(idc)
+    # The connection is never established. Poll requests queued by the
+    # widget stay in the clients queue.
+    mrc     = hm.HardwareMrc("mc://localhost:23000")
+    mrc.set_controller(hardware_controller.Controller(
+        mrc_connection.MRCConnection("localhost", 23000)))
+    hw      = hm.Device(0, 0, idc)
+    mrc.add_device(hw)
+    model_util.set_default_device_extensions(hw, registry)
+
+    for address in bm.PARAM_RANGE:
+        hw.set_cached_parameter(address, 0)
+
+    device = am.Device(0, 0, hw_device=hw, hw_module=module, cfg_module=module)
+    widget = device.make_device_widget(util.HARDWARE, util.HARDWARE)
+
+    widget._mrc = mrc # keep the MRC alive
+
+    return hw, device, widget
+
+def poll_storm(app, hw, addresses, cycles):
+    t_start = time.perf_counter()
+
+    for cycle in range(cycles):
+        for address in addresses:
+            hw.set_cached_parameter(address, cycle + 1)
+        app.processEvents()
+
+    return time.perf_counter() - t_start
+
+def bench_widgets(app, registry, cycles):
+    for idc in (26, 20): # MCFD-16, MSCF-16
+        hw, device, widget = make_widget(registry, idc)
+        profile   = registry.get_device_profile(idc)
+        addresses = list(profile.get_volatile_addresses()) or list(profile.get_static_addresses())[:16]
+        n_bindings = sum(len(getattr(w, 'bindings', [])) for w in
+                [widget] + widget.findChildren(QtWidgets.QWidget))
+
+        elapsed = poll_storm(app, hw, addresses, cycles)
+
+        print("%-8s bindings=%4d polled=%3d cycles=%d: %8.2f ms total, %6.1f us/change" % (
+            profile.name, n_bindings, len(addresses), cycles, elapsed * 1000.0,
+            elapsed * 1e6 / (cycles * len(addresses))))
+
+        widget.close()
+
+class _Observer(object):
+    def __init__(self, address):
+        self.address = address
+        self.calls   = 0
+
+    def on_filtered_change(self, address, value):
+        if address == self.address:
+            self.calls += 1
+
+    def on_change(self, address, value):
+        self.calls += 1
+
+def bench_dispatch(registry, n_observers, n_changes):
+    module = registry.get_device_module(26)
+
+    def make_device():
+        hw = hm.Device(0, 0, module.idc)
+        return hw, am.Device(0, 0, hw_device=hw, hw_module=module, cfg_module=module)
+
+    # Signal based: every observer filters every change.
+    hw, app_device = make_device()
+    observers = [_Observer(i % 256) for i in range(n_observers)]
+    for o in observers:
+        hw.parameter_changed.connect(o.on_filtered_change)
+
+    t_start = time.perf_counter()
+    for i in range(n_changes):
+        hw.set_cached_parameter(i % 256, i)
+    t_signal = time.perf_counter() - t_start
+
+    # Address indexed dispatch.
+    hw, app_device = make_device()
+    observers = [_Observer(i % 256) for i in range(n_observers)]
+    for o in observers:
+        app_device.add_hw_parameter_observer(o.address, o.on_change)
+
+    t_start = time.perf_counter()
+    for i in range(n_changes):
+        hw.set_cached_parameter(i % 256, i)
+    t_dispatch = time.perf_counter() - t_start
+
+    print("observers=%4d changes=%d: signal+filter %8.2f ms, address dispatch %8.2f ms" % (
+        n_observers, n_changes, t_signal * 1000.0, t_dispatch * 1000.0))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=200)
+    parser.add_argument('--changes', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    registry = device_registry.DeviceRegistry(auto_load_modules=True)
+
+    bench_widgets(app, registry, args.cycles)
+
+    for n in (10, 100, 500):
+        bench_dispatch(registry, n, args.changes)
+
+if __name__ == "__main__":
+    main()
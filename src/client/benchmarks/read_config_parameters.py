@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Measures config_util.read_config_parameters() driven by a GeneratorRunner.
+
+The MRC is simulated by a connection answering one request at a time after a
+configurable latency, like the real server does. The "before" run yields one
+read at a time and queues every generator step through the Qt event loop.
+The "after" run keeps READ_BATCH_SIZE reads in flight and runs steps with
+completed futures directly.
+
+Usage (from src/client): QT_QPA_PLATFORM=offscreen python -m benchmarks.read_config_parameters
+"""
+
+import argparse
+import collections
+import time
+
+from mesycontrol.qt import QtCore
+from mesycontrol.qt import QtWidgets
+
+from mesycontrol import app_model as am
+from mesycontrol import config_util
+from mesycontrol import device_registry
+from mesycontrol import future
+from mesycontrol import hardware_controller
+from mesycontrol import hardware_model as hm
+from mesycontrol import mrc_connection
+from mesycontrol import proto
+from mesycontrol import tcp_client
+
+class SimulatedConnection(mrc_connection.AbstractMrcConnection):
+    """Answers read requests with value 0, one request at a time."""
+    def __init__(self, latency_ms):
+        super(SimulatedConnection, self).__init__()
+        self.latency_ms = latency_ms
+        self.queue      = collections.deque()
+        self.current    = None
+        self.requests   = 0
+
+    def get_url(self):
+        return "mc://localhost:23000"
+
+    def is_connected(self):
+        return True
+
+    def is_connecting(self):
+        return False
+
+    def is_disconnected(self):
+        return False
+
+    def queue_request(self, msg):
+        ret = future.Future()
+        self.queue.append((msg, ret))
+
+        if self.current is None:
+            self._send_next()
+
+        return ret
+
+    def _send_next(self):
+        if len(self.queue):
+            self.current = self.queue.popleft()
+            QtCore.QTimer.singleShot(self.latency_ms, self._respond)
+        else:
+            self.current = None
+
+    def _respond(self):
+        request, f = self.current
+        self.requests += 1
+
+        response = proto.Message()
+        response.type = proto.Message.RESP_READ
+        response.response_read.bus = request.request_read.bus
+        response.response_read.dev = request.request_read.dev
+        response.response_read.par = request.request_read.par
+        response.response_read.val = 0
+
+        self._send_next()
+        f.set_result(tcp_client.RequestResult(request, response))
+
+class Runner(config_util.GeneratorRunner):
+    def _object_yielded(self, obj):
+        raise RuntimeError("unexpected object yielded: %s" % obj)
+
+def make_devices(registry, connection, idc, n_devices):
+    hw_mrc = hm.HardwareMrc(connection.get_url())
+    hw_mrc.set_controller(hardware_controller.Controller(connection))
+    app_mrc = am.AppMrc(hw_mrc.url, hw_mrc=hw_mrc)
+    module  = registry.get_device_module(idc)
+    devices = list()
+
+    for i in range(n_devices):
+        bus, address = divmod(i, 16)
+        hw = hm.Device(bus, address, idc)
+        hw_mrc.add_device(hw)
+        device = am.Device(bus, address, hw_device=hw, hw_module=module, cfg_module=module)
+        app_mrc.add_device(device)
+        devices.append(device)
+
+    return app_mrc, devices
+
+def run(app, registry, latency_ms, idc, n_devices, batch_size, max_immediate_steps):
+    connection = SimulatedConnection(latency_ms)
+    app_mrc, devices = make_devices(registry, connection, idc, n_devices)
+
+    config_util.READ_BATCH_SIZE    = batch_size
+    Runner.max_immediate_steps     = max_immediate_steps
+
+    runner  = Runner(config_util.read_config_parameters(devices))
+    t_start = time.perf_counter()
+    f       = runner.start()
+
+    while not f.done():
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+
+    f.result()
+
+    return time.perf_counter() - t_start, connection.requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--devices', type=int, default=16)
+    parser.add_argument('--idc', type=int, default=20, help="device type (default: MSCF-16)")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    registry = device_registry.DeviceRegistry(auto_load_modules=True)
+    batch_size = config_util.READ_BATCH_SIZE
+
+    for name, bs, steps in (
+            ("before (serial, queued steps)", 1, 0),
+            ("after  (batch=%d, direct steps)" % batch_size, batch_size,
+                config_util.GeneratorRunner.max_immediate_steps)):
+
+        timings = list()
+
+        for i in range(args.repeat):
+            elapsed, requests = run(app, registry, args.latency_ms, args.idc,
+                    args.devices, bs, steps)
+            timings.append(elapsed)
+
+        best = min(timings)
+        print("%-34s devices=%d reads=%d: %8.2f ms, %6.1f us/read" % (
+            name, args.devices, requests, best * 1000.0, best * 1e6 / requests))
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,17 @@
-from .mesycontrol_gui_main import mesycontrol_gui_main
-from .script import script_runner_main
+# The entry points are resolved on first access so that importing a submodule,
+# e.g. mesycontrol.script, does not pull in the GUI.
+_ENTRY_POINTS = {
+    'mesycontrol_gui_main': 'mesycontrol_gui_main',
+    'script_runner_main':   'script',
+    'monitor_main':         'monitor',
+    'fleet_runner_main':    'fleet',
+    }
+
+def __getattr__(name):
+    try:
+        module_name = _ENTRY_POINTS[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    import importlib
+    return getattr(importlib.import_module('.' + module_name, __name__), name)
@@ -22,7 +22,6 @@ __author__ = 'Florian Lüke'
 __email__  = 'f.lueke@mesytec.com'
 
 from mesycontrol.qt import QtCore
-from mesycontrol.qt import QtGui
 import contextlib
 import os
 
@@ -32,6 +31,7 @@ import mesycontrol.config_model as cm
 import mesycontrol.config_xml as config_xml
 import mesycontrol.device_registry as device_registry
 import mesycontrol.future as future
+import mesycontrol.memory_cache as memory_cache
 import mesycontrol.model_util as model_util
 from mesycontrol import util
 
@@ -48,6 +48,27 @@ class Context(QtCore.QObject):
         self.director       = am.Director(self.app_registry, self.device_registry)
 
         self._shutdown_callbacks = list()
+        self.memory_cache = None
+
+    def enable_memory_cache(self, filename=None):
+        """Enables the persistent hardware memory cache. Static device
+        parameters are stored in the given file on disconnect and used to
+        prime device memory on reconnect."""
+        if self.memory_cache is not None:
+            return self.memory_cache
+
+        if filename is None:
+            filename = os.path.join(str(QtCore.QStandardPaths.writableLocation(
+                QtCore.QStandardPaths.CacheLocation)), "hardware_memory_cache.json")
+
+        self.log.info("Using hardware memory cache %s", filename)
+
+        self.memory_cache = memory_cache.MemoryCache(filename, self.device_registry)
+        self.memory_cache.load()
+        self.memory_cache.attach(self.app_registry.hw)
+        self.add_shutdown_callback(self.memory_cache.save)
+
+        return self.memory_cache
 
     def init_device_registry(self):
         self.device_registry.load_system_modules()
@@ -239,6 +239,8 @@ class Device(AppObject):
 
     hw_parameter_changed    = Signal(int, object)
     cfg_parameter_changed   = Signal(int, object)
+    hw_memory_cleared       = Signal()
+    cfg_memory_cleared      = Signal()
 
     hw_extension_changed    = Signal(str, object)
     cfg_extension_changed   = Signal(str, object)
@@ -269,6 +271,8 @@ class Device(AppObject):
         # latter representing the unknown state.
         self._config_applied    = None  # Set by update_config_applied()
         self._config_addresses  = set() # Filled by set_module()
+        self._hw_observers      = bm.ParameterObservers()
+        self._cfg_observers     = bm.ParameterObservers()
 
         self.mrc        = mrc
         self._update_config_addresses()
@@ -289,7 +293,9 @@ class Device(AppObject):
         if old_hw is not None:
             old_hw.parameter_changed.disconnect(self.update_config_applied)
             old_hw.parameter_changed.disconnect(self.hw_parameter_changed)
+            old_hw.parameter_changed.disconnect(self._hw_observers.notify)
             old_hw.memory_cleared.disconnect(self.update_config_applied)
+            old_hw.memory_cleared.disconnect(self._on_hw_memory_cleared)
             old_hw.idc_changed.disconnect(self._on_hw_idc_changed)
             old_hw.extension_changed.disconnect(self.hw_extension_changed)
             old_hw.extension_changed.disconnect(self.update_config_applied)
@@ -297,7 +303,9 @@ class Device(AppObject):
         if new_hw is not None:
             new_hw.parameter_changed.connect(self.update_config_applied)
             new_hw.parameter_changed.connect(self.hw_parameter_changed)
+            new_hw.parameter_changed.connect(self._hw_observers.notify)
             new_hw.memory_cleared.connect(self.update_config_applied)
+            new_hw.memory_cleared.connect(self._on_hw_memory_cleared)
             new_hw.idc_changed.connect(self._on_hw_idc_changed)
             new_hw.extension_changed.connect(self.hw_extension_changed)
             new_hw.extension_changed.connect(self.update_config_applied)
@@ -310,7 +318,9 @@ class Device(AppObject):
         if old_cfg is not None:
             old_cfg.parameter_changed.disconnect(self.update_config_applied)
             old_cfg.parameter_changed.disconnect(self.cfg_parameter_changed)
+            old_cfg.parameter_changed.disconnect(self._cfg_observers.notify)
             old_cfg.memory_cleared.disconnect(self.update_config_applied)
+            old_cfg.memory_cleared.disconnect(self._on_cfg_memory_cleared)
             old_cfg.idc_changed.disconnect(self._on_cfg_idc_changed)
             old_cfg.extension_changed.disconnect(self.cfg_extension_changed)
             old_cfg.extension_changed.disconnect(self.update_config_applied)
@@ -318,11 +328,23 @@ class Device(AppObject):
         if new_cfg is not None:
             new_cfg.parameter_changed.connect(self.update_config_applied)
             new_cfg.parameter_changed.connect(self.cfg_parameter_changed)
+            new_cfg.parameter_changed.connect(self._cfg_observers.notify)
             new_cfg.memory_cleared.connect(self.update_config_applied)
+            new_cfg.memory_cleared.connect(self._on_cfg_memory_cleared)
             new_cfg.idc_changed.connect(self._on_cfg_idc_changed)
             new_cfg.extension_changed.connect(self.cfg_extension_changed)
             new_cfg.extension_changed.connect(self.update_config_applied)
 
+    def _on_hw_memory_cleared(self):
+        # The memory was replaced without per address parameter_changed
+        # signals. Observers are notified of the new values once.
+        self._hw_observers.notify_all(self._hw.get_cached_memory_ref().get)
+        self.hw_memory_cleared.emit()
+
+    def _on_cfg_memory_cleared(self):
+        self._cfg_observers.notify_all(self._cfg.get_cached_memory_ref().get)
+        self.cfg_memory_cleared.emit()
+
     def get_mrc(self):
         return None if self._mrc is None else self._mrc()
 
@@ -334,6 +356,25 @@ class Device(AppObject):
 
         return False
 
+    # ===== address indexed parameter observers ===== #
+    def add_hw_parameter_observer(self, address, callback):
+        """Registers callback(address, value) to be invoked on changes of
+        the hardware parameter at the given address. The registration persists
+        across changes of the hardware device."""
+        self._hw_observers.add(address, callback)
+
+    def remove_hw_parameter_observer(self, address, callback):
+        return self._hw_observers.remove(address, callback)
+
+    def add_cfg_parameter_observer(self, address, callback):
+        """Registers callback(address, value) to be invoked on changes of
+        the config parameter at the given address. The registration persists
+        across changes of the config device."""
+        self._cfg_observers.add(address, callback)
+
+    def remove_cfg_parameter_observer(self, address, callback):
+        return self._cfg_observers.remove(address, callback)
+
     # ===== profile ===== #
     def get_idc(self):
         if self.idc_conflict:
@@ -445,6 +486,8 @@ class Device(AppObject):
         if self.idc_conflict:
             new_state = False
         elif self.has_hw and self.has_cfg:
+            # Compared synchronously, a snapshot is not needed. Taking one
+            # would make the next polled write copy the whole memory.
             hw_mem  = self.hw.get_cached_memory_ref()
             cfg_mem = self.cfg.get_cached_memory_ref()
 
@@ -464,7 +507,9 @@ class Device(AppObject):
                 new_state = None # Unknown
 
             if new_state is True:
-                extensions_match = self.hw.get_extensions() == self.cfg.get_extensions()
+                hw_exts  = self.hw.get_extensions()
+                cfg_exts = self.cfg.get_extensions()
+                extensions_match = hw_exts is cfg_exts or hw_exts == cfg_exts
                 new_state = new_state and extensions_match
                 self.log.debug("update_config_applied: old_state=%s, new_state=%s (extension compare)",
                         old_state, new_state)
@@ -26,7 +26,7 @@ from mesycontrol.qt import Signal
 from mesycontrol.qt import QtCore
 
 import collections
-import copy
+import collections.abc
 import weakref
 
 from mesycontrol import future
@@ -71,6 +71,25 @@ class MRCRegistry(QtCore.QObject):
         self._mrcs.sort(key=lambda mrc: mrc.url)
         self.mrc_added.emit(mrc)
 
+    def add_mrcs(self, mrcs):
+        """Adds multiple MRCs at once. The MRC list is only sorted once which
+        makes this the preferred way to populate a registry from a loaded
+        setup. mrc_added is emitted for each of the MRCs."""
+        mrcs = list(mrcs)
+        urls = set(mrc.url for mrc in self._mrcs)
+
+        for mrc in mrcs:
+            if mrc.url in urls:
+                raise ValueError("MRC '%s' exists" % mrc.url)
+            urls.add(mrc.url)
+
+        self.log.debug("add_mrcs: %d MRCs", len(mrcs))
+        self._mrcs.extend(mrcs)
+        self._mrcs.sort(key=lambda mrc: mrc.url)
+
+        for mrc in mrcs:
+            self.mrc_added.emit(mrc)
+
     def remove_mrc(self, mrc):
         try:
             if mrc not in self._mrcs:
@@ -137,6 +156,29 @@ class BasicMrc(QtCore.QObject):
         self.device_added.emit(device)
         return True
 
+    def add_devices(self, devices):
+        """Adds multiple devices at once. The device list is only sorted once
+        which makes this the preferred way to populate an MRC from a loaded
+        setup. device_added is emitted for each of the devices."""
+        devices = list(devices)
+        keys    = set((d.bus, d.address) for d in self._devices)
+
+        for device in devices:
+            key = (device.bus, device.address)
+            if key in keys:
+                raise ValueError("Device at (%d, %d) exists" % key)
+            keys.add(key)
+
+        self.log.debug("add_devices: %d devices", len(devices))
+        self._devices.extend(devices)
+        self._devices.sort(key=lambda device: (device.bus, device.address))
+
+        for device in devices:
+            device.mrc = self
+            self.device_added.emit(device)
+
+        return len(devices) > 0
+
     def remove_device(self, device):
         try:
             if device not in self._devices:
@@ -200,6 +242,105 @@ class ResultFuture(future.Future):
     def __int__(self):
         return int(self.result())
 
+class MemorySnapshot(collections.abc.Mapping):
+    """Immutable view of a devices memory cache at a specific generation.
+
+    Snapshots share the memory dict of the device until the device is written
+    to the next time. The device then copies its memory before modifying it
+    (copy-on-write), so taking a snapshot is O(1) and reading from it yields a
+    coherent view of all registers.
+    """
+    def __init__(self, memory, generation):
+        self._memory    = memory
+        self.generation = generation
+
+    def __getitem__(self, address):
+        return self._memory[address]
+
+    def __iter__(self):
+        return iter(self._memory)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def __contains__(self, address):
+        return address in self._memory
+
+    def __repr__(self):
+        return "MemorySnapshot(generation=%d, %s)" % (self.generation, self._memory)
+
+class ParameterObservers(object):
+    """Address indexed dispatcher for parameter changes.
+
+    Callbacks are registered for a single parameter address and are invoked as
+    callback(address, value) for changes of that address only. Compared to
+    connecting every observer to a devices parameter_changed signal this keeps
+    the cost of a change independent of the number of observers interested in
+    other addresses.
+
+    Bound methods are referenced weakly and are dropped once their object is
+    garbage collected.
+    """
+    def __init__(self):
+        self._observers = dict() # address -> list of callback references
+
+    def add(self, address, callback):
+        if hasattr(callback, '__self__') and hasattr(callback, '__func__'):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback
+
+        self._observers.setdefault(address, list()).append(ref)
+
+    def remove(self, address, callback):
+        """Removes the first registration of callback for the given address.
+        Returns True if the callback was found, False otherwise."""
+        refs = self._observers.get(address, list())
+
+        for i, ref in enumerate(refs):
+            if ref() == callback:
+                self._remove_ref(address, i)
+                return True
+
+        return False
+
+    def notify(self, address, value):
+        refs = self._observers.get(address, None)
+
+        if not refs:
+            return
+
+        # Iterate over a copy as callbacks may add or remove observers.
+        for ref in tuple(refs):
+            callback = ref()
+
+            if callback is None:
+                try:
+                    self._remove_ref(address, self._observers[address].index(ref))
+                except (KeyError, ValueError):
+                    pass
+            else:
+                callback(address, value)
+
+    def notify_all(self, get_value):
+        """Invokes all observers with callback(address, get_value(address)).
+        Used after the memory was replaced in a single step, see
+        Device.clear_cached_memory()."""
+        for address in tuple(self._observers):
+            self.notify(address, get_value(address))
+
+    def has_observers(self, address):
+        return bool(self._observers.get(address, None))
+
+    def _remove_ref(self, address, index):
+        refs = self._observers[address]
+        del refs[index]
+        if not refs:
+            del self._observers[address]
+
+    def __len__(self):
+        return sum(len(refs) for refs in self._observers.values())
+
 class Device(QtCore.QObject):
     bus_changed         = Signal(int)
     address_changed     = Signal(int)
@@ -207,7 +348,7 @@ class Device(QtCore.QObject):
     mrc_changed         = Signal(object)
     parameter_changed   = Signal(int, object)   #: address, value
     memory_about_to_be_cleared = Signal(object) #: memory
-    memory_cleared = Signal()
+    memory_cleared = Signal()                   #: emitted instead of per address parameter_changed signals
 
     extension_added     = Signal(str, object)
     extension_changed   = Signal(str, object)
@@ -221,8 +362,10 @@ class Device(QtCore.QObject):
         self._idc       = int(idc) if idc is not None else None
         self._mrc       = None
         self._memory    = dict() # address -> value
+        self._generation = 0     # incremented on each memory modification
+        self._snapshot  = None   # last MemorySnapshot, shares self._memory
         self._read_futures = dict() # address -> future
-        self._extensions = dict() # name -> value
+        self._extensions = util.FrozenDict() # name -> value
 
     def get_bus(self):
         """Returns the devices bus number."""
@@ -365,7 +508,7 @@ class Device(QtCore.QObject):
 
         value = int(value)
         if self.get_cached_parameter(address) != value:
-            self._memory[address] = value
+            self._get_memory_for_write()[address] = value
             self.parameter_changed.emit(address, value)
             return True
 
@@ -376,7 +519,7 @@ class Device(QtCore.QObject):
         Emits parameter_changed and returns True if the parameter was present
         in the memory cache. Otherwise False is returned."""
         if self.has_cached_parameter(address):
-            del self._memory[address]
+            del self._get_memory_for_write()[address]
             self.parameter_changed.emit(address, None)
             return True
 
@@ -391,30 +534,97 @@ class Device(QtCore.QObject):
         return dict(self._memory)
 
     def get_cached_memory_ref(self):
-        """Returns a reference to the memory cache (a dictionary)."""
+        """Returns a reference to the memory cache (a dictionary).
+        The dictionary may be replaced on the next modification of the
+        memory. Use get_memory_snapshot() to keep a consistent view."""
+        return self._memory
+
+    def get_memory_snapshot(self):
+        """Returns an immutable MemorySnapshot of the current memory cache.
+        Snapshots are shared between callers until the memory changes."""
+        if self._snapshot is None or self._snapshot.generation != self._generation:
+            self._snapshot = MemorySnapshot(self._memory, self._generation)
+        return self._snapshot
+
+    def get_generation(self):
+        """Returns the memory generation counter. The counter is incremented
+        each time the memory cache is modified."""
+        return self._generation
+
+    def has_memory_changed_since(self, generation):
+        return self._generation != generation
+
+    def _get_memory_for_write(self):
+        # Copy the memory if it is shared with a snapshot.
+        if self._snapshot is not None and self._snapshot._memory is self._memory:
+            self._memory = dict(self._memory)
+        self._generation += 1
         return self._memory
 
     def clear_cached_memory(self):
         """Clears the memory cache.
+        The cache is replaced by an empty one in a single step. Instead of
+        emitting parameter_changed for each cleared address only
+        memory_about_to_be_cleared and memory_cleared are emitted. Observers
+        should refresh all of their parameters on memory_cleared.
         Returns True if any parameters where cleared. Otherwise False is
         returned. """
-        self.memory_about_to_be_cleared.emit(self.get_cached_memory())
-        ret = False
-        for address in sorted(self._memory.keys()):
-            if self.clear_cached_parameter(address):
-                ret = True
+        old_memory, self._memory = self._memory, dict()
+
+        if len(old_memory):
+            self._generation += 1
+
+        # The old memory is not referenced anymore and can be handed out
+        # without copying.
+        self.memory_about_to_be_cleared.emit(old_memory)
         self.memory_cleared.emit()
-        return ret
+        return len(old_memory) > 0
+
+    def set_cached_memory(self, memory):
+        """Replaces the memory cache with the given address -> value mapping.
+        Like clear_cached_memory() this is done in a single step and only
+        memory_about_to_be_cleared and memory_cleared are emitted instead of
+        per address parameter_changed signals. Use this to load complete
+        memory images, e.g. from setup files.
+        Returns True if the memory changed. Otherwise False is returned.
+        Raises ValueError if any address is out of range."""
+        new_memory = dict()
+
+        for address, value in memory.items():
+            if address not in PARAM_RANGE:
+                raise ValueError("Parameter address out of range")
+            new_memory[address] = int(value)
+
+        if new_memory == self._memory:
+            return False
+
+        old_memory, self._memory = self._memory, new_memory
+        self._generation += 1
+
+        self.memory_about_to_be_cleared.emit(old_memory)
+        self.memory_cleared.emit()
+        return True
 
     def set_extension(self, name, value):
+        """Sets the extension to the given value. Values are stored frozen
+        (see util.freeze()) which allows returning them from get_extension()
+        without copying.
+        Emits extension_changed and returns True if the value changes."""
         is_new    = name not in self._extensions
         cur_value = self._extensions.get(name, None)
 
+        if cur_value is value:
+            return False
+
+        value = util.freeze(value)
+
         if cur_value != value:
             self.log.debug("extension %s changes from %s to %s (is_new=%s)",
                     name, cur_value, value, is_new)
 
-            self._extensions[name] = value
+            # Copy-on-write: previously returned extension dicts are not
+            # affected by the change.
+            self._extensions = self._extensions.set(name, value)
             if is_new:
                 self.extension_added.emit(name, value)
             self.extension_changed.emit(name, value)
@@ -425,17 +635,19 @@ class Device(QtCore.QObject):
         return name in self._extensions
 
     def get_extension(self, name):
-        # Return a copy here as otherwise modifications to list and dict values
-        # would modify the extension store directly without set_extension being
-        # used. Thus the modified flag of configs would not be set.
-        return copy.deepcopy(self._extensions[name])
+        # Stored values are immutable so no copy is needed here. Modifications
+        # have to go through set_extension() which keeps the modified flag of
+        # configs intact.
+        return self._extensions[name]
 
     def get_extensions(self):
-        return dict(self._extensions)
+        """Returns an immutable dict of name -> value. The dict is shared until
+        the next modification of the extensions."""
+        return self._extensions
 
     def remove_extension(self, name):
         value = self.get_extension(name)
-        del self._extensions[name]
+        self._extensions = self._extensions.remove(name)
         self.extension_removed.emit(name, value)
         return True
 
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Compact binary format for mesycontrol setups.
+
+The format stores the same information as the XML setup files written by
+config_xml. Converting between the two formats is lossless.
+
+Layout (all integers little endian):
+    magic      b'MCSETUP\\0'
+    version    u16
+    setup      value(autoconnect), varint(n_mrcs), n_mrcs * mrc
+    mrc        value(url), value(name), value(autoconnect),
+               varint(n_devices), n_devices * device
+    device     value(idc), value(bus), value(address), value(name),
+               value(description), memory,
+               varint(n_extensions), n_extensions * (str(name), value)
+    memory     32 byte bitmap of the cached addresses, a one byte struct
+               format character ('H', 'i' or 'q') and the packed values of
+               the cached addresses in ascending order.
+    value      one byte type tag followed by the encoded value:
+               'N' None, 'i' zigzag varint, 'f' float64, 's' str,
+               'l' varint(n) + n * value, 'd' varint(n) + n * (str, value)
+    str        varint(n_bytes) + utf-8 encoded data
+
+Like in the XML format bool values are stored as ints, tuples as lists and
+dict keys are sorted.
+"""
+
+import struct
+
+import mesycontrol.basic_model as bm
+import mesycontrol.config_model as cm
+import mesycontrol.util as util
+
+MAGIC           = b'MCSETUP\0'
+version         = 1
+FILE_EXTENSION  = '.mcsetup'
+
+_BITMAP_BYTES   = (len(bm.PARAM_RANGE) + 7) // 8
+
+# Smallest first. The first format able to hold all of a devices values is
+# used.
+_MEMORY_FORMATS = [
+        ('H', 0, 0xffff),
+        ('i', -2**31, 2**31 - 1),
+        ('q', -2**63, 2**63 - 1),
+        ]
+
+class FormatError(ValueError):
+    pass
+
+def is_binary_filename(filename):
+    return isinstance(filename, str) and filename.lower().endswith(FILE_EXTENSION)
+
+def read_setup(source):
+    """Load a Setup from the given source.
+    Source may be a filename or a file like object opened in binary mode."""
+    if hasattr(source, 'read'):
+        data = source.read()
+    else:
+        with open(source, 'rb') as fp:
+            data = fp.read()
+
+    ret = setup_from_bytes(data)
+
+    if isinstance(source, (str,)):
+        ret.filename = source
+
+    ret.modified = False
+
+    return ret
+
+def write_setup(setup, dest):
+    """Write the given setup to the given destination.
+    Dest may be a filename or a file like object opened for writing in binary
+    mode. Files are written atomically."""
+    data = setup_to_bytes(setup)
+
+    if hasattr(dest, 'write'):
+        dest.write(data)
+    else:
+        util.write_file_atomic(dest, lambda fp: fp.write(data), binary=True)
+
+def setup_to_bytes(setup):
+    w = _Writer()
+    w.write(MAGIC)
+    w.write(struct.pack('<H', version))
+    w.write_value(setup.autoconnect)
+    w.write_varint(len(setup))
+
+    for mrc in setup:
+        w.write_value(mrc.url)
+        w.write_value(mrc.name)
+        w.write_value(mrc.autoconnect)
+        w.write_varint(len(mrc))
+
+        for device in mrc:
+            _write_device(w, device)
+
+    return w.getvalue()
+
+def setup_from_bytes(data):
+    r = _Reader(data)
+
+    if r.read(len(MAGIC)) != MAGIC:
+        raise FormatError("not a binary mesycontrol setup")
+
+    file_version = r.unpack('<H')
+
+    if file_version > version:
+        raise FormatError("unsupported binary setup version %d" % file_version)
+
+    ret = cm.Setup()
+    ret.autoconnect = r.read_value()
+    mrcs = list()
+
+    for i in range(r.read_varint()):
+        mrc = cm.ConfigMrc()
+        _set_attribute(mrc, 'url', r.read_value())
+        _set_attribute(mrc, 'name', r.read_value())
+        _set_attribute(mrc, 'autoconnect', r.read_value())
+        mrc.add_devices([_read_device(r) for j in range(r.read_varint())])
+        mrcs.append(mrc)
+
+    ret.add_mrcs(mrcs)
+
+    if not r.at_end():
+        raise FormatError("trailing data after setup")
+
+    return ret
+
+def _set_attribute(obj, attr, value):
+    # None values are not stored in the XML format either. The objects
+    # default is kept.
+    if value is not None:
+        setattr(obj, attr, value)
+
+def _write_device(w, device):
+    for attr in ('idc', 'bus', 'address', 'name', 'description'):
+        w.write_value(getattr(device, attr, None))
+
+    memory    = device.get_memory_snapshot()
+    addresses = sorted(memory)
+    values    = [memory[a] for a in addresses]
+    bitmap    = sum(1 << a for a in addresses)
+    fmt       = next(f for f, lo, hi in _MEMORY_FORMATS
+            if all(lo <= v <= hi for v in values))
+
+    w.write(bitmap.to_bytes(_BITMAP_BYTES, 'little'))
+    w.write(fmt.encode('ascii'))
+    w.write(struct.pack('<%d%s' % (len(values), fmt), *values))
+
+    extensions = device.get_extensions()
+    w.write_varint(len(extensions))
+
+    for name, value in extensions.items():
+        w.write_str(name)
+        w.write_value(value)
+
+def _read_device(r):
+    ret = cm.Device()
+
+    for attr in ('idc', 'bus', 'address', 'name', 'description'):
+        _set_attribute(ret, attr, r.read_value())
+
+    bitmap    = int.from_bytes(r.read(_BITMAP_BYTES), 'little')
+    addresses = [a for a in bm.PARAM_RANGE if bitmap & (1 << a)]
+    fmt       = r.read(1).decode('ascii')
+
+    if fmt not in [f for f, lo, hi in _MEMORY_FORMATS]:
+        raise FormatError("invalid memory format '%s'" % fmt)
+
+    values = r.unpack('<%d%s' % (len(addresses), fmt), single=False)
+
+    ret.set_cached_memory(dict(zip(addresses, values)))
+
+    for i in range(r.read_varint()):
+        name = r.read_str()
+        ret.set_extension(name, r.read_value())
+
+    ret.modified = False
+
+    return ret
+
+class _Writer(object):
+    def __init__(self):
+        self._buf = bytearray()
+
+    def getvalue(self):
+        return bytes(self._buf)
+
+    def write(self, data):
+        self._buf += data
+
+    def write_varint(self, n):
+        if n < 0:
+            raise ValueError("negative varint")
+
+        while n >= 0x80:
+            self._buf.append((n & 0x7f) | 0x80)
+            n >>= 7
+
+        self._buf.append(n)
+
+    def write_str(self, s):
+        data = s.encode('utf-8')
+        self.write_varint(len(data))
+        self._buf += data
+
+    def write_value(self, value):
+        if value is None:
+            self._buf += b'N'
+        elif isinstance(value, str):
+            self._buf += b's'
+            self.write_str(value)
+        elif isinstance(value, int):
+            self._buf += b'i'
+            self.write_varint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+        elif isinstance(value, float):
+            self._buf += b'f'
+            self._buf += struct.pack('<d', value)
+        elif isinstance(value, (list, tuple)):
+            self._buf += b'l'
+            self.write_varint(len(value))
+            for v in value:
+                self.write_value(v)
+        elif isinstance(value, dict):
+            self._buf += b'd'
+            self.write_varint(len(value))
+            for k in sorted(value.keys()):
+                self.write_str(k)
+                self.write_value(value[k])
+        else:
+            raise TypeError("write_value: unhandled value type '%s'" % type(value).__name__)
+
+class _Reader(object):
+    def __init__(self, data):
+        self._data = memoryview(data)
+        self._pos  = 0
+
+    def at_end(self):
+        return self._pos == len(self._data)
+
+    def read(self, n):
+        if self._pos + n > len(self._data):
+            raise FormatError("unexpected end of data")
+
+        ret = self._data[self._pos:self._pos+n].tobytes()
+        self._pos += n
+        return ret
+
+    def unpack(self, fmt, single=True):
+        size = struct.calcsize(fmt)
+        ret  = struct.unpack(fmt, self.read(size))
+        return ret[0] if single else ret
+
+    def read_varint(self):
+        ret   = 0
+        shift = 0
+
+        while True:
+            b = self.read(1)[0]
+            ret |= (b & 0x7f) << shift
+            shift += 7
+            if not b & 0x80:
+                return ret
+
+    def read_str(self):
+        return self.read(self.read_varint()).decode('utf-8')
+
+    def read_value(self):
+        tag = self.read(1)
+
+        if tag == b'N':
+            return None
+        if tag == b's':
+            return self.read_str()
+        if tag == b'i':
+            n = self.read_varint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+        if tag == b'f':
+            return self.unpack('<d')
+        if tag == b'l':
+            return [self.read_value() for i in range(self.read_varint())]
+        if tag == b'd':
+            ret = dict()
+            for i in range(self.read_varint()):
+                k = self.read_str()
+                ret[k] = self.read_value()
+            return ret
+
+        raise FormatError("invalid value tag %r" % tag)
@@ -26,6 +26,7 @@ from mesycontrol.qt import Signal
 
 from mesycontrol import config_util
 import mesycontrol.hardware_controller as hardware_controller
+import mesycontrol.hardware_model as hm
 import mesycontrol.util as util
 
 QMB = QtWidgets.QMessageBox
@@ -93,16 +94,28 @@ class SubProgressDialog(QtWidgets.QDialog):
 class ApplySetupRunner(config_util.GeneratorRunner):
     progress_changed = Signal(object)
 
-    def __init__(self, app_registry, device_registry, parent_widget, parent=None):
+    def __init__(self, app_registry, device_registry, parent_widget, minimal_writes=False,
+            max_concurrent_connects=config_util.DEFAULT_MAX_CONCURRENT_CONNECTS,
+            connect_timeout_ms=hm.DEFAULT_CONNECT_TIMEOUT_MS, staged=False, journal=None,
+            parent=None):
         super(ApplySetupRunner, self).__init__(parent=parent)
 
         self.log             = util.make_logging_source_adapter(__name__, self)
         self.app_registry    = app_registry
         self.device_registry = device_registry
         self.parent_widget   = parent_widget
+        self.minimal_writes  = minimal_writes
+        self.max_concurrent_connects = max_concurrent_connects
+        self.connect_timeout_ms      = connect_timeout_ms
+        self.staged                  = staged
+        self.journal                 = journal
 
     def _start(self):
-        self.generator = config_util.connect_and_apply_setup(self.app_registry, self.device_registry)
+        self.generator = config_util.connect_and_apply_setup(
+                self.app_registry, self.device_registry, self.minimal_writes,
+                max_concurrent=self.max_concurrent_connects,
+                timeout_ms=self.connect_timeout_ms, staged=self.staged,
+                journal=self.journal)
 
     def _object_yielded(self, obj):
         if isinstance(obj, hardware_controller.TimeoutError):
@@ -162,6 +175,16 @@ class ApplySetupRunner(config_util.GeneratorRunner):
 
             return (std_button_to_cfg_action(answer), False)
 
+        if isinstance(obj, config_util.MirrorVerifyError):
+            answer = QMB.question(
+                    self.parent_widget,
+                    "Mirror verification error",
+                    "%s\nThe configuration has not been activated." % obj,
+                    buttons=QMB.Retry | QMB.Ignore | QMB.Abort,
+                    defaultButton=QMB.Retry)
+
+            return (std_button_to_cfg_action(answer), False)
+
         raise ValueError("Error: %s" % obj)
 
     def _progress_update(self, progress):
@@ -169,15 +192,20 @@ class ApplySetupRunner(config_util.GeneratorRunner):
         self.progress_changed.emit(progress)
 
 class ApplyDeviceConfigRunner(config_util.GeneratorRunner):
-    def __init__(self, device, parent_widget, parent=None):
+    def __init__(self, device, parent_widget, minimal_writes=False, staged=False, journal=None,
+            parent=None):
         super(ApplyDeviceConfigRunner, self).__init__(parent=parent)
 
         self.log = util.make_logging_source_adapter(__name__, self)
         self.device = device
         self.parent_widget = parent_widget
+        self.minimal_writes = minimal_writes
+        self.staged = staged
+        self.journal = journal
 
     def _start(self):
-        self.generator = config_util.apply_device_config(self.device)
+        self.generator = config_util.apply_device_config(self.device, self.minimal_writes,
+                staged=self.staged, journal=self.journal)
 
     def _object_yielded(self, obj):
         if isinstance(obj, config_util.SetParameterError):
@@ -201,17 +229,32 @@ class ApplyDeviceConfigRunner(config_util.GeneratorRunner):
 
             return (std_button_to_cfg_action(answer), False)
 
+        if isinstance(obj, config_util.MirrorVerifyError):
+            answer = QMB.question(
+                    self.parent_widget,
+                    "Mirror verification error",
+                    "%s\nThe configuration has not been activated." % obj,
+                    buttons=QMB.Retry | QMB.Ignore | QMB.Abort,
+                    defaultButton=QMB.Retry)
+
+            return (std_button_to_cfg_action(answer), False)
+
 class ApplyDeviceConfigsRunner(config_util.GeneratorRunner):
     progress_changed = Signal(object)
 
-    def __init__(self, devices, parent_widget, parent=None):
+    def __init__(self, devices, parent_widget, minimal_writes=False, staged=False, journal=None,
+            parent=None):
         super(ApplyDeviceConfigsRunner, self).__init__(parent=parent)
 
         self.devices = devices
         self.parent_widget = parent_widget
+        self.minimal_writes = minimal_writes
+        self.staged = staged
+        self.journal = journal
 
     def _start(self):
-        self.generator = config_util.apply_device_configs(self.devices)
+        self.generator = config_util.apply_device_configs(self.devices, self.minimal_writes,
+                self.staged, self.journal)
 
     def _object_yielded(self, obj):
         if isinstance(obj, config_util.SetParameterError):
@@ -286,12 +329,52 @@ class ApplyDeviceConfigsRunner(config_util.GeneratorRunner):
 
             return (std_button_to_cfg_action(answer), False)
 
+        if isinstance(obj, config_util.MirrorVerifyError):
+            answer = QMB.question(
+                    self.parent_widget,
+                    "Mirror verification error",
+                    "%s\nThe configuration has not been activated." % obj,
+                    buttons=QMB.Retry | QMB.Ignore | QMB.Abort,
+                    defaultButton=QMB.Retry)
+
+            return (std_button_to_cfg_action(answer), False)
+
         raise ValueError("Error: %s" % obj)
 
     def _progress_update(self, progress):
         super(ApplyDeviceConfigsRunner, self)._progress_update(progress)
         self.progress_changed.emit(progress)
 
+class RollbackRunner(config_util.GeneratorRunner):
+    """Restores the registers recorded in an ApplyJournal."""
+    progress_changed = Signal(object)
+
+    def __init__(self, journal, parent_widget, parent=None):
+        super(RollbackRunner, self).__init__(parent=parent)
+
+        self.journal = journal
+        self.parent_widget = parent_widget
+
+    def _start(self):
+        self.generator = config_util.rollback_apply(self.journal)
+
+    def _object_yielded(self, obj):
+        if isinstance(obj, Exception):
+            answer = QMB.question(
+                    self.parent_widget,
+                    "Rollback error",
+                    str(obj),
+                    buttons=QMB.Retry | QMB.Ignore | QMB.Abort,
+                    defaultButton=QMB.Retry)
+
+            return (std_button_to_cfg_action(answer), False)
+
+        raise ValueError("Error: %s" % obj)
+
+    def _progress_update(self, progress):
+        super(RollbackRunner, self)._progress_update(progress)
+        self.progress_changed.emit(progress)
+
 class FillDeviceConfigsRunner(config_util.GeneratorRunner):
     progress_changed = Signal(object)
 
@@ -83,6 +83,14 @@ class Setup(bm.MRCRegistry):
         mrc.modified_changed.connect(self._on_mrc_modified_changed)
         return True
 
+    @modifies
+    def add_mrcs(self, mrcs):
+        mrcs = list(mrcs)
+        super(Setup, self).add_mrcs(mrcs)
+        for mrc in mrcs:
+            mrc.modified_changed.connect(self._on_mrc_modified_changed)
+        return len(mrcs) > 0
+
     @modifies
     def remove_mrc(self, mrc):
         super(Setup, self).remove_mrc(mrc)
@@ -150,6 +158,14 @@ class ConfigMrc(bm.BasicMrc):
         device.modified_changed.connect(self._on_device_modified_changed)
         return True
 
+    @modifies
+    def add_devices(self, devices):
+        devices = list(devices)
+        super(ConfigMrc, self).add_devices(devices)
+        for device in devices:
+            device.modified_changed.connect(self._on_device_modified_changed)
+        return len(devices) > 0
+
     @modifies
     def remove_device(self, device):
         super(ConfigMrc, self).remove_device(device)
@@ -214,6 +230,7 @@ class Device(bm.Device):
     set_cached_parameter = modifies(bm.Device.set_cached_parameter)
     clear_cached_parameter = modifies(bm.Device.clear_cached_parameter)
     clear_cached_memory = modifies(bm.Device.clear_cached_memory)
+    set_cached_memory = modifies(bm.Device.set_cached_memory)
 
     def _read_parameter(self, address):
         # This is either called by bm.Device.read_parameter() or by
@@ -32,9 +32,12 @@ from mesycontrol.basic_model import IDCConflict
 import mesycontrol.basic_model as bm
 import mesycontrol.future as future
 import mesycontrol.hardware_controller as hardware_controller
+import mesycontrol.hardware_model as hm
+import mesycontrol.memory_cache as memory_cache
 import mesycontrol.model_util as model_util
 import mesycontrol.util as util
 
+import collections
 import itertools
 import logging
 import sys
@@ -43,9 +46,25 @@ import typing
 log = logging.getLogger(__name__)
 
 class GeneratorRunner(QtCore.QObject):
+    """Drives a generator performing asynchronous operations.
+
+    The generator may yield:
+      - a Future: the runner waits for it to complete and sends it back into
+        the generator.
+      - a list or tuple of Futures: the runner waits for all of them to
+        complete and sends the list back. This allows keeping many requests
+        in flight at once.
+      - a ProgressUpdate: passed to _progress_update().
+      - any other object: passed to _object_yielded().
+    """
 
     progress_changed = Signal(object)
 
+    #: Maximum number of consecutive steps with already completed futures
+    #: executed directly before returning to the Qt event loop. 0 queues every
+    #: step.
+    max_immediate_steps = 1000
+
     def __init__(self, generator=None, parent=None):
         super(GeneratorRunner, self).__init__(parent)
 
@@ -62,7 +81,10 @@ class GeneratorRunner(QtCore.QObject):
     # maximum size.
     #
     # To avoid this the call to _next() is queued in the Qt event loop and the
-    # current invocation of _next() can return.
+    # current invocation of _next() can return. Futures that are already done
+    # when being yielded are instead handled directly inside the loop in
+    # _next(), which does not grow the stack. After max_immediate_steps such
+    # steps a queued call is used anyway to keep the event loop responsive.
 
     def start(self):
         """Start execution of the generator.
@@ -90,14 +112,33 @@ class GeneratorRunner(QtCore.QObject):
 
     @Slot()
     def _next(self):
+        immediate_steps = 0
+
         while True:
             try:
                 obj = self.generator.send(self.arg)
 
-                self.log.info("Generator %s yielded %s (%s)", self.generator, obj, type(obj))
+                self.log.debug("Generator %s yielded %s (%s)", self.generator, obj, type(obj))
 
-                if isinstance(obj, future.Future):
+                if isinstance(obj, (list, tuple)) and all(isinstance(f, future.Future) for f in obj):
+                    self.log.debug("Batch of %d futures yielded", len(obj))
+
+                    if all(f.done() for f in obj) and immediate_steps < self.max_immediate_steps:
+                        immediate_steps += 1
+                        self.arg = obj
+                        continue
+
+                    if self._batch_yielded(obj):
+                        return
+
+                elif isinstance(obj, future.Future):
                     self.log.debug("Future yielded")
+
+                    if obj.done() and immediate_steps < self.max_immediate_steps:
+                        immediate_steps += 1
+                        self.arg = obj
+                        continue
+
                     if self._future_yielded(obj):
                         return
 
@@ -152,6 +193,18 @@ class GeneratorRunner(QtCore.QObject):
         f.add_done_callback(on_done)
         return True
 
+    def _batch_yielded(self, futures):
+        """Handles the case where the generator yields a list of Futures.
+        Waits for all of them to complete, then sends the list back into the
+        generator.
+        """
+        def on_done(f):
+            self.arg = futures
+            QtCore.QMetaObject.invokeMethod(self, "_next", Qt.QueuedConnection)
+
+        future.all_done(*futures).add_done_callback(on_done)
+        return True
+
     def _progress_update(self, progress):
         """Handles the case where the generator yields a ProgressUpdate. The
         default is to update the result futures progress.
@@ -266,9 +319,12 @@ class RcOff(RuntimeError):
 
 ACTION_SKIP, ACTION_ABORT, ACTION_RETRY, ACTION_YES, ACTION_YES_TO_ALL, ACTION_NO, ACTION_NO_TO_ALL = range(7)
 
-def apply_device_config(device):
+def apply_device_config(device, minimal_writes=False, stats=None, staged=False, journal=None):
     """Device may be an app_model.Device instance or a DeviceBase
-    subclass."""
+    subclass. See apply_parameters() for minimal_writes, stats and journal.
+    If staged is True the config is applied through the devices mirror memory
+    (see apply_parameters_staged()). Devices without mirror support fall back
+    to direct writes."""
 
     if device.idc_conflict:
         raise IDCConflict("%s" % device)
@@ -276,8 +332,13 @@ def apply_device_config(device):
     criticals       = (yield device.get_critical_config_parameters()).result()
     non_criticals   = (yield device.get_non_critical_config_parameters()).result()
 
-    gen = apply_parameters(source=device.cfg, dest=device.hw,
-            criticals=criticals, non_criticals=non_criticals)
+    if staged:
+        gen = apply_parameters_staged(source=device.cfg, dest=device.hw,
+                parameters=non_criticals + criticals, stats=stats, journal=journal)
+    else:
+        gen = apply_parameters(source=device.cfg, dest=device.hw,
+                criticals=criticals, non_criticals=non_criticals,
+                minimal_writes=minimal_writes, stats=stats, journal=journal)
     arg = None
 
     while True:
@@ -294,91 +355,198 @@ def apply_device_config(device):
         except GeneratorExit:
             gen.close()
             return
+        except MirrorUnavailable as e:
+            log.warning("apply_device_config: %s: mirror memory not available (%s),"
+                    " writing parameters directly", device, e)
+            gen = apply_parameters(source=device.cfg, dest=device.hw,
+                    criticals=criticals, non_criticals=non_criticals,
+                    minimal_writes=minimal_writes, stats=stats, journal=journal)
+            arg = None
 
     # extensions
     for name, value in device.cfg.get_extensions().items():
         device.hw.set_extension(name, value)
 
-def run_callables_generator(callables):
+def run_callables_generator(callables, batch_size=1):
+    """Invokes the given callables, each returning a Future, and waits for
+    their results. Errors are yielded and may be retried or skipped.
+
+    With batch_size > 1 up to batch_size callables are invoked at once and
+    their futures are yielded as a list, keeping that many requests in
+    flight. Each completed future is yielded again afterwards so callers
+    inspecting the yielded futures see every one of them.
+    """
     if not isinstance(callables, list):
         callables = list(callables)
 
     progress = ProgressUpdate(current=0, total=len(callables))
 
-    for c in callables:
-        action = ACTION_RETRY
+    for i in range(0, len(callables), max(batch_size, 1)):
+        batch = callables[i:i+max(batch_size, 1)]
 
-        while action == ACTION_RETRY:
+        if len(batch) > 1:
             try:
-                f = yield c()
-                r = f.result()
-                if isinstance(r, bm.SetResult) and not r:
-                    raise SetParameterError(r)
-                yield progress.increment()
-                break
+                futures = yield [c() for c in batch]
             except (GeneratorExit, StopIteration):
                 return
-            except Exception as e:
-                action = yield e
-                if action == ACTION_SKIP:
+        else:
+            futures = [None]
+
+        for c, f in zip(batch, futures):
+            action = ACTION_RETRY
+
+            while action == ACTION_RETRY:
+                try:
+                    f = yield (f if f is not None else c())
+                    r = f.result()
+                    if isinstance(r, bm.SetResult) and not r:
+                        raise SetParameterError(r)
+                    yield progress.increment()
                     break
+                except (GeneratorExit, StopIteration):
+                    return
+                except Exception as e:
+                    f = None
+                    action = yield e
+                    if action == ACTION_SKIP:
+                        break
 
-def establish_connections(setup, hardware_registry):
-    progress = ProgressUpdate(current=0, total=len(setup))
+def run_generators_concurrently(generators):
+    """Runs the given generators concurrently.
+
+    Futures and lists of futures yielded by the generators are waited on in
+    parallel: whenever all running generators are waiting this generator
+    yields a future completing once any of the pending futures is done. A
+    single done callback is added to each pending future.
+    ProgressUpdates are passed through as is. Any other objects, e.g. errors or
+    questions to the user, are yielded one at a time and the response is sent
+    back into the generator that produced the object. This serializes
+    interactive prompts while the remaining generators keep waiting for their
+    futures.
+
+    An exception raised by any of the generators closes the remaining ones
+    and is propagated.
+    """
+    ready   = collections.deque((gen, None) for gen in generators) # (generator, arg to send)
+    pending = dict() # generator -> (future, arg to send once done)
+    active  = None   # generator currently waiting for a response
+    wakeup  = [future.Future()] # completed by the first pending future to finish
 
-    for cfg_mrc in setup:
-        progress.text = "Connecting to %s" % cfg_mrc.get_display_url()
-        yield progress
+    def on_pending_done(f):
+        if not wakeup[0].done():
+            wakeup[0].set_result(f)
 
-        hw_mrc = hardware_registry.get_mrc(cfg_mrc.url)
+    def add_pending(gen, f, arg):
+        pending[gen] = (f, arg)
+        f.add_done_callback(on_pending_done)
 
-        if hw_mrc is None:
-            model_util.add_mrc_connection(hardware_registry=hardware_registry,
-                    url=cfg_mrc.url, do_connect=False)
+    try:
+        while len(ready) or len(pending):
+            while len(ready):
+                gen, arg = ready.popleft()
 
-            hw_mrc = hardware_registry.get_mrc(cfg_mrc.url)
+                try:
+                    obj = gen.send(arg)
+                except StopIteration:
+                    continue
 
-        if hw_mrc.is_connecting():
-            # Cancel active connection attempts as we need the Future returned
-            # by connect().
-            yield hw_mrc.disconnectMrc()
+                if isinstance(obj, (list, tuple)) and all(isinstance(f, future.Future) for f in obj):
+                    f = future.all_done(*obj)
 
-        if hw_mrc.is_disconnected():
-            action = ACTION_RETRY
+                    if f.done():
+                        ready.append((gen, obj))
+                    else:
+                        add_pending(gen, f, obj)
 
-            while action == ACTION_RETRY:
-                f = yield hw_mrc.connectMrc()
+                elif isinstance(obj, future.Future):
+                    if obj.done():
+                        ready.append((gen, obj))
+                    else:
+                        add_pending(gen, obj, obj)
 
-                try:
-                    f.result()
-                    break
-                except hardware_controller.TimeoutError as e:
-                    action = yield e
+                elif isinstance(obj, ProgressUpdate):
+                    active = gen
+                    yield obj
+                    active = None
+                    ready.append((gen, None))
 
-                    if action == ACTION_SKIP:
-                        break
+                else:
+                    active = gen
+                    arg    = yield obj
+                    active = None
+                    ready.append((gen, arg))
+
+            if len(pending):
+                if not wakeup[0].done():
+                    yield wakeup[0]
+
+                wakeup[0] = future.Future()
+
+                for gen, (f, arg) in list(pending.items()):
+                    if f.done():
+                        del pending[gen]
+                        ready.append((gen, arg))
+    finally:
+        others = itertools.chain((t[0] for t in ready), pending.keys())
+        for gen in itertools.chain([active] if active is not None else [], others):
+            gen.close()
 
-            if action == ACTION_SKIP:
-                continue
+def run_pipelines(progress, pipelines):
+    """Runs the given (generator, ProgressUpdate) pipelines concurrently
+    using run_generators_concurrently().
 
-        if hw_mrc.is_connected():
-            progress.text = "Connected to %s" % cfg_mrc.get_display_url()
-            yield progress
-            yield hw_mrc.scanbus(0)
-            yield hw_mrc.scanbus(1)
+    Each pipeline reports into its own ProgressUpdate instead of sharing one.
+    Whenever a pipeline yields a ProgressUpdate the combined progress is
+    yielded instead: current and total of progress and of its subprogress are
+    the sums over all pipelines. The texts of the first running pipeline are
+    shown together with the number of other running pipelines, so concurrent
+    pipelines do not overwrite each others state.
+    """
+    parts   = [p for gen, p in pipelines]
+    running = set(range(len(pipelines)))
 
-        progress.increment()
+    def run_pipeline(index, gen):
+        arg = None
 
-def connect_and_apply_setup(app_registry, device_registry):
-    setup = app_registry.cfg
-    # MRCs to connect + device configs to apply
-    total_progress = len(setup) + sum(len(mrc) for mrc in setup)
-    progress       = ProgressUpdate(current=0, total=total_progress)
-    progress.text  = "Establishing MRC connections"
+        while True:
+            try:
+                obj = gen.send(arg)
+                arg = yield obj
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
 
-    yield progress
+        running.discard(index)
+        yield parts[index]
+
+    def combine():
+        active = [parts[i] for i in sorted(running)]
+        others = " (+%d more)" % (len(active) - 1) if len(active) > 1 else ""
+
+        progress.current = 0
+        progress.total   = sum(p.total for p in parts)
+        progress.current = sum(p.current for p in parts)
+
+        texts = [p.text for p in active if len(p.text)]
+
+        if len(texts):
+            progress.text = texts[0] + others
+
+        subs = [p.subprogress for p in active if p.subprogress is not None]
+        sub  = ProgressUpdate(current=sum(sp.current for sp in subs),
+                total=sum(sp.total for sp in subs))
+        texts = [sp.text for sp in subs if len(sp.text)]
 
-    gen = establish_connections(setup, app_registry.hw)
+        if len(texts):
+            sub.text = texts[0] + others
+
+        progress.subprogress = sub
+        return progress
+
+    gen = run_generators_concurrently([run_pipeline(i, g)
+        for i, (g, p) in enumerate(pipelines)])
     arg = None
 
     while True:
@@ -386,49 +554,214 @@ def connect_and_apply_setup(app_registry, device_registry):
             obj = gen.send(arg)
 
             if isinstance(obj, ProgressUpdate):
-                progress.text = obj.text
-                yield progress.increment()
+                yield combine()
                 arg = None
             else:
                 arg = yield obj
-
         except StopIteration:
-            # From inside the generator
             break
         except GeneratorExit:
-            # From the caller invoking close()
             gen.close()
             return
 
-    gen = apply_setup(app_registry, device_registry)
+def group_devices_by_mrc(devices):
+    """Returns a list of (mrc, [devices]) tuples keeping the order in which
+    MRCs first appear in the given device list."""
+    ret = collections.OrderedDict()
+
+    for device in devices:
+        ret.setdefault(device.mrc, list()).append(device)
+
+    return list(ret.items())
+
+#: Default number of MRC connection attempts running at the same time.
+DEFAULT_MAX_CONCURRENT_CONNECTS = 8
+
+def establish_connection(mrc, hardware_registry, progress, slots=None,
+        timeout_ms=hm.DEFAULT_CONNECT_TIMEOUT_MS):
+    """Connects to the given MRC and scans both of its busses.
+    mrc is a config or app model MRC. The optional future.Semaphore slots
+    limits the number of connection attempts running concurrently. A slot is
+    only held while connectMrc() is pending, not while the user is asked
+    what to do about a timeout.
+    """
+    hw_mrc = hardware_registry.get_mrc(mrc.url)
+
+    if hw_mrc is None:
+        model_util.add_mrc_connection(hardware_registry=hardware_registry,
+                url=mrc.url, do_connect=False)
+
+        hw_mrc = hardware_registry.get_mrc(mrc.url)
+
+    if hw_mrc.is_connecting():
+        # Cancel active connection attempts as we need the Future returned
+        # by connect().
+        yield hw_mrc.disconnectMrc()
+
+    if hw_mrc.is_disconnected():
+        action = ACTION_RETRY
+
+        while action == ACTION_RETRY:
+            slot = slots.acquire() if slots is not None else None
+
+            try:
+                if slot is not None:
+                    yield slot
+
+                progress.text = "Connecting to %s" % mrc.get_display_url()
+                yield progress
+
+                f = yield hw_mrc.connectMrc(timeout_ms)
+            finally:
+                if slot is not None:
+                    if slot.done():
+                        slots.release()
+                    else:
+                        slot.cancel()
+
+            try:
+                f.result()
+                break
+            except hardware_controller.TimeoutError as e:
+                action = yield e
+
+                if action == ACTION_SKIP:
+                    break
+
+        if action == ACTION_SKIP:
+            return
+
+    if hw_mrc.is_connected():
+        progress.text = "Connected to %s" % mrc.get_display_url()
+        yield progress
+        yield hw_mrc.scanbus_cached(0)
+        yield hw_mrc.scanbus_cached(1)
+
+def establish_connections(setup, hardware_registry,
+        max_concurrent=DEFAULT_MAX_CONCURRENT_CONNECTS,
+        timeout_ms=hm.DEFAULT_CONNECT_TIMEOUT_MS, mrc_timeouts=None):
+    """Connects to all MRCs of the given setup.
+    Up to max_concurrent connection attempts run at the same time (None or 0
+    means no limit). Each MRC times out on its own after timeout_ms; the
+    optional mrc_timeouts dict maps MRC URLs to a different timeout.
+    """
+    progress     = ProgressUpdate(current=0, total=len(setup))
+    slots        = future.Semaphore(max_concurrent)
+    mrc_timeouts = mrc_timeouts or dict()
+
+    def _connect(cfg_mrc, progress):
+        gen = establish_connection(cfg_mrc, hardware_registry, progress, slots,
+                mrc_timeouts.get(cfg_mrc.url, timeout_ms))
+        arg = None
+
+        while True:
+            try:
+                obj = gen.send(arg)
+                arg = yield obj
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        yield progress.increment()
+
+    pipelines = list()
+
+    for cfg_mrc in setup:
+        mrc_progress = ProgressUpdate(current=0, total=1)
+        pipelines.append((_connect(cfg_mrc, mrc_progress), mrc_progress))
+
+    gen = run_pipelines(progress, pipelines)
     arg = None
 
     while True:
         try:
             obj = gen.send(arg)
+            arg = yield obj
+        except StopIteration:
+            break
+        except GeneratorExit:
+            gen.close()
+            return
 
-            if isinstance(obj, ProgressUpdate):
-                progress.current = len(setup) + obj.current
+def connect_and_apply_setup(app_registry, device_registry, minimal_writes=False,
+        max_concurrent=DEFAULT_MAX_CONCURRENT_CONNECTS,
+        timeout_ms=hm.DEFAULT_CONNECT_TIMEOUT_MS, mrc_timeouts=None, staged=False,
+        journal=None):
+    """Connects to the MRCs of the setup and applies the device configs.
+    Each MRC is handled by its own pipeline: as soon as an MRC is connected
+    its devices are configured while connection attempts to other MRCs may
+    still be pending. See establish_connections() for the connection
+    arguments.
+    """
+    setup = app_registry.cfg
+    # MRCs to connect + device configs to apply
+    total_progress = len(setup) + sum(len(mrc) for mrc in setup)
+    progress       = ProgressUpdate(current=0, total=total_progress)
+    progress.subprogress = ProgressUpdate(current=0, total=0)
+    progress.text  = "Establishing MRC connections"
+    slots          = future.Semaphore(max_concurrent)
+    mrc_timeouts   = mrc_timeouts or dict()
 
-                if hasattr(obj, 'subprogress'):
-                    progress.subprogress = obj.subprogress
+    yield progress
 
-                yield progress
-                arg = None
-            else:
+    def _connect_and_apply(app_mrc, progress):
+        gen = establish_connection(app_mrc, app_registry.hw, progress, slots,
+                mrc_timeouts.get(app_mrc.url, timeout_ms))
+        arg = None
+
+        while True:
+            try:
+                obj = gen.send(arg)
+                arg = yield obj
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        yield progress.increment()
+
+        gen = apply_mrc_config(app_mrc, progress, minimal_writes, staged, journal)
+        arg = None
+
+        while True:
+            try:
+                obj = gen.send(arg)
                 arg = yield obj
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+    pipelines = list()
 
+    for app_mrc in (mrc for mrc in app_registry if mrc.cfg is not None):
+        mrc_progress = ProgressUpdate(current=0, total=1 + len(app_mrc.cfg))
+        mrc_progress.subprogress = ProgressUpdate(current=0, total=0)
+        pipelines.append((_connect_and_apply(app_mrc, mrc_progress), mrc_progress))
+
+    gen = run_pipelines(progress, pipelines)
+    arg = None
+
+    while True:
+        try:
+            obj = gen.send(arg)
+            arg = yield obj
         except StopIteration:
             break
         except GeneratorExit:
             gen.close()
             return
 
-def apply_setup(app_registry, device_registry):
-    source   = app_registry.cfg
-    progress = ProgressUpdate(current=0, total=sum(len(mrc) for mrc in source))
-    progress.subprogress = ProgressUpdate(current=0, total=0)
-
+def apply_mrc_config(app_mrc, progress, minimal_writes=False, staged=False, journal=None):
+    """Applies the device configs of the given app model MRC to the hardware.
+    The MRC has to be connected. Devices without config are ignored.
+    progress is incremented once per device. See apply_device_config() for
+    minimal_writes, staged and journal.
+    """
     def _apply_device_config(device):
         action = ACTION_RETRY
 
@@ -440,7 +773,7 @@ def apply_setup(app_registry, device_registry):
                 #raise StopIteration()
                 return
 
-        gen = apply_device_config(device)
+        gen = apply_device_config(device, minimal_writes, staged=staged, journal=journal)
         arg = None
 
         while True:
@@ -460,85 +793,100 @@ def apply_setup(app_registry, device_registry):
                 gen.close()
                 return
 
-    def _apply_mrc_config(app_mrc):
-        action   = ACTION_RETRY
+    action   = ACTION_RETRY
 
-        while app_mrc.hw is None and action == ACTION_RETRY:
-            action = yield MissingDestinationMRC(url=app_mrc.url)
-
-            if action == ACTION_SKIP:
-                #raise StopIteration()
-                return
+    while app_mrc.hw is None and action == ACTION_RETRY:
+        action = yield MissingDestinationMRC(url=app_mrc.url)
 
-        if not app_mrc.hw.is_connected():
+        if action == ACTION_SKIP:
+            #raise StopIteration()
             return
 
-        for device in (d for d in app_mrc if d.cfg is not None):
-            action = ACTION_RETRY
+    if not app_mrc.hw.is_connected():
+        return
 
-            while action == ACTION_RETRY:
+    for device in (d for d in app_mrc if d.cfg is not None):
+        action = ACTION_RETRY
 
-                gen = _apply_device_config(device)
-                arg = None
+        while action == ACTION_RETRY:
 
-                while True:
-                    try:
-                        obj = gen.send(arg)
-                        arg = yield obj
-                    except StopIteration:
-                        action = None
+            gen = _apply_device_config(device)
+            arg = None
+
+            while True:
+                try:
+                    obj = gen.send(arg)
+                    arg = yield obj
+                except StopIteration:
+                    action = None
+                    break
+                except GeneratorExit:
+                    gen.close()
+                    return
+                except IDCConflict as e:
+                    action = yield e
+
+                    if action in (ACTION_SKIP, ACTION_RETRY):
                         break
-                    except GeneratorExit:
-                        gen.close()
-                        return
-                    except IDCConflict as e:
-                        action = yield e
 
-                        if action in (ACTION_SKIP, ACTION_RETRY):
-                            break
+        yield progress.increment()
+
+def apply_setup(app_registry, device_registry, minimal_writes=False, staged=False, journal=None):
+    source   = app_registry.cfg
+    progress = ProgressUpdate(current=0, total=sum(len(mrc) for mrc in source))
+    progress.subprogress = ProgressUpdate(current=0, total=0)
 
-            yield progress.increment()
+    # One pipeline per MRC. The pipelines run concurrently.
+    pipelines = list()
 
-    for mrc in (m for m in app_registry if m.cfg is not None):
-        gen = _apply_mrc_config(mrc)
-        arg = None
+    for app_mrc in (mrc for mrc in app_registry if mrc.cfg is not None):
+        mrc_progress = ProgressUpdate(current=0, total=len(app_mrc.cfg))
+        mrc_progress.subprogress = ProgressUpdate(current=0, total=0)
+        pipelines.append((apply_mrc_config(app_mrc, mrc_progress, minimal_writes,
+            staged, journal), mrc_progress))
 
-        while True:
-            try:
-                obj = gen.send(arg)
-                arg = yield obj
-            except StopIteration:
-                break
-            except GeneratorExit:
-                gen.close()
-                return
+    gen = run_pipelines(progress, pipelines)
+    arg = None
+
+    while True:
+        try:
+            obj = gen.send(arg)
+            arg = yield obj
+        except StopIteration:
+            break
+        except GeneratorExit:
+            gen.close()
+            return
 
 
-def apply_device_configs(devices):
+def apply_device_configs(devices, minimal_writes=False, staged=False, journal=None):
     """Applies config values to the hardware for each of the given devices.
     Required MRC connections are established.
+    If minimal_writes is True only parameters differing from the hardware
+    are written (see apply_parameters()). If staged is True the configs are
+    applied through mirror memory (see apply_parameters_staged()). Pass an
+    ApplyJournal to be able to roll the changes back (see rollback_apply()).
+    Devices on different MRCs are processed concurrently, one pipeline per
+    MRC (see run_generators_concurrently()).
     """
-    skipped_mrcs    = set()
     mrcs_to_connect = set(d.mrc for d in devices if (not d.mrc.has_hw or not d.mrc.hw.is_connected()))
 
     progress             = ProgressUpdate(current=0, total=len(mrcs_to_connect) + len(devices))
     progress.subprogress = ProgressUpdate(current=0, total=0)
     auto_enable_rc       = False
     do_not_enable_rc     = False
+    stats                = ApplyStats()
 
     yield progress
 
-    for device in devices:
-        mrc = device.mrc
+    def apply_mrc_device_configs(mrc, mrc_devices, progress):
+        nonlocal auto_enable_rc, do_not_enable_rc
 
         if mrc.hw is None:
             model_util.add_mrc_connection(
                     hardware_registry=mrc.mrc_registry.hw,
                     url=mrc.url, do_connect=False)
 
-        if mrc in skipped_mrcs:
-            continue
-
         if mrc.hw.is_connecting():
             # Cancel active connection attempts as we need the Future returned
             # by connect().
@@ -555,91 +903,120 @@ def apply_device_configs(devices):
 
                 try:
                     f.result()
-                    (yield mrc.hw.scanbus(0)).result()
-                    (yield mrc.hw.scanbus(1)).result()
+                    (yield mrc.hw.scanbus_cached(0)).result()
+                    (yield mrc.hw.scanbus_cached(1)).result()
                     progress.text = "Connected to %s" % mrc.get_display_url()
                     break
                 except hardware_controller.TimeoutError as e:
                     action = yield e
 
                     if action == ACTION_SKIP:
-                        skipped_mrcs.add(mrc)
                         break
 
+            yield progress.increment()
+
             if action == ACTION_SKIP:
-                yield progress.increment()
-                continue
+                return
 
-        # ===== Missing devices =====
-        action = ACTION_RETRY
+        for device in mrc_devices:
+            # ===== Missing devices =====
+            action = ACTION_RETRY
 
-        while device.hw is None and action == ACTION_RETRY:
-            action = yield MissingDestinationDevice(
-                    url=device.mrc.url, bus=device.bus, dev=device.address)
+            while device.hw is None and action == ACTION_RETRY:
+                action = yield MissingDestinationDevice(
+                        url=device.mrc.url, bus=device.bus, dev=device.address)
 
-            if action == ACTION_SKIP:
-                break
+                if action == ACTION_SKIP:
+                    break
 
-        if action == ACTION_SKIP:
-            yield progress.increment()
-            continue
+            if action == ACTION_SKIP:
+                yield progress.increment()
+                continue
 
-        # ===== IDC conflict =====
-        action = ACTION_RETRY
+            # ===== IDC conflict =====
+            action = ACTION_RETRY
 
-        while device.idc_conflict and action == ACTION_RETRY:
-            action = yield IDCConflict("%s, %d, %d)" % (
-                device.mrc.get_display_url(), device.bus, device.address))
+            while device.idc_conflict and action == ACTION_RETRY:
+                action = yield IDCConflict("%s, %d, %d)" % (
+                    device.mrc.get_display_url(), device.bus, device.address))
+
+                if action == ACTION_SKIP:
+                    break
 
             if action == ACTION_SKIP:
-                break
+                yield progress.increment()
+                continue
 
-        if action == ACTION_SKIP:
-            yield progress.increment()
-            continue
+            progress.text = "Current device: (%s, %d, %d)" % (
+                    device.mrc.get_display_url(), device.bus, device.address)
+            yield progress
 
-        progress.text = "Current device: (%s, %d, %d)" % (
-                device.mrc.get_display_url(), device.bus, device.address)
-        yield progress
+            # ===== RC =====
+            if (device.hw and not device.idc_conflict
+                    and not device.hw.rc and not do_not_enable_rc):
 
-        # ===== RC =====
-        if (device.hw and not device.idc_conflict
-                and not device.hw.rc and not do_not_enable_rc):
+                if auto_enable_rc:
+                    (yield device.hw.set_rc(True)).result()
+                else:
+                    action = yield RcOff(device=device)
 
-            if auto_enable_rc:
-                (yield device.hw.set_rc(True)).result()
-            else:
-                action = yield RcOff(device=device)
+                    if action in (ACTION_YES, ACTION_YES_TO_ALL):
+                        (yield device.hw.set_rc(True)).result()
 
-                if action in (ACTION_YES, ACTION_YES_TO_ALL):
-                    (yield device.hw.set_rc(True)).result()
+                        if action == ACTION_YES_TO_ALL:
+                            auto_enable_rc = True
+                    elif action == ACTION_NO_TO_ALL:
+                        do_not_enable_rc = True
 
-                    if action == ACTION_YES_TO_ALL:
-                        auto_enable_rc = True
-                elif action == ACTION_NO_TO_ALL:
-                    do_not_enable_rc = True
+            gen = apply_device_config(device, minimal_writes, stats, staged, journal)
+            arg = None
 
-        gen = apply_device_config(device)
-        arg = None
+            while True:
+                try:
+                    obj = gen.send(arg)
 
-        while True:
-            try:
-                obj = gen.send(arg)
+                    if isinstance(obj, ProgressUpdate):
+                        progress.subprogress = obj
+                        yield progress
+                        arg = None
+                    else:
+                        arg = yield obj
 
-                if isinstance(obj, ProgressUpdate):
-                    progress.subprogress = obj
-                    yield progress
-                    arg = None
-                else:
-                    arg = yield obj
+                except StopIteration:
+                    break
+                except GeneratorExit:
+                    gen.close()
+                    return
 
-            except StopIteration:
-                break
-            except GeneratorExit:
-                gen.close()
-                return
+            yield progress.increment()
 
-        yield progress.increment()
+    pipelines = list()
+
+    for mrc, mrc_devices in group_devices_by_mrc(devices):
+        mrc_progress = ProgressUpdate(current=0,
+                total=int(mrc in mrcs_to_connect) + len(mrc_devices))
+        mrc_progress.subprogress = ProgressUpdate(current=0, total=0)
+        pipelines.append((apply_mrc_device_configs(mrc, mrc_devices, mrc_progress),
+            mrc_progress))
+
+    gen = run_pipelines(progress, pipelines)
+    arg = None
+
+    while True:
+        try:
+            obj = gen.send(arg)
+            arg = yield obj
+        except StopIteration:
+            break
+        except GeneratorExit:
+            gen.close()
+            return
+
+    if minimal_writes or staged:
+        log.info("apply_device_configs: %s", stats)
+        progress.text = "Wrote %d of %d parameters (%d writes planned)" % (
+                stats.written, stats.parameters, stats.planned)
+        yield progress
 
 def fill_device_configs(devices):
     """For each of the given devices read config parameters from the hardware
@@ -647,6 +1024,7 @@ def fill_device_configs(devices):
     Device extensions will also be copied from hardware to config.
     """
     skipped_mrcs    = set()
+    scanned_mrcs    = set()
     mrcs_to_connect = set(d.mrc for d in devices if (not d.mrc.has_hw or not d.mrc.hw.is_connected()))
 
     progress = ProgressUpdate(current=0, total=len(mrcs_to_connect) + len(devices))
@@ -691,8 +1069,10 @@ def fill_device_configs(devices):
             if action == ACTION_SKIP:
                 continue
 
-        (yield mrc.hw.scanbus(0)).result()
-        (yield mrc.hw.scanbus(1)).result()
+        if mrc not in scanned_mrcs:
+            (yield mrc.hw.scanbus_cached(0)).result()
+            (yield mrc.hw.scanbus_cached(1)).result()
+            scanned_mrcs.add(mrc)
 
         if not device.has_cfg:
             device.create_config()
@@ -734,6 +1114,9 @@ def fill_device_configs(devices):
 
         yield progress.increment()
 
+#: Number of parameter reads kept in flight by read_config_parameters().
+READ_BATCH_SIZE = 16
+
 def read_config_parameters(devices):
     skipped_mrcs    = set()
     mrcs_to_connect = set(d.mrc for d in devices if (not d.mrc.has_hw or not d.mrc.hw.is_connected()))
@@ -773,8 +1156,8 @@ def read_config_parameters(devices):
 
                 try:
                     f.result()
-                    (yield mrc.hw.scanbus(0)).result()
-                    (yield mrc.hw.scanbus(1)).result()
+                    (yield mrc.hw.scanbus_cached(0)).result()
+                    (yield mrc.hw.scanbus_cached(1)).result()
                     progress.text = "Connected to %s" % mrc.get_display_url()
                     break
                 except hardware_controller.TimeoutError as e:
@@ -805,22 +1188,265 @@ def read_config_parameters(devices):
         progress.text = pt
         yield progress
 
-        for param in params:
-            log.debug("read_config_parameters: reading %d", param.address)
-            yield device.hw.read_parameter(param.address)
+        # Keep up to READ_BATCH_SIZE reads in flight. Read errors are
+        # ignored as before: failed parameters simply stay uncached.
+        for i in range(0, len(params), READ_BATCH_SIZE):
+            batch = params[i:i+READ_BATCH_SIZE]
+            log.debug("read_config_parameters: reading %s", [p.address for p in batch])
+            yield [device.hw.read_parameter(param.address) for param in batch]
             progress.subprogress.text = "Reading parameter %s (address=%d)" % (
-                    param.name, param.address)
-            progress.subprogress.increment()
+                    batch[-1].name, batch[-1].address)
+            progress.subprogress.increment(len(batch))
             yield progress
 
         device.update_config_applied()
 
         yield progress.increment()
 
-def apply_parameters(source, dest, criticals, non_criticals):
+class ApplyStats(object):
+    """Parameter write statistics collected by apply_parameters()."""
+    def __init__(self):
+        self.parameters = 0 #: number of parameters to apply
+        self.read       = 0 #: number of destination parameters read from the hardware
+        self.planned    = 0 #: number of planned writes
+        self.written    = 0 #: number of successfully performed writes
+
+    def __str__(self):
+        return "%d parameters, %d reads, %d planned writes, %d writes performed" % (
+                self.parameters, self.read, self.planned, self.written)
+
+class ApplyJournal(object):
+    """Write journal of a config apply.
+
+    For every destination device the journal holds a snapshot of the
+    registers the apply is about to write, taken before the first write,
+    and the addresses actually written. rollback_apply() uses it to restore
+    exactly the touched registers.
+    """
+    class Entry(object):
+        def __init__(self, dest, criticals, non_criticals):
+            self.dest          = dest
+            self.criticals     = list(criticals)
+            self.non_criticals = list(non_criticals)
+            self.snapshot      = dict() #: address -> value before the apply
+            self.written       = list() #: written addresses in write order
+
+    def __init__(self):
+        self._entries = collections.OrderedDict() # dest -> Entry
+
+    def record_snapshot(self, dest, criticals, non_criticals, values):
+        if dest not in self._entries:
+            self._entries[dest] = ApplyJournal.Entry(dest, criticals, non_criticals)
+
+        entry = self._entries[dest]
+
+        # Keep the oldest value if a register is snapshotted twice.
+        for address, value in values.items():
+            entry.snapshot.setdefault(address, value)
+
+    def record_write(self, dest, address):
+        entry = self._entries[dest]
+
+        if address not in entry.written:
+            entry.written.append(address)
+
+    def get_entries(self):
+        """Returns the entries of devices that have been written to."""
+        return [e for e in self._entries.values() if len(e.written)]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        """The number of written registers."""
+        return sum(len(e.written) for e in self._entries.values())
+
+def rollback_apply(journal, minimal_writes=True):
+    """Restores the registers recorded in the given ApplyJournal to their
+    snapshot values.
+
+    Writes are ordered as in apply_parameters(): critical parameters are set
+    to their safe values before their dependents are restored. With
+    minimal_writes the current values are compared against the snapshot and
+    only differing registers are written. Registers missing from the
+    snapshot, i.e. that could not be read before the apply, are skipped.
+    """
+    entries  = journal.get_entries()
+    progress = ProgressUpdate(current=0, total=len(entries))
+    progress.subprogress = ProgressUpdate(current=0, total=0)
+    stats    = ApplyStats()
+
+    yield progress
+
+    for entry in entries:
+        dest    = entry.dest
+        touched = set(entry.written)
+        missing = touched.difference(entry.snapshot)
+
+        if len(missing):
+            log.warning("rollback_apply: %s: no snapshot values for addresses %s",
+                    dest, sorted(missing))
+
+        restore = touched.intersection(entry.snapshot)
+
+        progress.text = "Restoring (%s, %d, %d)" % (
+                dest.mrc.get_display_url(), dest.bus, dest.address)
+        yield progress
+
+        gen = write_parameter_values(dest,
+                [pp for pp in entry.criticals if pp.address in restore],
+                [pp for pp in entry.non_criticals if pp.address in restore],
+                entry.snapshot, minimal_writes, stats)
+        arg = None
+
+        while True:
+            try:
+                obj = gen.send(arg)
+
+                if isinstance(obj, ProgressUpdate):
+                    progress.subprogress = obj
+                    yield progress
+                    arg = None
+                else:
+                    arg = yield obj
+
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        yield progress.increment()
+
+    log.info("rollback_apply: %s", stats)
+    journal.clear()
+
+def get_critical_dependents(critical, non_criticals):
+    """Returns the non-critical parameters whose writes are guarded by the
+    given critical parameter. These are the parameters sharing the index of
+    the critical parameter (e.g. the voltage of an MHV-4 channel) or all
+    non-criticals if the critical parameter has no index."""
+    if critical.index is None:
+        return list(non_criticals)
+    return [pp for pp in non_criticals if pp.index == critical.index]
+
+def plan_parameter_writes(criticals, non_criticals, values, dest_values=None):
+    """Computes the writes needed to apply values to a destination.
+
+    Returns a tuple of three (address, value) lists: safe values for
+    critical parameters, non-critical writes and the final critical writes.
+
+    If dest_values is None all parameters are written and every critical
+    parameter is cycled through its safe value. Otherwise only parameters
+    whose destination value differs are written and critical parameters are
+    only set to their safe value if any of their dependents changes.
+    """
+    if dest_values is None:
+        return ([(pp.address, pp.safe_value) for pp in criticals],
+                [(pp.address, values[pp.address]) for pp in non_criticals],
+                [(pp.address, values[pp.address]) for pp in criticals])
+
+    def changed(pp):
+        return dest_values.get(pp.address, None) != values[pp.address]
+
+    safe_writes, writes, critical_writes = list(), list(), list()
+
+    for pp in non_criticals:
+        if changed(pp):
+            writes.append((pp.address, values[pp.address]))
+
+    for pp in criticals:
+        value      = values[pp.address]
+        needs_safe = (dest_values.get(pp.address, None) != pp.safe_value
+                and any(changed(dep) for dep in get_critical_dependents(pp, non_criticals)))
+
+        if needs_safe:
+            safe_writes.append((pp.address, pp.safe_value))
+
+            if value != pp.safe_value:
+                critical_writes.append((pp.address, value))
+
+        elif changed(pp):
+            critical_writes.append((pp.address, value))
+
+    return (safe_writes, writes, critical_writes)
+
+def _is_cache_current(dest, address):
+    # Hardware values are only trusted if they are kept up to date by
+    # polling. Others may have been changed on the device since they were
+    # read, e.g. by a power cycle or from the front panel. Primed values
+    # (see hardware_model.Device.prime_cached_memory()) are never trusted.
+    if not dest.has_cached_parameter(address):
+        return False
+
+    if hasattr(dest, 'is_parameter_verified') and not dest.is_parameter_verified(address):
+        return False
+
+    return not hasattr(dest, 'is_parameter_polled') or dest.is_parameter_polled(address)
+
+def read_destination_values(dest, addresses, values, stats=None):
+    """Fills the values dict with the destination values of the given
+    addresses. Cached values are used for config devices and for polled
+    hardware parameters. The remaining parameters are read from the
+    hardware, using bulk reads if the destination supports them. All reads
+    are queued at once. Parameters that cannot be read are left out of
+    values."""
+    missing = list()
+
+    for address in addresses:
+        if _is_cache_current(dest, address):
+            values[address] = dest.get_cached_parameter(address)
+        else:
+            missing.append(address)
+
+    if not len(missing):
+        return
+
+    if hasattr(dest, 'read_multi'):
+        wanted  = set(missing)
+        ranges  = memory_cache.make_read_ranges(missing)
+        futures = [dest.read_multi(first, count) for first, count in ranges]
+
+        yield futures
+
+        for (first, count), f in zip(ranges, futures):
+            try:
+                for result in f.result():
+                    if result.address in wanted:
+                        values[result.address] = result.value
+                if stats is not None:
+                    stats.read += count
+            except Exception as e:
+                log.debug("read_destination_values: reading %d parameters at %d failed: %s",
+                        count, first, e)
+    else:
+        futures = [dest.read_parameter(address) for address in missing]
+
+        yield futures
+
+        for address, f in zip(missing, futures):
+            try:
+                values[address] = f.result().value
+                if stats is not None:
+                    stats.read += 1
+            except Exception as e:
+                log.debug("read_destination_values: reading %d failed: %s", address, e)
+
+def apply_parameters(source, dest, criticals, non_criticals, minimal_writes=False, stats=None,
+        journal=None):
     """Write parameters from source to dest. First criticals are set to their
     safe value, then non_criticals are written to the destination and finally
     criticals are set to the value they have in the source device.
+
+    If minimal_writes is True the destination values are determined first
+    (see read_destination_values()) and only differing parameters are written.
+    Critical parameters are only cycled through their safe value if one of
+    their dependents changes (see plan_parameter_writes()).
+
+    If stats is an ApplyStats instance it is updated with the number of
+    planned and performed writes. If journal is an ApplyJournal the previous
+    values of all registers about to be written and the performed writes are
+    recorded in it (see write_parameter_values()).
     """
     def check_idcs():
         if source.idc != dest.idc:
@@ -832,6 +1458,9 @@ def apply_parameters(source, dest, criticals, non_criticals):
     check_idcs()
     values = dict()
 
+    if stats is None:
+        stats = ApplyStats()
+
     # Get available parameters directly from the sources cache. This is
     # mostly to smoothen progress updates as otherwise, if all parameters
     # are in the sources cache, progress would jump to around 50%
@@ -843,7 +1472,7 @@ def apply_parameters(source, dest, criticals, non_criticals):
 
     # number of parameters left to read from source
     total_progress  = (len(non_criticals) + len(criticals)) - len(values)
-    # number of parameters to be written to dest
+    # maximum number of parameters to be written to dest
     total_progress += len(non_criticals) + 2 * len(criticals)
 
     progress      = ProgressUpdate(current=0, total=total_progress)
@@ -879,77 +1508,429 @@ def apply_parameters(source, dest, criticals, non_criticals):
             gen.close()
             return
 
-    # Set safe values for critical parameters.
-    if len(criticals):
-        progress.text = "Setting critical parameters to safe values"
-
-    addr_values = ((pp.address, pp.safe_value) for pp in criticals)
-    gen = run_callables_generator([partial(dest.set_parameter, t[0], t[1])
-            for t in addr_values])
+    gen = write_parameter_values(dest, criticals, non_criticals, values,
+            minimal_writes, stats, journal, progress)
     arg = None
 
     while True:
         try:
-            obj = gen.send(arg)
-            if isinstance(obj, ProgressUpdate):
-                yield progress.increment()
-                arg = None
-            else:
-                arg = yield obj
+            arg = yield gen.send(arg)
         except StopIteration:
             break
         except GeneratorExit:
             gen.close()
             return
 
-    # Set non-criticals
-    progress.text = ("Writing to destination (%s,%d,%d)" %
-            (dest.mrc.get_display_url(), dest.bus, dest.address))
+def write_parameter_values(dest, criticals, non_criticals, values, minimal_writes=False,
+        stats=None, journal=None, progress=None):
+    """Writes the given address -> value dict to dest, ordering the writes
+    as described in apply_parameters().
+
+    If journal is not None the current values of all registers that are
+    going to be written are determined first and stored as a rollback
+    snapshot in the journal. Each write is recorded in the journal before it
+    is issued.
+    """
+    if stats is None:
+        stats = ApplyStats()
+
+    if progress is None:
+        progress = ProgressUpdate(current=0, total=0)
 
-    addr_values = ((pp.address, values[pp.address]) for pp in non_criticals)
-    gen = run_callables_generator([partial(dest.set_parameter, t[0], t[1])
-            for t in addr_values])
+    # Determine the current destination values.
+    dest_values = None
+
+    if minimal_writes:
+        progress.text = ("Reading from destination (%s,%d,%d)" %
+                (dest.mrc.get_display_url(), dest.bus, dest.address))
+        yield progress
+
+        dest_values = dict()
+        gen = read_destination_values(dest,
+                [pp.address for pp in itertools.chain(non_criticals, criticals)],
+                dest_values, stats)
+        arg = None
+
+        while True:
+            try:
+                arg = yield gen.send(arg)
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+    plan = plan_parameter_writes(criticals, non_criticals, values, dest_values)
+
+    stats.parameters += len(non_criticals) + len(criticals)
+    stats.planned    += sum(len(writes) for writes in plan)
+    progress.total    = progress.current + sum(len(writes) for writes in plan)
+
+    log.debug("apply_parameters: dest=%s, planned writes: safe=%s, non-critical=%s, critical=%s",
+            dest, *plan)
+
+    if journal is not None:
+        touched  = set(addr for writes in plan for addr, value in writes)
+        snapshot = dict((addr, dest_values[addr]) for addr in touched
+                if dest_values is not None and addr in dest_values)
+
+        progress.text = ("Saving rollback snapshot (%s,%d,%d)" %
+                (dest.mrc.get_display_url(), dest.bus, dest.address))
+        yield progress
+
+        gen = read_destination_values(dest,
+                sorted(touched.difference(snapshot)), snapshot, stats)
+        arg = None
+
+        while True:
+            try:
+                arg = yield gen.send(arg)
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        journal.record_snapshot(dest, criticals, non_criticals, snapshot)
+
+    def set_parameter(address, value):
+        if journal is not None:
+            journal.record_write(dest, address)
+        return dest.set_parameter(address, value)
+
+    texts = (
+            "Setting critical parameters to safe values",
+            "Writing to destination (%s,%d,%d)" % (
+                dest.mrc.get_display_url(), dest.bus, dest.address),
+            "Writing critical parameters to destination (%s,%d,%d)" % (
+                dest.mrc.get_display_url(), dest.bus, dest.address))
+
+    # Set safe values for critical parameters, then write non-criticals and
+    # finally set criticals to their config values.
+    for text, addr_values in zip(texts, plan):
+        if not len(addr_values):
+            continue
+
+        progress.text = text
+
+        gen = run_callables_generator([partial(set_parameter, t[0], t[1])
+                for t in addr_values])
+        arg = None
+
+        while True:
+            try:
+                obj = gen.send(arg)
+                if isinstance(obj, ProgressUpdate):
+                    yield progress.increment()
+                    arg = None
+                else:
+                    arg = yield obj
+
+                    if (isinstance(obj, future.Future) and obj.done()
+                            and not obj.cancelled() and obj.exception() is None):
+                        # The device may limit or reject the requested value.
+                        r = obj.result()
+                        if r.value == r.requested_value:
+                            stats.written += 1
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+    if minimal_writes:
+        log.info("apply_parameters: dest=%s: %s", dest, stats)
+
+    progress.text = "Parameters applied successfully"
+    yield progress
+
+    return
+
+class MirrorUnavailable(RuntimeError):
+    pass
+
+class MirrorVerifyError(RuntimeError):
+    """Raised if the mirror memory of a device does not contain the expected
+    values after writing it. mismatches maps addresses to
+    (expected, actual) tuples."""
+    def __init__(self, mismatches, device=None):
+        self.mismatches = mismatches
+        self.device     = device
+
+    def __str__(self):
+        return "MirrorVerifyError(device=%s, mismatches=%s)" % (
+                self.device, sorted(self.mismatches.items()))
+
+def _read_mirror_values(dest, addresses):
+    """Reads the given addresses from the mirror memory of dest. Requests for
+    all addresses are queued at once. Returns a future whose result is a dict
+    of address -> value or the first read error."""
+    ret     = future.Future()
+    futures = [dest.read_mirror_parameter(addr) for addr in addresses]
+
+    def on_reads_done(f):
+        errors = [rf.exception() for rf in futures if rf.exception() is not None]
+
+        if len(errors):
+            ret.set_exception(errors[0])
+        else:
+            ret.set_result(dict((rf.result().address, rf.result().value) for rf in futures))
+
+    future.all_done(*futures).add_done_callback(on_reads_done)
+    return ret
+
+def _write_parameters(dest, addr_values, written):
+    """Writes the given (address, value) pairs to the operating memory of
+    dest. Errors are yielded and may be retried or skipped. The addresses of
+    successful writes are appended to written."""
+    gen = run_callables_generator([partial(dest.set_parameter, addr, value)
+        for addr, value in addr_values])
     arg = None
+    last = None
 
     while True:
         try:
             obj = gen.send(arg)
+
             if isinstance(obj, ProgressUpdate):
-                yield progress.increment()
+                # run_callables_generator() reports progress only after a
+                # successful write. The device may still have limited the
+                # requested value.
+                r = last.result()
+                if r.value == r.requested_value:
+                    written.append(r.address)
                 arg = None
             else:
                 arg = yield obj
+
+                if isinstance(obj, future.Future):
+                    last = obj
         except StopIteration:
             break
         except GeneratorExit:
             gen.close()
             return
 
-    # Finally set criticals to their config values
-    if len(criticals):
-        progress.text = ("Writing critical parameters to destination (%s,%d,%d)" %
-            (dest.mrc.get_display_url(), dest.bus, dest.address))
+def apply_parameters_staged(source, dest, parameters, stats=None, journal=None):
+    """Apply the given parameters from source to dest using the destinations
+    mirror memory.
+
+    The current mirror contents are read and only differing values are
+    written to the mirror. The device keeps running with its current
+    configuration meanwhile. The mirror is then read back and verified and
+    finally the whole configuration is activated using a single copy command.
+
+    Critical parameters keep the ordering of apply_parameters(): the mirror
+    holds their safe values, they are set to their safe values before the
+    copy and their final values are written after the copy has activated
+    the non-critical parameters.
+
+    If writing or verifying fails and the user does not choose to retry, the
+    copy is not performed and the device keeps its previous configuration.
+    Raises MirrorUnavailable if the initial mirror read fails, e.g. because
+    the device or server does not support mirror memory. Nothing has been
+    written at that point.
+
+    Source read errors are yielded and may be retried or skipped. Skipped
+    parameters are neither written nor verified.
+
+    If journal is an ApplyJournal, the operating memory values of the
+    registers changed by the copy are recorded in it before activation.
+    """
+    if source.idc != dest.idc:
+        raise IDCConflict(
+                "IDCConflict: mrc=%s, bus=%d, dev=%d, src-idc=%d, dest-idc=%d" %
+                (source.mrc.get_display_url(), source.bus, source.address,
+                    source.idc, dest.idc))
+
+    if stats is None:
+        stats = ApplyStats()
+
+    addresses = [pp.address for pp in parameters]
+    progress  = ProgressUpdate(current=0, total=4)
+    display   = "(%s,%d,%d)" % (dest.mrc.get_display_url(), dest.bus, dest.address)
 
-    addr_values = ((pp.address, values[pp.address]) for pp in criticals)
-    gen = run_callables_generator([partial(dest.set_parameter, t[0], t[1])
-            for t in addr_values])
+    progress.text = "Reading from source %s" % display
+    yield progress
+
+    # All reads are queued at once. Read errors are yielded and may be retried
+    # or skipped like in apply_parameters(). Skipped addresses are left out.
+    values = dict()
+    gen = run_callables_generator([partial(source.get_parameter, addr)
+        for addr in addresses], batch_size=max(len(addresses), 1))
     arg = None
 
     while True:
         try:
             obj = gen.send(arg)
-            if isinstance(obj, ProgressUpdate):
-                yield progress.increment()
-                arg = None
-            else:
-                arg = yield obj
+            arg = None if isinstance(obj, ProgressUpdate) else (yield obj)
+
+            if isinstance(obj, future.Future) and obj.done() and not obj.exception():
+                r = obj.result()
+                values[r.address] = r.value
         except StopIteration:
             break
         except GeneratorExit:
             gen.close()
             return
 
-    progress.text = "Parameters applied successfully"
-    yield progress
+    addresses     = [addr for addr in addresses if addr in values]
+    parameters    = [pp for pp in parameters if pp.address in values]
+    criticals     = [pp for pp in parameters if pp.critical]
+    non_criticals = [pp for pp in parameters if not pp.critical]
 
-    return
+    # The mirror receives the final non-critical values and the safe values
+    # of the critical parameters. The copy thus never activates a critical
+    # value together with its dependents.
+    safe_writes, writes, critical_writes = plan_parameter_writes(
+            criticals, non_criticals, values)
+    targets = dict(writes + safe_writes)
+
+    if len(criticals):
+        progress.total += 2
+
+    progress.text = "Reading mirror memory %s" % display
+    yield progress.increment()
+
+    try:
+        mirror = (yield _read_mirror_values(dest, addresses)).result()
+    except Exception as e:
+        raise MirrorUnavailable(e)
+
+    stats.parameters += len(addresses)
+    stats.read       += len(addresses)
+
+    while True:
+        mirror_writes = [(addr, value) for addr, value in targets.items()
+                if mirror.get(addr) != value]
+        stats.planned += len(mirror_writes)
+
+        progress.text = "Writing %d parameters to mirror memory %s" % (
+                len(mirror_writes), display)
+        yield progress.increment()
+
+        futures = [dest.set_mirror_parameter(addr, value) for addr, value in mirror_writes]
+        yield future.all_done(*futures)
+
+        errors = [sf.exception() for sf in futures if sf.exception() is not None]
+        stats.written += len(futures) - len(errors)
+
+        if len(errors):
+            action = yield errors[0]
+        else:
+            progress.text = "Verifying mirror memory %s" % display
+            yield progress
+
+            try:
+                mirror = (yield _read_mirror_values(dest, addresses)).result()
+                mismatches = dict((addr, (value, mirror[addr]))
+                        for addr, value in targets.items() if mirror[addr] != value)
+                stats.read += len(addresses)
+            except Exception as e:
+                mismatches = None
+                action     = yield e
+
+            if mismatches is not None and not len(mismatches):
+                break
+
+            if mismatches:
+                action = yield MirrorVerifyError(mismatches, device=dest)
+
+        if action != ACTION_RETRY:
+            log.warning("apply_parameters_staged: %s: mirror not activated", display)
+            return
+
+        progress.current = 1
+
+    if journal is not None:
+        progress.text = "Saving rollback snapshot %s" % display
+        yield progress
+
+        current = dict()
+        gen = read_destination_values(dest, addresses, current, stats)
+        arg = None
+
+        while True:
+            try:
+                arg = yield gen.send(arg)
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        # Critical parameters are always cycled through their safe value.
+        touched = ([addr for addr, value in writes if current.get(addr) != value]
+                + [pp.address for pp in criticals])
+        journal.record_snapshot(dest, criticals, non_criticals,
+                dict((addr, current[addr]) for addr in touched if addr in current))
+
+        for addr in touched:
+            journal.record_write(dest, addr)
+
+    if len(safe_writes):
+        progress.text = "Setting critical parameters to safe values %s" % display
+        yield progress.increment()
+
+        stats.planned += len(safe_writes)
+        written = list()
+        gen = _write_parameters(dest, safe_writes, written)
+        arg = None
+
+        while True:
+            try:
+                arg = yield gen.send(arg)
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        stats.written += len(written)
+
+        if len(written) != len(safe_writes):
+            log.warning("apply_parameters_staged: %s: critical parameters not safe, "
+                    "mirror not activated", display)
+            return
+
+    progress.text = "Activating configuration %s" % display
+    yield progress.increment()
+
+    action = ACTION_RETRY
+
+    while action == ACTION_RETRY:
+        try:
+            (yield dest.copy_mirror()).result()
+            break
+        except Exception as e:
+            action = yield e
+
+            if action != ACTION_RETRY:
+                return
+
+    # The operating memory now equals the verified mirror contents.
+    for addr, value in targets.items():
+        dest.set_cached_parameter(addr, value)
+
+    if len(critical_writes):
+        progress.text = "Writing critical parameters to destination %s" % display
+        yield progress.increment()
+
+        stats.planned += len(critical_writes)
+        written = list()
+        gen = _write_parameters(dest, critical_writes, written)
+        arg = None
+
+        while True:
+            try:
+                arg = yield gen.send(arg)
+            except StopIteration:
+                break
+            except GeneratorExit:
+                gen.close()
+                return
+
+        stats.written += len(written)
+
+    progress.text = "Parameters applied successfully"
+    yield progress.increment()
@@ -53,29 +53,34 @@ __email__  = 'f.lueke@mesytec.com'
 
 from mesycontrol.qt import QtCore
 
-from xml.dom import minidom
 from xml.etree.ElementTree import TreeBuilder
 from xml.etree import ElementTree as ET
 
+import mesycontrol.config_binary as config_binary
 import mesycontrol.config_model as cm
+import mesycontrol.util as util
 
 version = 1
 
+SETUP_ATTRIBUTES  = ['autoconnect']
+MRC_ATTRIBUTES    = ['url', 'name', 'autoconnect']
+DEVICE_ATTRIBUTES = ['idc', 'bus', 'address', 'name', 'description']
+
 def read_setup(source):
     """Load a Setup from the given source.
-    Source may be a filename or a file like object."""
-    et   = ET.parse(source)
-    root = et.getroot()
+    Source may be a filename or a file like object.
 
-    if root.tag != 'mesycontrol':
-        raise ValueError("invalid root tag '%s', expected 'mesycontrol'" % root.tag)
+    The source is parsed incrementally: device configs are built as soon as
+    their element is complete and processed elements are discarded right away.
+    Memory usage is thus bounded by the size of a single device config
+    instead of the size of the whole file.
 
-    setup_node = root.find('setup')
+    Filenames ending in config_binary.FILE_EXTENSION are read using
+    config_binary.read_setup()."""
+    if config_binary.is_binary_filename(source):
+        return config_binary.read_setup(source)
 
-    if setup_node is None:
-        raise ValueError("No Setup found.")
-
-    ret = _setup_from_node(setup_node)
+    ret = _setup_from_events(ET.iterparse(source, events=('start', 'end')))
 
     if isinstance(source, (str,)):
         ret.filename = source
@@ -89,19 +94,19 @@ def write_setup(setup, dest, idc_to_parameter_names=dict()):
     Dest may be a filename or a file like object opened for writing.
     idc_to_parameter_names should map device_idc to a dictionary of
     param_address -> param_name.
+    Filenames ending in config_binary.FILE_EXTENSION are written using
+    config_binary.write_setup(). Parameter names are not stored in that case.
     """
+    if config_binary.is_binary_filename(dest):
+        return config_binary.write_setup(setup, dest)
+
     tb = CommentTreeBuilder()
     tb.start('mesycontrol', {'version': str(version)})
     _build_setup_tree(setup, idc_to_parameter_names, tb)
     tb.end('mesycontrol')
     tree = ET.ElementTree(tb.close())
-    data = _xml_tree_to_string(tree)
 
-    try:
-        dest.write(data)
-    except AttributeError:
-        with open(dest, 'w') as fp:
-            fp.write(data)
+    _write_tree(tree, dest)
 
 def read_device_config(source):
     et   = ET.parse(source)
@@ -127,14 +132,8 @@ def write_device_config(device_config, dest, parameter_names=dict()):
     _build_device_tree(device_config, parameter_names, tb)
     tb.end('mesycontrol')
     tree = ET.ElementTree(tb.close())
-    data = _xml_tree_to_string(tree)
 
-    try:
-        #dest.write(data.encode('utf-8'))
-        dest.write(data)
-    except AttributeError:
-        with open(dest, 'w') as fp:
-            fp.write(data)
+    _write_tree(tree, dest)
 
 class CommentTreeBuilder(TreeBuilder):
     def comment(self, data):
@@ -151,11 +150,9 @@ def _add_attribute_tags(tb, obj, attributes):
 def _build_device_tree(cfg, parameter_names, tb):
     tb.start('device_config', {})
 
-    attrs = ['idc', 'bus', 'address', 'name', 'description']
-
-    _add_attribute_tags(tb, cfg, attrs)
+    _add_attribute_tags(tb, cfg, DEVICE_ATTRIBUTES)
 
-    for address, value in sorted(cfg.get_cached_memory().items()):
+    for address, value in sorted(cfg.get_memory_snapshot().items()):
         if address in parameter_names:
             tb.comment(parameter_names[address])
 
@@ -169,83 +166,134 @@ def _build_device_tree(cfg, parameter_names, tb):
     tb.end("device_config")
 
 def _device_config_from_node(config_node):
-    attrs = ['idc', 'bus', 'address', 'name', 'description']
-    ret   = cm.Device()
+    attrs  = dict()
+    memory = dict()
+    ret    = cm.Device()
 
-    for attr in attrs:
-        n = config_node.find(attr)
-        if n is not None:
-            setattr(ret, attr, n.text)
+    # Single pass over the direct children of the config node.
+    for child in config_node:
+        tag = child.tag
 
-    for param_node in config_node.iter('parameter'):
-        attrs = param_node.attrib
-        ret.set_cached_parameter(int(attrs['address']), int(attrs['value']))
+        if tag == 'parameter':
+            attrib = child.attrib
+            memory[int(attrib['address'])] = int(attrib['value'])
+        elif tag == 'extension':
+            ret.set_extension(child.attrib['name'], xml2value(child.find('value')))
+        elif tag in DEVICE_ATTRIBUTES:
+            attrs.setdefault(tag, child.text)
 
-    for ext_node in config_node.iter('extension'):
-        name  = ext_node.attrib['name']
-        value = xml2value(ext_node.find('value'))
-        ret.set_extension(name, value)
+    for attr in DEVICE_ATTRIBUTES:
+        if attr in attrs:
+            setattr(ret, attr, attrs[attr])
+
+    ret.set_cached_memory(memory)
 
     ret.modified = False
 
     return ret
 
 def _build_mrc_tree(mrc_config, idc_to_parameter_names, tb):
-
-    attrs = ['url', 'name', 'autoconnect']
-
     tb.start('mrc_config', {})
-    _add_attribute_tags(tb, mrc_config, attrs)
+    _add_attribute_tags(tb, mrc_config, MRC_ATTRIBUTES)
 
     for device in mrc_config.get_devices():
         _build_device_tree(device, idc_to_parameter_names.get(device.idc, dict()), tb)
 
     tb.end('mrc_config')
 
-def _mrc_config_from_node(mrc_node):
-    attrs = ['url', 'name', 'autoconnect']
+def _parse_bool(text):
+    return text is not None and text.strip().lower() in ['true', 'y', 'yes', 'on', '1']
+
+def _mrc_config_from_values(attrs, devices):
     ret = cm.ConfigMrc()
 
-    for attr in attrs:
-        n = mrc_node.find(attr)
-        if n is not None:
-            try:
-                prop_t = getattr(cm.MRC, attr).type
-            except AttributeError:
-                prop_t = None
+    for attr in MRC_ATTRIBUTES:
+        if attr in attrs:
+            value = attrs[attr]
+            if attr == 'autoconnect':
+                value = _parse_bool(value)
+            setattr(ret, attr, value)
 
+    ret.add_devices(devices)
 
-            if prop_t is bool:
-                prop_v = n.text.lower() in ['true', 'y', 'yes', 'on', '1']
-            else:
-                prop_v = n.text
+    return ret
 
-            setattr(ret, attr, prop_v)
+def _setup_from_values(attrs, mrcs):
+    ret = cm.Setup()
 
-    for device_node in mrc_node.findall('device_config'):
-        ret.add_device(_device_config_from_node(device_node))
+    if 'autoconnect' in attrs:
+        ret.autoconnect = _parse_bool(attrs['autoconnect'])
 
-    return ret
+    ret.add_mrcs(mrcs)
 
-def _setup_from_node(setup_node):
-    attrs = ['autoconnect']
-    ret = cm.Setup()
+    return ret
 
-    for attr in attrs:
-        n = setup_node.find(attr)
-        if n is not None:
-            setattr(ret, attr, n.text)
+def _setup_from_events(events):
+    """Builds a cm.Setup from the (event, element) pairs produced by
+    ET.iterparse() with events=('start', 'end').
 
-    for mrc_node in setup_node.findall('mrc_config'):
-        ret.add_mrc(_mrc_config_from_node(mrc_node))
+    Only direct children are considered at each level, the same way the
+    element based reader used find() and findall(). Once a child of the
+    setup, an MRC config or the root has been processed, its parents children
+    are deleted.
+    """
+    stack       = list()    # currently open elements
+    setup_node  = None      # the first <setup> below the root
+    setup_attrs = dict()
+    mrcs        = list()
+    mrc_node    = None      # the currently open <mrc_config>
+    mrc_attrs   = dict()
+    devices     = list()
+    ret         = None
+
+    for event, elem in events:
+        if event == 'start':
+            if not len(stack):
+                if elem.tag != 'mesycontrol':
+                    raise ValueError("invalid root tag '%s', expected 'mesycontrol'" % elem.tag)
+            elif len(stack) == 1 and elem.tag == 'setup' and setup_node is None:
+                setup_node = elem
+            elif stack[-1] is setup_node and elem.tag == 'mrc_config':
+                mrc_node  = elem
+                mrc_attrs = dict()
+                devices   = list()
+
+            stack.append(elem)
+            continue
+
+        stack.pop()
+
+        if not len(stack):
+            break
+
+        parent = stack[-1]
+
+        if parent is mrc_node:
+            if elem.tag == 'device_config':
+                devices.append(_device_config_from_node(elem))
+            elif elem.tag in MRC_ATTRIBUTES:
+                mrc_attrs.setdefault(elem.tag, elem.text)
+            del parent[:]
+        elif parent is setup_node:
+            if elem is mrc_node:
+                mrcs.append(_mrc_config_from_values(mrc_attrs, devices))
+                mrc_node, devices = None, list()
+            elif elem.tag in SETUP_ATTRIBUTES:
+                setup_attrs.setdefault(elem.tag, elem.text)
+            del parent[:]
+        elif len(stack) == 1:
+            if elem is setup_node:
+                ret = _setup_from_values(setup_attrs, mrcs)
+            del parent[:]
+
+    if ret is None:
+        raise ValueError("No Setup found.")
 
     return ret
 
 def _build_setup_tree(setup, idc_to_parameter_names, tb):
-    attrs = ['autoconnect']
-
     tb.start('setup', {})
-    _add_attribute_tags(tb, setup, attrs)
+    _add_attribute_tags(tb, setup, SETUP_ATTRIBUTES)
 
     for mrc in setup.get_mrcs():
         _build_mrc_tree(mrc, idc_to_parameter_names, tb)
@@ -262,9 +310,71 @@ def _add_tag(tb, tag, value=None, attrs = {}):
     tb.end(tag)
 
 def _xml_tree_to_string(tree):
-    ugly   = ET.tostring(tree.getroot())
-    pretty = minidom.parseString(ugly).toprettyxml(indent='  ')
-    return pretty
+    chunks = list()
+    _serialize_tree(tree, chunks.append)
+    return ''.join(chunks)
+
+def _write_tree(tree, dest):
+    """Writes the tree to dest which may be a file like object or a filename.
+    Files are written atomically: the data goes to a temporary file in the
+    same directory which then replaces dest."""
+    if hasattr(dest, 'write'):
+        _serialize_tree(tree, dest.write)
+    else:
+        util.write_file_atomic(dest, lambda fp: _serialize_tree(tree, fp.write))
+
+# The serializer below produces the same output as the previously used
+# minidom.parseString(ET.tostring(root)).toprettyxml(indent='  ') without
+# building a DOM: elements containing only text are written on one line,
+# empty elements are self-closing and quotes are escaped like minidom does.
+
+def _escape(data):
+    if '&' in data:
+        data = data.replace('&', '&amp;')
+    if '<' in data:
+        data = data.replace('<', '&lt;')
+    if '"' in data:
+        data = data.replace('"', '&quot;')
+    if '>' in data:
+        data = data.replace('>', '&gt;')
+    return data
+
+def _serialize_tree(tree, write, addindent='  ', newl='\n'):
+    write('<?xml version="1.0" ?>' + newl)
+    _serialize_element(tree.getroot(), write, '', addindent, newl)
+
+def _serialize_element(elem, write, indent, addindent, newl):
+    if elem.tag is ET.Comment:
+        write('%s<!--%s-->%s' % (indent, elem.text, newl))
+        return
+
+    write(indent + '<' + elem.tag)
+
+    for name, value in elem.attrib.items():
+        write(' %s="%s"' % (name, _escape(value)))
+
+    text = elem.text or None
+
+    if not len(elem):
+        if text is None:
+            write('/>' + newl)
+        else:
+            write('>%s</%s>%s' % (_escape(text), elem.tag, newl))
+        return
+
+    write('>' + newl)
+    child_indent = indent + addindent
+
+    if text is not None:
+        write(_escape(child_indent + text + newl))
+
+    for child in elem:
+        _serialize_element(child, write, child_indent, addindent, newl)
+
+        if child.tail:
+            write(_escape(child_indent + child.tail + newl))
+
+    write('%s</%s>%s' % (indent, elem.tag, newl))
 
 def value2xml(tb, value):
     if isinstance(value, str):
@@ -303,7 +413,8 @@ def dict2xml(tb, d):
 def xml2value(node):
     t = node.attrib['type']
     if t == 'str':
-        return node.text
+        # value2xml() writes empty strings as elements without text.
+        return node.text if node.text is not None else str()
     elif t == 'int':
         return int(node.text)
     elif t == 'float':
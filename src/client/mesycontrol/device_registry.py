@@ -40,6 +40,36 @@ class VirtualDeviceModule(object):
     def has_widget_class(self):
         return False
 
+class LazyDeviceModule(object):
+    """Device module whose profile is loaded from the separate profile module
+    '<module_name>_profile'. The module itself, which contains the specialized
+    device and widget classes and pulls in the GUI, is imported on first
+    access to one of its attributes."""
+    def __init__(self, module_name, profile_module):
+        self.__name__       = module_name
+        self.idc            = profile_module.idc
+        self.profile_dict   = profile_module.profile_dict
+        self.profile        = device_profile.from_dict(profile_module.profile_dict)
+        self._module        = None
+
+    def get_module(self):
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def has_specialized_class(self):
+        return hasattr(self.get_module(), 'device_class')
+
+    def has_widget_class(self):
+        return hasattr(self.get_module(), 'device_ui_class')
+
+    def __getattr__(self, attr):
+        # Only called for attributes not set in __init__, e.g. device_class
+        # and device_ui_class.
+        if attr.startswith('__') or attr == '_module':
+            raise AttributeError(attr)
+        return getattr(self.get_module(), attr)
+
 class DeviceRegistry(object):
     """Provides access to device modules."""
     def __init__(self, auto_load_modules=False):
@@ -62,7 +92,22 @@ class DeviceRegistry(object):
         `module_name'.
         The module has to define three variables: `idc', `device_class' and
         `device_ui_class' containing the device idc, the device class and the
-        device UI class to use."""
+        device UI class to use.
+        If a module named `module_name'_profile exists only the profile is
+        loaded immediately. The module itself is imported once the device or
+        UI class is needed."""
+
+        try:
+            profile_module = importlib.import_module(module_name + '_profile')
+        except ModuleNotFoundError as e:
+            if e.name != module_name + '_profile':
+                raise
+        else:
+            module = LazyDeviceModule(module_name, profile_module)
+            self.modules[module.idc] = module
+            self.log.debug("Loaded device profile from '%s' for idc=%d, name=%s",
+                    profile_module.__name__, module.idc, module.profile.name)
+            return
 
         module                      = importlib.import_module(module_name)
         self.modules[module.idc]    = module
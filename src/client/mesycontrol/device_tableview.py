@@ -156,6 +156,7 @@ class DeviceTableModel(QtCore.QAbstractTableModel):
 
         signal_slot_map = {
                 'parameter_changed': self._on_hw_parameter_changed,
+                'memory_cleared': self._all_fields_changed,
                 'connected': self._on_hardware_connected,
                 'connecting': self._all_fields_changed,
                 'disconnected': self._all_fields_changed,
@@ -186,9 +187,11 @@ class DeviceTableModel(QtCore.QAbstractTableModel):
     def _on_device_config_set(self, app_device, old_cfg, new_cfg):
         if old_cfg is not None:
             old_cfg.parameter_changed.disconnect(self._on_cfg_parameter_changed)
+            old_cfg.memory_cleared.disconnect(self._all_fields_changed)
 
         if new_cfg is not None:
             new_cfg.parameter_changed.connect(self._on_cfg_parameter_changed)
+            new_cfg.memory_cleared.connect(self._all_fields_changed)
 
         self._all_fields_changed()
 
@@ -257,7 +257,9 @@ class MCFD16(DeviceBase):
 
         self.log = util.make_logging_source_adapter(__name__, self)
 
-        self.parameter_changed.connect(self._on_parameter_changed)
+        for pp in self.profile.get_parameters():
+            if re.match(r'(trigger|pair)_pattern\d+_.+', pp.name):
+                self.add_parameter_observer(pp.address, self._on_pattern_parameter_changed)
 
         self._on_hardware_set(app_device, None, self.hw)
 
@@ -380,10 +382,8 @@ class MCFD16(DeviceBase):
 
         return future.all_done(f_high, f_low)
 
-    def _on_parameter_changed(self, address, value):
+    def _on_pattern_parameter_changed(self, address, value):
         pp = self.profile[address]
-        if pp is None:
-            return
 
         if re.match(r'trigger_pattern\d_.+', pp.name):
             def done(f):
@@ -958,13 +958,13 @@ class DiscriminatorPage(QtWidgets.QGroupBox):
             display_mode=display_mode, write_mode=write_mode,
             target=self.cb_fast_veto))
 
-        device.parameter_changed.connect(self._on_device_parameter_changed)
+        device.add_parameter_observer('gain_common', self._on_device_gain_changed)
+        for i in range(NUM_GROUPS):
+            device.add_parameter_observer('gain_group%d' % i, self._on_device_gain_changed)
 
     # Device changes
-    def _on_device_parameter_changed(self, address, value):
+    def _on_device_gain_changed(self, address, value):
         pp = self.device.profile[address]
-        if pp is None:
-            return
 
         if pp.name == 'gain_common':
             self._update_threshold_label(self.threshold_label_common, 'common')
@@ -1213,8 +1213,14 @@ class RateMeasurementWidget(QtWidgets.QWidget):
         f_high = self.device.read_hw_parameter('frequency_high_byte')
 
         def freq_done(_):
-            low_byte  = int(f_low)
-            high_byte = int(f_high)
+            # Both bytes are taken from the same memory snapshot so that a
+            # poll update in between cannot mix two measurements.
+            try:
+                memory    = self.device.hw.get_memory_snapshot()
+                low_byte  = memory[self.device.profile['frequency_low_byte'].address]
+                high_byte = memory[self.device.profile['frequency_high_byte'].address]
+            except KeyError:
+                return
 
             freq = ((int(high_byte) << 8) | int(low_byte))
 
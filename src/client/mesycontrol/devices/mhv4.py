@@ -67,13 +67,12 @@ class MHV4(DeviceBase):
     def __init__(self, app_device, display_mode, write_mode, parent=None):
         super(MHV4, self).__init__(app_device, display_mode, write_mode, parent)
 
-        params = ('channel%d_polarity_write' % i for i in range(NUM_CHANNELS))
-        self._polarity_write_addresses = [self.profile[pn].address for pn in params]
-
-    def _on_hw_parameter_changed(self, address, value):
-        super(MHV4, self)._on_hw_parameter_changed(address, value)
+        for i in range(NUM_CHANNELS):
+            address = self.profile['channel%d_polarity_write' % i].address
+            self.app_device.add_hw_parameter_observer(address, self._on_hw_polarity_changed)
 
-        if self.write_mode & util.HARDWARE and address in self._polarity_write_addresses:
+    def _on_hw_polarity_changed(self, address, value):
+        if self.write_mode & util.HARDWARE:
             index = self.profile[address].index
             self.set_parameter('channel%d_voltage_write' % index, 0)
 
@@ -242,24 +241,18 @@ class ChannelWidget(QtWidgets.QWidget):
             pass
 
     def _current_updated(self, f_current):
-        def done(f_current_limit):
-            self._update_current_lcd_color(f_current, f_current_limit)
-
-        self.device.get_parameter('channel%d_current_limit_read' % self.channel
-                ).add_done_callback(done)
+        self._update_current_lcd_color()
 
     def _current_limit_updated(self, f_current_limit):
-        def done(f_current):
-            self._update_current_lcd_color(f_current, f_current_limit)
-
-        self.device.get_parameter('channel%d_current_read' % self.channel
-                ).add_done_callback(done)
+        self._update_current_lcd_color()
 
-    def _update_current_lcd_color(self, f_current, f_current_limit):
-        # Set LCD color to red if current limit is exceeded
+    def _update_current_lcd_color(self):
+        # Set LCD color to red if current limit is exceeded. Current and limit
+        # are taken from the same memory snapshot.
         try:
-            limit       = int(f_current_limit)
-            current     = abs(int(f_current))
+            memory      = self.device.get_memory_snapshot()
+            limit       = memory[self.device.profile['channel%d_current_limit_read' % self.channel].address]
+            current     = abs(memory[self.device.profile['channel%d_current_read' % self.channel].address])
 
             color       = 'red' if current >= limit else 'black'
             css         = 'QLCDNumber { color: %s; }' % color
@@ -199,6 +199,9 @@ class MSCF16(DeviceBase):
 
         self._auto_pz_channel = 0
 
+        self.app_device.add_hw_parameter_observer(
+                self.profile['auto_pz'].address, self._on_hw_auto_pz_changed)
+
         self._on_hardware_set(app_device, None, self.hw)
         self.extension_changed.connect(self._on_extension_changed)
 
@@ -343,8 +346,7 @@ class MSCF16(DeviceBase):
         jumpers = self.get_extension('gain_jumpers')
 
         if jumpers[group] != jumper_value:
-            jumpers[group] = jumper_value
-            self.set_extension('gain_jumpers', jumpers)
+            self.set_extension('gain_jumpers', jumpers.set(group, jumper_value))
 
     def apply_common_gain(self):
         return self._apply_common_to_single(
@@ -426,27 +428,21 @@ class MSCF16(DeviceBase):
         super(MSCF16, self)._on_hardware_set(app_device, old, new)
 
         if old is not None:
-            old.parameter_changed.disconnect(self._on_hw_parameter_changed)
-
             try:
                 old.remove_polling_subscriber(self)
             except KeyError:
                 pass
 
-        if new is not None:
-            new.parameter_changed.connect(self._on_hw_parameter_changed)
-
-    def _on_hw_parameter_changed(self, address, value):
-        if address == self.profile['auto_pz'].address:
-            # Refresh the channels PZ value once auto pz is done.
-            # auto_pz = 0 means auto pz is not currently running
-            # 0 < auto_pz <= NUM_CHANNELS means auto pz is running for that channel
-            # self._auto_pz_channel is the last channel that auto pz was running for
-            if self._auto_pz_channel is not None and 0 < self._auto_pz_channel <= NUM_CHANNELS:
-                self.read_hw_parameter('pz_value_channel%d' % (self._auto_pz_channel-1))
+    def _on_hw_auto_pz_changed(self, address, value):
+        # Refresh the channels PZ value once auto pz is done.
+        # auto_pz = 0 means auto pz is not currently running
+        # 0 < auto_pz <= NUM_CHANNELS means auto pz is running for that channel
+        # self._auto_pz_channel is the last channel that auto pz was running for
+        if self._auto_pz_channel is not None and 0 < self._auto_pz_channel <= NUM_CHANNELS:
+            self.read_hw_parameter('pz_value_channel%d' % (self._auto_pz_channel-1))
 
-            self._auto_pz_channel = value
-            self.auto_pz_channel_changed.emit(value)
+        self._auto_pz_channel = value
+        self.auto_pz_channel_changed.emit(value)
 
     def _on_extension_changed(self, name, value):
         if name == 'gain_jumpers':
@@ -1546,7 +1542,7 @@ class SettingsWidget(QtWidgets.QWidget):
         self.ui.combo_discriminator.currentIndexChanged.connect(self._discriminator_index_changed)
 
         self.device.extension_changed.connect(self._on_device_extension_changed)
-        self.device.parameter_changed.connect(self._on_device_parameter_changed)
+        self.device.add_parameter_observer('hardware_info', self._on_device_hardware_info_changed)
         self.device.read_mode_changed.connect(self._on_device_read_mode_changed)
         self._on_device_read_mode_changed(device.read_mode)
 
@@ -1598,9 +1594,8 @@ class SettingsWidget(QtWidgets.QWidget):
         for k, v in self.device.get_extensions().items():
             self._on_device_extension_changed(k, v)
 
-    def _on_device_parameter_changed(self, address, value):
-        if address == self.device.profile['hardware_info'].address:
-            self._update_gain_jumper_spins()
+    def _on_device_hardware_info_changed(self, address, value):
+        self._update_gain_jumper_spins()
 
     def _update_gain_jumper_spins(self):
         def done(f):
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Runs a mesycontrol script against many MRCs in parallel.
+
+Scripts block in nested event loops while waiting for results, so each MRC is
+handled by a separate worker process with its own script context. The scripts
+main(ctx, mrc, args) function is called exactly as by the single MRC script
+runner. Output of each run is captured and reported per MRC.
+"""
+
+import argparse
+import collections
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import pickle
+import sys
+import time
+import traceback
+
+FleetResult = collections.namedtuple('FleetResult', 'url ok result error output duration')
+"""Outcome of running a script against a single MRC. result is the return
+value of main() or its repr() if the value can not be pickled. error is the
+formatted traceback if the run failed. output holds everything written to
+stdout and stderr, including log messages. duration is given in seconds."""
+
+def run_script(url, script_file, script_args=(), log_level=logging.INFO):
+    """Connects to the MRC at url and runs main(ctx, mrc, script_args) from
+    script_file. Returns a FleetResult. Used as the worker function of
+    run_fleet()."""
+    from mesycontrol.script import get_script_context, load_module
+
+    output  = io.StringIO()
+    t_start = time.monotonic()
+    ok, result, error = False, None, None
+
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            module = load_module(script_file)
+
+            with get_script_context(log_level) as ctx:
+                mrc = ctx.make_mrc(url)
+
+                if not mrc.connectMrc():
+                    raise RuntimeError("Failed to connect to mrc %s" % url)
+
+                result = module.main(ctx, mrc, list(script_args))
+                ok     = True
+        except SystemExit as e:
+            ok    = e.code in (None, 0)
+            error = None if ok else "SystemExit: %s" % e.code
+        except BaseException:
+            error = traceback.format_exc()
+
+    try:
+        pickle.dumps(result)
+    except Exception:
+        result = repr(result)
+
+    return FleetResult(url, ok, result, error, output.getvalue(), time.monotonic() - t_start)
+
+def _run_script_star(args):
+    return run_script(*args)
+
+def run_fleet(script_file, urls, script_args=(), jobs=4, log_level=logging.INFO,
+        result_callback=None):
+    """Runs script_file against each of the given MRC urls using at most jobs
+    worker processes. result_callback is invoked with each FleetResult as soon
+    as the corresponding run completes. Returns the list of FleetResults in the
+    order of urls."""
+    tasks   = [(url, script_file, tuple(script_args), log_level) for url in urls]
+    results = dict()
+
+    if not len(tasks):
+        return list()
+
+    # Spawned workers do not inherit any Qt state from this process. Each
+    # worker handles a single MRC as script contexts are not meant to be
+    # reused.
+    pool = multiprocessing.get_context('spawn').Pool(
+            min(jobs, len(tasks)), maxtasksperchild=1)
+
+    try:
+        for result in pool.imap_unordered(_run_script_star, tasks):
+            results[result.url] = result
+
+            if result_callback is not None:
+                result_callback(result)
+
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return [results[url] for url in urls]
+
+def get_setup_urls(setup_file):
+    """Returns the urls of the MRCs contained in the given setup file."""
+    from mesycontrol import config_xml
+    return [mrc.url for mrc in config_xml.read_setup(setup_file).get_mrcs()]
+
+def format_summary(results):
+    lines = list()
+    width = max((len(r.url) for r in results), default=0)
+
+    for r in results:
+        lines.append("%-*s  %-6s  %7.2fs  %s" % (width, r.url, "ok" if r.ok else "FAILED",
+            r.duration, repr(r.result) if r.ok else r.error.strip().splitlines()[-1]))
+
+    n_failed = sum(1 for r in results if not r.ok)
+    lines.append("%d MRCs, %d succeeded, %d failed" % (len(results), len(results) - n_failed, n_failed))
+    return '\n'.join(lines)
+
+def fleet_runner_main(argv=None):
+    """
+    Entry point for the parallel script runner.
+    [--mrc URL]... [--setup FILE] [-j N] [--json FILE] [--quiet] [--debug] <script-py> [script-args]
+    """
+    parser = argparse.ArgumentParser(
+            description="Run a mesycontrol script against multiple MRCs in parallel."
+            " The script must contain a main(ctx, mrc, args) function as used by"
+            " mesycontrol_script_runner.")
+    parser.add_argument('--mrc', metavar='URL', action='append', default=list(),
+            help="MRC to run the script against. May be given multiple times."
+            " See mesycontrol_script_runner for accepted url schemes.")
+    parser.add_argument('--setup', metavar='FILE', action='append', default=list(),
+            help="Run the script against all MRCs contained in the setup FILE.")
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=4,
+            help="Maximum number of MRCs to run the script against concurrently (default: 4)")
+    parser.add_argument('--json', metavar='FILE',
+            help="Write the results as a JSON list to FILE ('-' for stdout).")
+    parser.add_argument('--quiet', action='store_true',
+            help="Only print the output of failed runs.")
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('script', metavar='script-py')
+    parser.add_argument('script_args', metavar='script-args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    urls = list(args.mrc)
+
+    for setup_file in args.setup:
+        urls.extend(get_setup_urls(setup_file))
+
+    # Keep the order but run each MRC only once.
+    urls = list(collections.OrderedDict.fromkeys(urls))
+
+    if not len(urls):
+        parser.error("no MRCs given, use --mrc or --setup")
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    out = sys.stderr if args.json == '-' else sys.stdout
+
+    def on_result(result):
+        print("===== %s: %s (%.2fs) =====" % (result.url, "ok" if result.ok else "FAILED",
+            result.duration), file=out)
+
+        if not args.quiet or not result.ok:
+            if result.output:
+                print(result.output.rstrip('\n'), file=out)
+            if result.error:
+                print(result.error.rstrip('\n'), file=out)
+
+        out.flush()
+
+    try:
+        results = run_fleet(args.script, urls, args.script_args, args.jobs,
+                logging.DEBUG if args.debug else logging.INFO, on_result)
+    except KeyboardInterrupt:
+        return 130
+
+    print(format_summary(results), file=out)
+
+    if args.json:
+        data = [r._asdict() for r in results]
+
+        if args.json == '-':
+            json.dump(data, sys.stdout, indent=2, default=repr)
+            sys.stdout.write('\n')
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(data, f, indent=2, default=repr)
+
+    return 0 if all(r.ok for r in results) else 1
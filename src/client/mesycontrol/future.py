@@ -22,7 +22,6 @@ __author__ = 'Florian Lüke'
 __email__  = 'f.lueke@mesytec.com'
 
 from mesycontrol.qt import QtCore
-from mesycontrol.qt import QtWidgets
 from mesycontrol.qt import Property
 from mesycontrol.qt import Signal
 
@@ -258,6 +257,57 @@ def all_done(*futures):
 
     return ret
 
+def first_done(*futures):
+    """Returns a future that completes once any of the given futures
+    completes. The returned futures result will be the first completed
+    future.
+    """
+    ret = Future()
+
+    def on_future_done(f):
+        if not ret.done():
+            ret.set_result(f)
+
+    for f in futures:
+        f.add_done_callback(on_future_done)
+
+    if len(futures) == 0:
+        ret.set_result(None)
+
+    return ret
+
+class Semaphore(object):
+    """Limits the number of concurrently running operations.
+    acquire() returns a Future which completes once a slot is available. The
+    slot has to be given back by calling release(). Waiters are served in
+    order of their acquire() calls. A limit of None or <= 0 means unlimited.
+    """
+    def __init__(self, limit=None):
+        self.limit   = limit
+        self.active  = 0
+        self.waiters = list()
+
+    def acquire(self):
+        ret = Future()
+
+        if not self.limit or self.limit <= 0 or self.active < self.limit:
+            self.active += 1
+            ret.set_result(True)
+        else:
+            self.waiters.append(ret)
+
+        return ret
+
+    def release(self):
+        while len(self.waiters):
+            f = self.waiters.pop(0)
+            if not f.done():
+                # Hand the slot directly to the next waiter.
+                f.set_result(True)
+                return
+
+        self.active = max(self.active - 1, 0)
+
 def progress_forwarder(source, dest):
     def callback(f):
         dest.set_progress_range(source.progress_range())
@@ -362,6 +412,8 @@ def future_progress_dialog(cancelable=True):
             if f.done():
                 return
 
+            from mesycontrol.qt import QtWidgets
+
             fo = FutureObserver(the_future=f)
             pd = QtWidgets.QProgressDialog()
 
@@ -379,13 +431,39 @@ def future_progress_dialog(cancelable=True):
 
     return deco
 
+def wait_all(futures, timeout=None):
+    """Waits for all of the given futures to complete.
+    A single local Qt event loop is run until all futures are done or timeout
+    seconds have passed. A timeout of None waits forever.
+    Returns True if all futures completed, False if the timeout expired.
+    """
+    pending = [f for f in futures if not f.done()]
+
+    if not len(pending):
+        return True
+
+    loop = QtCore.QEventLoop()
+    all_done(*pending).add_done_callback(lambda f: loop.quit())
+
+    timer = QtCore.QTimer()
+    timer.setSingleShot(True)
+    timer.timeout.connect(loop.quit)
+
+    if timeout is not None:
+        timer.start(int(timeout * 1000))
+
+    if not all(f.done() for f in pending):
+        loop.exec_()
+
+    timer.stop()
+
+    return all(f.done() for f in pending)
+
 # Waits for the result of the given future to be available and returns the
 # result.
 def get_future_result(theFuture):
-    observer = FutureObserver(theFuture)
-    if not observer.future.done():
-        util.wait_for_signal(signal=observer.done)
-    return observer.result()
+    wait_all([theFuture])
+    return theFuture.result()
 
 if __name__ == "__main__":
     ret = Future()
@@ -1236,9 +1236,17 @@ Initialize using the current hardware values or the device defaults?
         if not len(devices):
             return
 
+        settings = self.context.make_qsettings()
+        journal  = config_util.ApplyJournal()
+
         runner = config_gui.ApplyDeviceConfigsRunner(
                 devices=devices,
-                parent_widget=self.mainwindow)
+                parent_widget=self.mainwindow,
+                minimal_writes=bool(settings.value(
+                    'Options/minimal_config_apply', False, type=bool)),
+                staged=bool(settings.value(
+                    'Options/staged_config_apply', False, type=bool)),
+                journal=journal)
         progress_dialog = config_gui.SubProgressDialog(title="Applying config to hardware")
 
         runner.progress_changed.connect(progress_dialog.set_progress)
@@ -1252,6 +1260,34 @@ Initialize using the current hardware values or the device defaults?
             log.error("Apply config: %s", f.exception())
             QtWidgets.QMessageBox.critical(self.mainwindow, "Error", str(f.exception()))
 
+        # Canceled, aborted or failed: offer to restore the touched registers.
+        failed = not f.done() or f.exception() is not None or f.result() is False
+
+        if failed and len(journal):
+            auto_rollback = bool(settings.value(
+                'Options/auto_rollback_config_apply', False, type=bool))
+
+            if auto_rollback or QtWidgets.QMessageBox.question(
+                    self.mainwindow, "Rollback",
+                    "Applying the config did not complete. %d registers have been written.\n"
+                    "Restore their previous values?" % len(journal)) == QtWidgets.QMessageBox.Yes:
+                self._rollback_config_apply(journal)
+
+    def _rollback_config_apply(self, journal):
+        runner = config_gui.RollbackRunner(journal=journal, parent_widget=self.mainwindow)
+        progress_dialog = config_gui.SubProgressDialog(title="Restoring previous hardware values")
+
+        runner.progress_changed.connect(progress_dialog.set_progress)
+        progress_dialog.canceled.connect(runner.close)
+        f = runner.start()
+        fo = future.FutureObserver(f)
+        fo.done.connect(progress_dialog.close)
+        progress_dialog.exec_()
+
+        if f.done() and f.exception() is not None:
+            log.error("Rollback: %s", f.exception())
+            QtWidgets.QMessageBox.critical(self.mainwindow, "Error", str(f.exception()))
+
     def _apply_hardware_to_config(self):
         # FIXME: this does not work for MRCs that have never been connected as
         # the device list will be empty which will cause the runners generator
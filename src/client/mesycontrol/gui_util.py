@@ -37,6 +37,7 @@ from mesycontrol.ui.dialogs import AddMRCDialog
 import mesycontrol.basic_model as bm
 import mesycontrol.config_model as cm
 import mesycontrol.config_tree_model as ctm
+import mesycontrol.config_binary as config_binary
 import mesycontrol.config_xml as config_xml
 import mesycontrol.hardware_tree_model as htm
 import mesycontrol.util as util
@@ -469,6 +470,9 @@ def run_save_setup(context, parent_widget):
         #QtWidgets.QMessageBox.critical(parent_widget, "Error", "Saving setup %s failed:\n%s" % (setup.filename, e))
         return False
 
+SETUP_FILE_FILTER = "XML files (*.xml);;Binary setup files (*%s);; *" % (
+        config_binary.FILE_EXTENSION)
+
 def run_save_setup_as_dialog(context, parent_widget):
     setup = context.app_registry.cfg
 
@@ -479,7 +483,7 @@ def run_save_setup_as_dialog(context, parent_widget):
 
     filename = QtWidgets.QFileDialog.getSaveFileName(
         parent_widget, "Save setup as",
-        dir=directory_hint, filter="XML files (*.xml);; *")[0]
+        dir=directory_hint, filter=SETUP_FILE_FILTER)[0]
 
     if not len(filename):
         return False
@@ -522,7 +526,7 @@ def run_open_setup_dialog(context, parent_widget):
 
     filename = QtWidgets.QFileDialog.getOpenFileName(
         parent_widget, "Open setup file",
-        dir=directory_hint, filter="XML files (*.xml);; *")[0]
+        dir=directory_hint, filter=SETUP_FILE_FILTER)[0]
 
     if not len(filename):
         return False
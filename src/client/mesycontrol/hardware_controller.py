@@ -23,6 +23,7 @@ __email__  = 'f.lueke@mesytec.com'
 
 from mesycontrol.qt import QtCore
 import functools
+import time
 import typing
 import weakref
 
@@ -60,12 +61,17 @@ class Controller(object):
         self._connect_timer.timeout.connect(self._on_connect_timer_timeout)
         self._connect_future = None
 
+        # Maps bus numbers to [scanbus future, completion time]. The time is
+        # None while the scan is pending.
+        self._scanbus_cache = dict()
+
         def on_connected():
             self.log.debug("on_connected: scannning MRC busses")
             for i in bm.BUS_RANGE:
                 self.scanbus(i)
 
         self.connection.connected.connect(on_connected)
+        self.connection.disconnected.connect(self.invalidate_scanbus_cache)
         self.connection.notification_received.connect(self._on_notification_received)
 
     def set_mrc(self, mrc):
@@ -127,8 +133,9 @@ class Controller(object):
         self.log.debug(f"disconnectMrc: {self=}, {self.connection=}")
         return self.connection.disconnectMrc()
 
-    def read_parameter(self, bus, device, address):
+    def read_parameter(self, bus, device, address, mirror=False):
         """Read the parameter at (bus, device address).
+        If mirror is True the devices mirror memory is read instead.
         Returns a basic_model.ResultFuture containing a basic_model.ReadResult
         instance on success.
         """
@@ -147,7 +154,7 @@ class Controller(object):
         m.request_read.bus      = bus
         m.request_read.dev      = device
         m.request_read.par      = address
-        m.request_read.mirror   = False
+        m.request_read.mirror   = mirror
 
         request_future = self.connection.queue_request(m).add_done_callback(
                 on_response_received)
@@ -163,8 +170,77 @@ class Controller(object):
 
         return ret
 
-    def set_parameter(self, bus, device, address, value):
+    def read_multi(self, bus, device, address, count):
+        """Read count consecutive parameters starting at (bus, device, address).
+        Uses the read multi request if the MRC supports it. Otherwise single
+        read requests are queued for each of the addresses.
+        Returns a basic_model.ResultFuture containing a list of
+        basic_model.ReadResult instances on success.
+        """
+        ret = bm.ResultFuture()
+
+        if not self.has_read_multi():
+            futures = [self.read_parameter(bus, device, address + i) for i in range(count)]
+
+            def on_reads_done(f):
+                if ret.done():
+                    return
+
+                # Observe all exceptions, not just the first one.
+                errors = [rf.exception() for rf in futures if rf.exception() is not None]
+
+                if len(errors):
+                    ret.set_exception(errors[0])
+                else:
+                    ret.set_result([rf.result() for rf in futures])
+
+            def cancel_reads(f):
+                if f.cancelled():
+                    for rf in futures:
+                        rf.cancel()
+
+            future.all_done(*futures).add_done_callback(on_reads_done)
+            ret.add_done_callback(cancel_reads)
+            return ret
+
+        def on_response_received(f):
+            if ret.done():
+                return
+
+            try:
+                values = f.result().response.response_read_multi.values
+                ret.set_result([bm.ReadResult(bus, device, address + i, value)
+                    for i, value in enumerate(values)])
+            except Exception as e:
+                ret.set_exception(e)
+
+        m = proto.Message()
+        m.type = proto.Message.REQ_READ_MULTI
+        m.request_read_multi.bus    = bus
+        m.request_read_multi.dev    = device
+        m.request_read_multi.par    = address
+        m.request_read_multi.count  = count
+
+        request_future = self.connection.queue_request(m).add_done_callback(
+                on_response_received)
+
+        def cancel_request(f):
+            if f.cancelled():
+                request_future.cancel()
+
+        ret.add_done_callback(cancel_request)
+
+        return ret
+
+    def has_read_multi(self):
+        """True if the MRC reported support for the read multi command."""
+        status = self.mrc.get_status() if self.mrc is not None else None
+        return status is not None and status.has_read_multi
+
+    def set_parameter(self, bus, device, address, value, mirror=False):
         """Set the parameter at (bus, device, address) to the given value.
+        If mirror is True the value is written to the devices mirror memory
+        instead.
         Returns a basic_model.ResultFuture containing a basic_model.SetResult
         instance on success.
         """
@@ -184,7 +260,38 @@ class Controller(object):
         m.request_set.dev       = int(device)
         m.request_set.par       = int(address)
         m.request_set.val       = int(value)
-        m.request_set.mirror    = False
+        m.request_set.mirror    = mirror
+        request_future = self.connection.queue_request(m).add_done_callback(on_response_received)
+
+        def cancel_request(f):
+            if f.cancelled():
+                request_future.cancel()
+
+        ret.add_done_callback(cancel_request)
+
+        return ret
+
+    def copy_mirror(self, bus, device):
+        """Copies the mirror memory of the device at (bus, device) to its
+        operating memory, activating all values previously written to the
+        mirror.
+        Returns a basic_model.ResultFuture containing the boolean response on
+        success.
+        """
+        ret = bm.ResultFuture()
+
+        def on_response_received(f):
+            try:
+                if not f.cancelled():
+                    ret.set_result(f.result().response.response_bool.value)
+            except Exception as e:
+                if not ret.done():
+                    ret.set_exception(e)
+
+        m = proto.Message()
+        m.type = proto.Message.REQ_COPY
+        m.request_copy.bus = int(bus)
+        m.request_copy.dev = int(device)
         request_future = self.connection.queue_request(m).add_done_callback(on_response_received)
 
         def cancel_request(f):
@@ -196,18 +303,56 @@ class Controller(object):
         return ret
 
     def scanbus(self, bus):
+        m = proto.Message()
+        m.type = proto.Message.REQ_SCANBUS
+        m.request_scanbus.bus = bus
+        ret   = self.connection.queue_request(m)
+        entry = self._scanbus_cache[bus] = [ret, None]
+
         def on_bus_scanned(f):
+            cacheable = False
+
             try:
-                self._handle_scanbus_result(f.result().response)
+                cacheable = self._handle_scanbus_result(f.result().response)
             except Exception:
                 self.log.exception("%s: scanbus error" % self)
 
-        m = proto.Message()
-        m.type = proto.Message.REQ_SCANBUS
-        m.request_scanbus.bus = bus
-        return self.connection.queue_request(m).add_done_callback(on_bus_scanned)
+            if self._scanbus_cache.get(bus) is entry:
+                if cacheable:
+                    entry[1] = time.monotonic()
+                else:
+                    del self._scanbus_cache[bus]
+
+        return ret.add_done_callback(on_bus_scanned)
+
+    def scanbus_cached(self, bus, max_age_ms=hm.DEFAULT_SCANBUS_MAX_AGE_MS):
+        """Returns the future of a pending scanbus request for the given bus or
+        of a completed one that is not older than max_age_ms. Otherwise a new
+        scan is issued.
+        Results reporting address conflicts or errors are never reused. The
+        cache is invalidated on disconnect, by scanbus notifications and by RC
+        changes.
+        """
+        entry = self._scanbus_cache.get(bus)
+
+        if entry is not None:
+            f, t_done = entry
+
+            if t_done is None or (time.monotonic() - t_done) * 1000.0 <= max_age_ms:
+                self.log.debug("%s: scanbus_cached: reusing scan of bus %d", self, bus)
+                return f
+
+        return self.scanbus(bus)
+
+    def invalidate_scanbus_cache(self, bus=None):
+        if bus is None:
+            self._scanbus_cache.clear()
+        else:
+            self._scanbus_cache.pop(bus, None)
 
     def set_rc(self, bus, device, on_off):
+        self.invalidate_scanbus_cache(bus)
+
         m = proto.Message()
         m.type = proto.Message.REQ_RC
         m.request_rc.bus = bus
@@ -278,6 +423,23 @@ class Controller(object):
         except KeyError:
             return future.Future().set_result(False)
 
+    def is_polled(self, bus, device, address):
+        """True if the given parameter is part of any poll subscription."""
+        for items in self._poll_subscriptions.values():
+            for item_bus, item_dev, item in items:
+                if (item_bus, item_dev) != (bus, device):
+                    continue
+
+                try:
+                    lower, upper = item
+                except TypeError:
+                    lower = upper = item
+
+                if lower <= address <= upper:
+                    return True
+
+        return False
+
     def _send_poll_request(self):
         # Merge all poll items into one set.
         # Note: This does not try to merge any overlapping ranges. Those will
@@ -348,6 +510,10 @@ class Controller(object):
                     device.set_cached_parameter(res.par, res.val)
 
         elif msg.type == proto.Message.NOTIFY_SCANBUS:
+            # The bus state changed on the server side. Cached scans are
+            # stale now.
+            if not proto.is_error_response(msg):
+                self.invalidate_scanbus_cache(msg.scanbus_result.bus)
             self._handle_scanbus_result(msg)
 
         elif msg.type == proto.Message.NOTIFY_WRITE_ACCESS:
@@ -360,9 +526,12 @@ class Controller(object):
                     msg.notify_silenced.silenced)
 
     def _handle_scanbus_result(self, msg):
+        """Updates the hardware model from the given scanbus result.
+        Returns True if the result may be cached, i.e. it is not an error and
+        there are no address conflicts on the bus."""
         if proto.is_error_response(msg):
             self.log.error("%s: scanbus error: %s", self, msg)
-            return
+            return False
 
         bus     = msg.scanbus_result.bus
         entries = msg.scanbus_result.entries
@@ -400,3 +569,5 @@ class Controller(object):
                     self.log.debug("%s: scanbus: address conflict on (%d, %d)", self, bus, addr)
 
         self.mrc.address_conflict = any((d.address_conflict for d in self.mrc))
+
+        return not any(entries[addr].conflict for addr in bm.DEV_RANGE)
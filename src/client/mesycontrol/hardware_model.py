@@ -37,6 +37,8 @@ import typing
 
 
 DEFAULT_CONNECT_TIMEOUT_MS = 10000
+# Scanbus results younger than this are reused by HardwareMrc.scanbus_cached().
+DEFAULT_SCANBUS_MAX_AGE_MS = 5000
 
 class AddressConflict(RuntimeError):
     def __str__(self):
@@ -163,6 +165,18 @@ class HardwareMrc(bm.BasicMrc):
         self.disconnected.connect(device.disconnected)
         self.connection_error.connect(device.connection_error)
 
+    def add_devices(self, devices):
+        devices = list(devices)
+        ret = super(HardwareMrc, self).add_devices(devices)
+
+        for device in devices:
+            self.connected.connect(device.connected)
+            self.connecting.connect(device.connecting)
+            self.disconnected.connect(device.disconnected)
+            self.connection_error.connect(device.connection_error)
+
+        return ret
+
     def remove_device(self, device):
         super(HardwareMrc, self).remove_device(device)
 
@@ -227,15 +241,26 @@ class HardwareMrc(bm.BasicMrc):
         for device in self:
             device.clear_cached_memory()
 
-    def read_parameter(self, bus, device, address):
-        return self.controller.read_parameter(bus, device, address)
+    def read_parameter(self, bus, device, address, mirror=False):
+        return self.controller.read_parameter(bus, device, address, mirror)
 
-    def set_parameter(self, bus, device, address, value):
-        return self.controller.set_parameter(bus, device, address, value)
+    def read_multi(self, bus, device, address, count):
+        return self.controller.read_multi(bus, device, address, count)
+
+    def set_parameter(self, bus, device, address, value, mirror=False):
+        return self.controller.set_parameter(bus, device, address, value, mirror)
+
+    def copy_mirror(self, bus, device):
+        return self.controller.copy_mirror(bus, device)
 
     def scanbus(self, bus):
         return self.controller.scanbus(bus)
 
+    def scanbus_cached(self, bus, max_age_ms=DEFAULT_SCANBUS_MAX_AGE_MS):
+        """Like scanbus() but reuses a pending or recent scan of the bus.
+        See Controller.scanbus_cached()."""
+        return self.controller.scanbus_cached(bus, max_age_ms)
+
     def __str__(self):
         return "hm.HardwareMrc(id=%s, url=%s, connected=%s)" % (
                 hex(id(self)), self.url, self.is_connected())
@@ -259,17 +284,91 @@ class Device(bm.Device):
 
         self._address_conflict = False
         self._rc = False
+        self._unverified = set() # addresses primed from a memory cache
 
     def _read_parameter(self, address):
         if self.address_conflict:
             return future.Future().set_exception(AddressConflict())
         return self.mrc.read_parameter(self.bus, self.address, address)
 
+    def read_multi(self, address, count):
+        """Read count consecutive parameters starting at the given address.
+        Returns a ResultFuture whose result is a list of ReadResult instances.
+        The local memory cache is updated on success."""
+        if self.address_conflict:
+            return future.Future().set_exception(AddressConflict())
+
+        def on_parameters_read(f):
+            if not f.cancelled() and f.exception() is None:
+                for result in f.result():
+                    self.set_cached_parameter(result.address, result.value)
+
+        return self.mrc.read_multi(self.bus, self.address, address, count
+                ).add_done_callback(on_parameters_read)
+
+    def set_cached_parameter(self, address, value):
+        self._unverified.discard(address)
+        return super(Device, self).set_cached_parameter(address, value)
+
+    def clear_cached_memory(self):
+        self._unverified.clear()
+        return super(Device, self).clear_cached_memory()
+
+    def prime_cached_memory(self, memory):
+        """Fills the memory cache with previously stored values. Addresses
+        already present in the cache are not touched. Primed values are marked
+        as unverified until they are read from or written to the hardware.
+        Returns the set of primed addresses."""
+        primed = set()
+
+        for address, value in memory.items():
+            if not self.has_cached_parameter(address):
+                super(Device, self).set_cached_parameter(address, value)
+                primed.add(address)
+
+        self._unverified.update(primed)
+        return primed
+
+    def discard_unverified_parameters(self):
+        """Removes all unverified values from the memory cache."""
+        for address in sorted(self._unverified):
+            self.clear_cached_parameter(address)
+        self._unverified.clear()
+
+    def is_parameter_verified(self, address):
+        return address not in self._unverified
+
+    def get_unverified_addresses(self):
+        return set(self._unverified)
+
     def _set_parameter(self, address, value):
         if self.address_conflict:
             return future.Future().set_exception(AddressConflict())
         return self.mrc.set_parameter(self.bus, self.address, address, value)
 
+    def read_mirror_parameter(self, address):
+        """Reads the parameter at the given address from the devices mirror
+        memory. The local memory cache is not modified."""
+        if self.address_conflict:
+            return future.Future().set_exception(AddressConflict())
+        return self.mrc.read_parameter(self.bus, self.address, address, mirror=True)
+
+    def set_mirror_parameter(self, address, value):
+        """Writes the value to the devices mirror memory. The device keeps
+        operating with its current values until copy_mirror() is called. The
+        local memory cache is not modified."""
+        if self.address_conflict:
+            return future.Future().set_exception(AddressConflict())
+        return self.mrc.set_parameter(self.bus, self.address, address, value, mirror=True)
+
+    def copy_mirror(self):
+        """Activates the contents of the mirror memory (CP command).
+        The local memory cache is not updated. Callers knowing the mirror
+        contents should update it themselves."""
+        if self.address_conflict:
+            return future.Future().set_exception(AddressConflict())
+        return self.mrc.copy_mirror(self.bus, self.address)
+
     def get_controller(self):
         return self.mrc.controller
 
@@ -324,6 +423,11 @@ class Device(bm.Device):
     def remove_polling_subscriber(self, subscriber):
         return self.controller.remove_polling_subscriber(subscriber)
 
+    def is_parameter_polled(self, address):
+        """True if the parameter is polled and its cached value is thus kept
+        up to date by poll notifications."""
+        return self.controller.is_polled(self.bus, self.address, address)
+
     def is_connected(self):
         return self.mrc.is_connected()
 
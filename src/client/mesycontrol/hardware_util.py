@@ -26,6 +26,7 @@ import itertools
 import logging
 
 from mesycontrol.config_util import run_callables_generator
+from mesycontrol.config_util import READ_BATCH_SIZE
 from mesycontrol.config_util import ProgressUpdate
 
 def refresh_device_memory(devices):
@@ -59,7 +60,8 @@ def refresh_device_memory(devices):
         addresses = set(itertools.chain(params, cached))
 
         gen = run_callables_generator(
-                [partial(device.hw.read_parameter, a) for a in addresses])
+                [partial(device.hw.read_parameter, a) for a in addresses],
+                batch_size=READ_BATCH_SIZE)
         arg = None
 
         while True:
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Minimal HTTP/1.1 server running in the Qt event loop.
+
+Handlers run in the Qt thread and can therefore access the models directly.
+Each connection serves a single GET or HEAD request and is closed afterwards.
+A handler returns a Response or a future.Future yielding a Response. The latter
+allows to answer a request later, e.g. for long-polling.
+"""
+
+import collections
+import http
+import urllib.parse
+
+from mesycontrol.qt import QtCore
+from mesycontrol.qt import QtNetwork
+from mesycontrol.future import Future
+import mesycontrol.util as util
+
+MAX_REQUEST_SIZE = 64 * 1024
+
+Request = collections.namedtuple('Request', 'method path query headers')
+"""path is the unquoted request path, query a dict of the first value of
+each query parameter and headers a dict with lowercase keys."""
+
+class Response(object):
+    def __init__(self, status=200, body=b'', content_type='text/plain; charset=utf-8',
+            headers=None):
+        self.status         = status
+        self.body           = body.encode('utf-8') if isinstance(body, str) else body
+        self.content_type   = content_type
+        self.headers        = dict(headers) if headers is not None else dict()
+
+def parse_request(data):
+    """Parses the request line and headers of data. Raises ValueError on
+    malformed requests."""
+    head  = data.split(b'\r\n\r\n', 1)[0].decode('iso-8859-1')
+    lines = head.split('\r\n')
+    parts = lines[0].split(' ')
+
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise ValueError("invalid request line '%s'" % lines[0])
+
+    method, target, version = parts
+    headers = dict()
+
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise ValueError("invalid header line '%s'" % line)
+        headers[name.strip().lower()] = value.strip()
+
+    url   = urllib.parse.urlsplit(target)
+    query = dict((k, v[0]) for k, v in urllib.parse.parse_qs(url.query).items())
+
+    return Request(method, urllib.parse.unquote(url.path), query, headers)
+
+class HttpServer(QtCore.QObject):
+    """Dispatches requests to handlers registered with add_route(). The
+    handler with the longest matching path prefix is used."""
+    def __init__(self, parent=None):
+        super(HttpServer, self).__init__(parent)
+        self.log     = util.make_logging_source_adapter(__name__, self)
+        self._routes = list()
+        self._connections = set()
+        self._server = QtNetwork.QTcpServer(self)
+        self._server.newConnection.connect(self._on_new_connection)
+
+    def add_route(self, prefix, handler):
+        self._routes.append((prefix, handler))
+        self._routes.sort(key=lambda r: len(r[0]), reverse=True)
+
+    def listen(self, host='127.0.0.1', port=0):
+        """Starts listening. Returns True on success. Use server_port() to
+        get the port if port 0 was given."""
+        if not self._server.listen(QtNetwork.QHostAddress(host), port):
+            self.log.error("Could not listen on %s:%d: %s", host, port,
+                    self._server.errorString())
+            return False
+
+        self.log.info("Listening on %s:%d", host, self.server_port())
+        return True
+
+    def server_port(self):
+        return self._server.serverPort()
+
+    def close(self):
+        self._server.close()
+
+    def _on_new_connection(self):
+        while self._server.hasPendingConnections():
+            self._connections.add(_Connection(self._server.nextPendingConnection(), self))
+
+    def _dispatch(self, request):
+        for prefix, handler in self._routes:
+            if request.path.startswith(prefix):
+                return handler(request)
+
+        return Response(404, "Not Found\n")
+
+class _Connection(QtCore.QObject):
+    def __init__(self, socket, server):
+        super(_Connection, self).__init__(server)
+        self.log        = server.log
+        self.socket     = socket
+        self.server     = server
+        self.buffer     = b''
+        self.request    = None
+        self.pending    = None # Future of a delayed response
+        self.sent       = False
+
+        socket.setParent(self)
+        socket.readyRead.connect(self._on_ready_read)
+        socket.disconnected.connect(self._on_disconnected)
+
+    def _on_ready_read(self):
+        if self.request is not None:
+            self.socket.readAll() # Request bodies are ignored.
+            return
+
+        # Note: bytes(QByteArray) crashes with some PySide2/python combinations.
+        self.buffer += self.socket.readAll().data()
+
+        if b'\r\n\r\n' not in self.buffer:
+            if len(self.buffer) > MAX_REQUEST_SIZE:
+                self._send(Response(431, "Request Header Fields Too Large\n"))
+            return
+
+        try:
+            self.request = parse_request(self.buffer)
+        except ValueError as e:
+            self._send(Response(400, "Bad Request: %s\n" % e))
+            return
+
+        if self.request.method not in ('GET', 'HEAD'):
+            self._send(Response(405, "Method Not Allowed\n", headers={'Allow': 'GET, HEAD'}))
+            return
+
+        try:
+            result = self.server._dispatch(self.request)
+        except Exception as e:
+            self.log.exception("Error handling %s %s", self.request.method, self.request.path)
+            self._send(Response(500, "Internal Server Error: %s\n" % e))
+            return
+
+        if isinstance(result, Future):
+            self.pending = result
+            result.add_done_callback(self._on_response_ready)
+        else:
+            self._send(result)
+
+    def _on_response_ready(self, f):
+        if self.socket is None:
+            return
+
+        try:
+            self._send(f.result())
+        except Exception as e:
+            self._send(Response(500, "Internal Server Error: %s\n" % e))
+
+    def _send(self, response):
+        if self.socket is None or self.sent:
+            return
+
+        self.sent = True
+
+        try:
+            reason = http.HTTPStatus(response.status).phrase
+        except ValueError:
+            reason = ''
+
+        headers = dict(response.headers)
+        headers['Content-Type']   = response.content_type
+        headers['Content-Length'] = str(len(response.body))
+        headers['Connection']     = 'close'
+
+        data = 'HTTP/1.1 %d %s\r\n' % (response.status, reason)
+        data += ''.join('%s: %s\r\n' % (k, v) for k, v in headers.items())
+        data = data.encode('iso-8859-1') + b'\r\n'
+
+        if self.request is None or self.request.method != 'HEAD':
+            data += response.body
+
+        self.socket.write(data)
+        self.socket.disconnectFromHost()
+
+    def _on_disconnected(self):
+        self.socket = None
+        self.server._connections.discard(self)
+
+        if self.pending is not None and not self.pending.done():
+            self.pending.cancel()
+
+        self.deleteLater()
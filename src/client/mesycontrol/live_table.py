@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Shared memory table of the current parameter values of all devices.
+
+The table is a memory-mapped file (by default below /dev/shm) with a fixed
+layout: a header (HEADER_DTYPE) followed by n_slots device slots (SLOT_DTYPE).
+Each slot holds the memory of one (MRC, bus, device) triple. Other processes on
+the same host can read the values without talking to the server using
+LiveTableReader. Only numpy is required for reading.
+
+Slots are protected by a sequence lock: the writer increments the slots 'seq'
+field before and after modifying it. Readers copy a slot and retry if 'seq'
+was odd or changed during the copy. The headers 'generation' field is
+incremented after each slot modification and can be used to cheaply detect
+changes.
+
+A slot whose 'flags' lack FLAG_PRESENT is unused. Values are only meaningful
+where the corresponding 'valid' entry is non-zero.
+"""
+
+import collections
+import logging
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+
+MAGIC           = b'MCLIVE\0\0'
+VERSION         = 1
+DEFAULT_SLOTS   = 64
+N_PARAMS        = 256   # basic_model.PARAM_RANGE
+URL_SIZE        = 104
+
+FLAG_PRESENT            = 1 << 0
+FLAG_RC                 = 1 << 1
+FLAG_ADDRESS_CONFLICT   = 1 << 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic',       'S8'),
+    ('version',     '<u4'),
+    ('n_slots',     '<u4'),
+    ('slot_size',   '<u4'),
+    ('writer_pid',  '<u4'),
+    ('generation',  '<u8'),
+    ('start_time',  '<f8'),     # seconds since the epoch
+    ('_reserved',   'u1', (24,)),
+    ])
+
+SLOT_DTYPE = np.dtype([
+    ('seq',         '<u8'),     # odd while the slot is being written
+    ('time',        '<f8'),     # time of the last modification
+    ('idc',         '<u2'),
+    ('bus',         'u1'),
+    ('dev',         'u1'),
+    ('flags',       '<u4'),
+    ('url',         'S%d' % URL_SIZE),
+    ('valid',       'u1', (N_PARAMS,)),
+    ('values',      '<i4', (N_PARAMS,)),
+    ])
+
+_ONE = np.uint64(1)
+
+assert HEADER_DTYPE.itemsize == 64
+assert SLOT_DTYPE.itemsize % 64 == 0
+
+def get_default_filename():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'mesycontrol-live')
+
+def get_file_size(n_slots):
+    return HEADER_DTYPE.itemsize + n_slots * SLOT_DTYPE.itemsize
+
+class SnapshotError(RuntimeError):
+    pass
+
+class DeviceSnapshot(collections.namedtuple('DeviceSnapshot',
+        'slot url bus dev idc flags time valid values')):
+    """Consistent copy of a device slot. valid and values are numpy arrays
+    indexed by parameter address."""
+    __slots__ = ()
+
+    def get(self, address, default=None):
+        return int(self.values[address]) if self.valid[address] else default
+
+    def get_memory(self):
+        """Returns a dict of address -> value of the valid parameters."""
+        return dict((int(a), int(self.values[a])) for a in np.flatnonzero(self.valid))
+
+    @property
+    def rc(self):
+        return bool(self.flags & FLAG_RC)
+
+    @property
+    def address_conflict(self):
+        return bool(self.flags & FLAG_ADDRESS_CONFLICT)
+
+class LiveTableFile(object):
+    """Writer side of the table. Creates the file, replacing an existing one.
+    Replacing is done by renaming so that readers still mapping an old table
+    are not affected."""
+    def __init__(self, filename=None, n_slots=DEFAULT_SLOTS):
+        self.filename = filename if filename is not None else get_default_filename()
+        self.n_slots  = n_slots
+        size          = get_file_size(n_slots)
+        tmp_filename  = '%s.%d.tmp' % (self.filename, os.getpid())
+
+        with open(tmp_filename, 'w+b') as f:
+            f.truncate(size)
+            self._mmap = mmap.mmap(f.fileno(), size)
+
+        self._header = np.ndarray((), HEADER_DTYPE, self._mmap, 0)
+        self._slots  = np.ndarray((n_slots,), SLOT_DTYPE, self._mmap, HEADER_DTYPE.itemsize)
+        self._seq    = self._slots['seq']
+        self._free   = list(reversed(range(n_slots)))
+
+        self._header['version']     = VERSION
+        self._header['n_slots']     = n_slots
+        self._header['slot_size']   = SLOT_DTYPE.itemsize
+        self._header['writer_pid']  = os.getpid()
+        self._header['start_time']  = time.time()
+        self._header['magic']       = MAGIC
+
+        os.replace(tmp_filename, self.filename)
+
+    def allocate(self, url, bus, dev, idc=0, flags=0):
+        """Returns the index of a newly initialized slot or None if the table
+        is full."""
+        if not len(self._free):
+            return None
+
+        index = self._free.pop()
+        slot  = self._begin(index)
+        slot['url']    = url.encode('utf-8')[:URL_SIZE]
+        slot['bus']    = bus
+        slot['dev']    = dev
+        slot['idc']    = idc
+        slot['flags']  = flags | FLAG_PRESENT
+        slot['valid']  = 0
+        slot['values'] = 0
+        self._end(index)
+        return index
+
+    def free(self, index):
+        slot = self._begin(index)
+        slot['flags'] = 0
+        slot['valid'] = 0
+        self._end(index)
+        self._free.append(index)
+
+    def set_device_info(self, index, idc, flags):
+        slot = self._begin(index)
+        slot['idc']   = idc
+        slot['flags'] = flags | FLAG_PRESENT
+        self._end(index)
+
+    def update(self, index, address, values):
+        """Writes the sequence of values to the consecutive parameters starting
+        at address. A value of None invalidates the parameter."""
+        slot  = self._begin(index)
+        valid = slot['valid']
+        data  = slot['values']
+
+        if isinstance(values, np.ndarray) or all(v is not None for v in values):
+            data[address:address + len(values)]  = values
+            valid[address:address + len(values)] = 1
+        else:
+            for i, value in enumerate(values, address):
+                if value is None:
+                    valid[i] = 0
+                else:
+                    data[i]  = value
+                    valid[i] = 1
+
+        self._end(index)
+
+    def clear(self, index):
+        """Invalidates all parameters of the slot."""
+        slot = self._begin(index)
+        slot['valid'] = 0
+        self._end(index)
+
+    def close(self, unlink=True):
+        if self._mmap is None:
+            return
+
+        del self._header, self._slots, self._seq
+        self._mmap.close()
+        self._mmap = None
+
+        if unlink:
+            try:
+                os.unlink(self.filename)
+            except FileNotFoundError:
+                pass
+
+    def _begin(self, index):
+        self._seq[index] += _ONE
+        return self._slots[index]
+
+    def _end(self, index):
+        self._slots['time'][index] = time.time()
+        self._seq[index] += _ONE
+        self._header['generation'] += _ONE
+
+class LiveTableReader(object):
+    """Reads consistent device snapshots from a table created by another
+    process."""
+    def __init__(self, filename=None):
+        self.filename = filename if filename is not None else get_default_filename()
+
+        with open(self.filename, 'rb') as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            self._mmap  = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._header = np.ndarray((), HEADER_DTYPE, self._mmap, 0)
+
+            if self._header['magic'] != MAGIC or self._header['version'] != VERSION:
+                raise ValueError("%s: not a live table or unsupported version" % self.filename)
+
+            if self._header['slot_size'] != SLOT_DTYPE.itemsize:
+                raise ValueError("%s: unexpected slot size" % self.filename)
+
+            self.n_slots = int(self._header['n_slots'])
+            self._slots  = np.ndarray((self.n_slots,), SLOT_DTYPE, self._mmap, HEADER_DTYPE.itemsize)
+            self._seq    = self._slots['seq']
+        except Exception:
+            self.close()
+            raise
+
+    def get_generation(self):
+        return int(self._header['generation'])
+
+    def get_writer_pid(self):
+        return int(self._header['writer_pid'])
+
+    def is_replaced(self):
+        """True if the writer has replaced or removed the file since it was
+        opened. A new reader has to be created in this case."""
+        try:
+            return os.stat(self.filename).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def read_slot(self, index, max_tries=1000):
+        """Returns a DeviceSnapshot of the slot or None if the slot is unused.
+        Raises SnapshotError if no consistent copy could be made within
+        max_tries attempts."""
+        for i in range(max_tries):
+            seq = int(self._seq[index])
+
+            if seq & 1:
+                time.sleep(0)
+                continue
+
+            slot = self._slots[index].copy()
+
+            if self._seq[index] == seq:
+                break
+
+            time.sleep(0)
+        else:
+            raise SnapshotError("slot %d: could not get a consistent snapshot" % index)
+
+        if not slot['flags'] & FLAG_PRESENT:
+            return None
+
+        return DeviceSnapshot(index, slot['url'].decode('utf-8'), int(slot['bus']),
+                int(slot['dev']), int(slot['idc']), int(slot['flags']), float(slot['time']),
+                slot['valid'], slot['values'])
+
+    def snapshot(self):
+        """Returns a list of DeviceSnapshots of all used slots. Each snapshot is
+        consistent in itself."""
+        ret = list()
+
+        for index in range(self.n_slots):
+            device = self.read_slot(index)
+
+            if device is not None:
+                ret.append(device)
+
+        return ret
+
+    def get_device(self, url, bus, dev):
+        """Returns the DeviceSnapshot of the given device or None."""
+        encoded = url.encode('utf-8')[:URL_SIZE]
+        slots   = self._slots
+
+        for index in np.flatnonzero((slots['url'] == encoded) & (slots['bus'] == bus)
+                & (slots['dev'] == dev)):
+            device = self.read_slot(index)
+
+            # The slot may have been reused since it was matched.
+            if device is not None and (device.url, device.bus, device.dev) == (url, bus, dev):
+                return device
+
+        return None
+
+    def get_parameter(self, url, bus, dev, address):
+        """Returns the value of the parameter or None if it is not known."""
+        device = self.get_device(url, bus, dev)
+        return device.get(address) if device is not None else None
+
+    def close(self):
+        if self._mmap is not None:
+            for attr in ('_header', '_slots', '_seq'):
+                self.__dict__.pop(attr, None)
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class LiveTable(object):
+    """Publishes the memory caches of the devices in the given hardware
+    registry to a LiveTableFile. The caches are filled by the Controllers poll
+    and notification handlers and by read and set responses."""
+    def __init__(self, hw_registry, filename=None, n_slots=DEFAULT_SLOTS):
+        self.log         = logging.getLogger(__name__)
+        self.hw_registry = hw_registry
+        self.file        = LiveTableFile(filename, n_slots)
+        self._slots      = dict() # hardware_model.Device -> (index, connections)
+        self._mrcs       = list()
+
+        hw_registry.mrc_added.connect(self._on_mrc_added)
+        hw_registry.mrc_about_to_be_removed.connect(self._on_mrc_about_to_be_removed)
+
+        for mrc in hw_registry.get_mrcs():
+            self._on_mrc_added(mrc)
+
+    def get_slot(self, device):
+        """Returns the slot index of the device or None."""
+        entry = self._slots.get(device)
+        return entry[0] if entry is not None else None
+
+    def close(self, unlink=True):
+        self.hw_registry.mrc_added.disconnect(self._on_mrc_added)
+        self.hw_registry.mrc_about_to_be_removed.disconnect(self._on_mrc_about_to_be_removed)
+
+        for mrc in list(self._mrcs):
+            self._on_mrc_about_to_be_removed(mrc)
+
+        self.file.close(unlink)
+
+    def _on_mrc_added(self, mrc):
+        self._mrcs.append(mrc)
+        mrc.device_added.connect(self._on_device_added)
+        mrc.device_about_to_be_removed.connect(self._on_device_about_to_be_removed)
+
+        for device in mrc.get_devices():
+            self._on_device_added(device)
+
+    def _on_mrc_about_to_be_removed(self, mrc):
+        mrc.device_added.disconnect(self._on_device_added)
+        mrc.device_about_to_be_removed.disconnect(self._on_device_about_to_be_removed)
+        self._mrcs.remove(mrc)
+
+        for device in mrc.get_devices():
+            self._on_device_about_to_be_removed(device)
+
+    def _on_device_added(self, device):
+        index = self.file.allocate(device.mrc.url, device.bus, device.address,
+                device.idc, self._get_flags(device))
+
+        if index is None:
+            self.log.error("Live table full, not publishing %s (%d, %d)",
+                    device.mrc.url, device.bus, device.address)
+            return
+
+        def on_parameter_changed(address, value):
+            self.file.update(index, address, (value,))
+
+        def on_info_changed(*args):
+            self.file.set_device_info(index, device.idc, self._get_flags(device))
+
+        def on_memory_cleared():
+            self.file.clear(index)
+
+        connections = [
+                (device.parameter_changed, on_parameter_changed),
+                (device.memory_cleared, on_memory_cleared),
+                (device.idc_changed, on_info_changed),
+                (device.rc_changed, on_info_changed),
+                (device.address_conflict_changed, on_info_changed),
+                ]
+
+        for signal, slot in connections:
+            signal.connect(slot)
+
+        self._slots[device] = (index, connections)
+
+        memory = device.get_memory_snapshot()
+
+        for address, value in memory.items():
+            self.file.update(index, address, (value,))
+
+    def _on_device_about_to_be_removed(self, device):
+        entry = self._slots.pop(device, None)
+
+        if entry is None:
+            return
+
+        index, connections = entry
+
+        for signal, slot in connections:
+            signal.disconnect(slot)
+
+        self.file.free(index)
+
+    @staticmethod
+    def _get_flags(device):
+        return ((FLAG_RC if device.rc else 0)
+                | (FLAG_ADDRESS_CONFLICT if device.address_conflict else 0))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Persistent on-disk cache of hardware device memory.
+
+Snapshots the static (non-polled) parameters of each hardware device whenever
+its memory is cleared, e.g. on disconnect. When the device shows up again the
+stored values are used to prime the devices memory. Primed values are marked as
+unverified and are validated in the background using bulk reads.
+
+Entries are keyed by (mrc url, bus, address, idc).
+"""
+
+from functools import partial
+import json
+import os
+
+from mesycontrol.qt import QtCore
+
+import mesycontrol.util as util
+
+version = 1
+
+# Maximum number of unneeded addresses read to merge two read ranges.
+MAX_RANGE_GAP = 4
+
+def make_key(url, bus, address, idc):
+    return "%s,%d,%d,%d" % (url, bus, address, idc)
+
+def make_read_ranges(addresses, max_gap=MAX_RANGE_GAP):
+    """Merges the given addresses into a list of (first, count) tuples
+    suitable for bulk reads."""
+    ret = list()
+
+    for address in sorted(addresses):
+        if len(ret) and address - (ret[-1][0] + ret[-1][1] - 1) <= max_gap + 1:
+            first = ret[-1][0]
+            ret[-1] = (first, address - first + 1)
+        else:
+            ret.append((address, 1))
+
+    return ret
+
+class MemoryCache(QtCore.QObject):
+    def __init__(self, filename, device_registry, parent=None):
+        super(MemoryCache, self).__init__(parent)
+        self.log                = util.make_logging_source_adapter(__name__, self)
+        self.filename           = filename
+        self.device_registry    = device_registry
+        self._entries           = dict() # key -> { address -> value }
+        self._dirty             = False
+
+        self._save_timer = QtCore.QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(0)
+        self._save_timer.timeout.connect(self.save)
+
+    def load(self):
+        """Loads cache entries from disk. A missing or unreadable file results
+        in an empty cache."""
+        try:
+            with open(self.filename, 'r') as fp:
+                data = json.load(fp)
+
+            if data.get('version') != version:
+                raise ValueError("unsupported cache version %s" % data.get('version'))
+
+            self._entries = dict(
+                    (key, dict((int(a), int(v)) for a, v in mem.items()))
+                    for key, mem in data['devices'].items())
+        except FileNotFoundError:
+            self._entries = dict()
+        except Exception as e:
+            self.log.warning("Could not load memory cache from %s: %s", self.filename, e)
+            self._entries = dict()
+
+        self._dirty = False
+
+    def save(self):
+        """Writes the cache to disk if it was modified since the last save.
+        The file is replaced atomically."""
+        if not self._dirty:
+            return
+
+        data = dict(version=version, devices=dict(
+            (key, dict((str(a), v) for a, v in sorted(mem.items())))
+            for key, mem in self._entries.items()))
+
+        try:
+            dirname = os.path.dirname(self.filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+
+            util.write_file_atomic(self.filename, partial(json.dump, data))
+            self._dirty = False
+        except (IOError, OSError) as e:
+            self.log.warning("Could not save memory cache to %s: %s", self.filename, e)
+
+    def get_entry(self, url, bus, address, idc):
+        return dict(self._entries.get(make_key(url, bus, address, idc), dict()))
+
+    def store(self, device, memory):
+        """Stores the static parameters contained in memory for the given
+        hardware device."""
+        if device.mrc is None or device.idc is None:
+            return
+
+        profile   = self.device_registry.get_device_profile(device.idc)
+        addresses = set(profile.get_static_addresses())
+        entry     = dict((a, v) for a, v in memory.items() if a in addresses)
+
+        if not len(entry):
+            return
+
+        key = make_key(device.mrc.url, device.bus, device.address, device.idc)
+
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._dirty = True
+            self._save_timer.start()
+
+    def prime(self, device):
+        """Primes the memory of the given hardware device with stored values
+        and starts validating them using bulk reads."""
+        entry = self.get_entry(device.mrc.url, device.bus, device.address, device.idc)
+
+        if not len(entry):
+            return
+
+        primed = device.prime_cached_memory(entry)
+
+        self.log.debug("primed %d parameters of %s", len(primed), device)
+
+        if len(primed) and device.is_connected() and not device.address_conflict:
+            self.validate(device)
+
+    def validate(self, device):
+        """Reads back all unverified parameters of the device."""
+        def on_read_done(f):
+            if f.exception() is not None:
+                self.log.debug("validation of %s failed: %s", device, f.exception())
+
+        for first, count in make_read_ranges(device.get_unverified_addresses()):
+            device.read_multi(first, count).add_done_callback(on_read_done)
+
+    # ===== hardware registry observation =====
+    def attach(self, hw_registry):
+        """Watch the given hardware registry and prime and store the memory
+        of all devices of all MRCs."""
+        hw_registry.mrc_added.connect(self._on_mrc_added)
+
+        for mrc in hw_registry.get_mrcs():
+            self._on_mrc_added(mrc)
+
+    def _on_mrc_added(self, mrc):
+        mrc.device_added.connect(self._on_device_added)
+        mrc.connected.connect(partial(self._on_mrc_connected, mrc=mrc))
+
+        for device in mrc.get_devices():
+            self._watch_device(device)
+
+    def _on_mrc_connected(self, mrc):
+        for device in mrc.get_devices():
+            self.prime(device)
+
+    def _on_device_added(self, device):
+        self._watch_device(device)
+        self.prime(device)
+
+    def _watch_device(self, device):
+        device.memory_about_to_be_cleared.connect(partial(self.store, device))
+        device.idc_changed.connect(partial(self._on_device_idc_changed, device))
+
+    def _on_device_idc_changed(self, device, idc):
+        # Primed values belong to the old device type.
+        device.discard_unverified_parameters()
@@ -59,6 +59,10 @@ def mesycontrol_gui_main():
         parser = argparse.ArgumentParser(description='mesycontrol GUI command line arguments')
         parser.add_argument('--logging-config', metavar='FILE')
         parser.add_argument('--setup', metavar='FILE')
+        parser.add_argument('--status-api', metavar='[HOST:]PORT',
+                help="Serve the read-only JSON status API on http://HOST:PORT/")
+        parser.add_argument('--live-table', metavar='FILE', nargs='?', const='',
+                help="Publish the current parameter values in a shared memory table")
         opts = parser.parse_args()
     else:
         opts = None
@@ -175,6 +179,9 @@ def mesycontrol_gui_main():
     elif bool(settings.value('Options/open_last_setup_at_start', True, type=bool)):
         setup_file = settings.value('Files/last_setup_file', str())
 
+    if bool(settings.value('Options/persistent_memory_cache', False, type=bool)):
+        context.enable_memory_cache()
+
     with app_context.use(context):
         mainwindow      = gui_mainwindow.MainWindow(context)
         gui_application = gui.GUIApplication(context, mainwindow)
@@ -182,6 +189,20 @@ def mesycontrol_gui_main():
         mainwindow.show()
         mainwindow.restore_settings()
 
+        status_api = None
+
+        if opts is not None and opts.status_api is not None:
+            from mesycontrol.status_api import StatusApi
+            host, sep, port = opts.status_api.rpartition(':')
+            status_api = StatusApi(context.app_registry)
+            status_api.listen(host or '127.0.0.1', int(port))
+
+        live_table = None
+
+        if opts is not None and opts.live_table is not None:
+            from mesycontrol.live_table import LiveTable
+            live_table = LiveTable(context.app_registry.hw, opts.live_table or None)
+
         if setup_file:
             try:
                 context.open_setup(setup_file)
@@ -192,6 +213,8 @@ def mesycontrol_gui_main():
 
         def on_qapp_about_to_quit():
             logging.debug("received signal QApplication.aboutToQuit(), calling Context.shutdown()")
+            if live_table is not None:
+                live_table.close()
             # Call shutdown() here while the eventloop (app.exec_()) is still running.
             context.shutdown()
 
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""OpenMetrics/Prometheus exporter for the hardware model.
+
+Scrapes are rendered from the cached state of the hardware model and from
+request statistics collected by watching the MRC connections. They never cause
+any requests to be sent to the MRCs.
+
+Prometheus text format (version 0.0.4) is served unless the scraper asks for
+OpenMetrics using the Accept header.
+"""
+
+import math
+import time
+import weakref
+
+from mesycontrol.qt import QtCore
+from mesycontrol import http_server
+import mesycontrol.proto as proto
+import mesycontrol.util as util
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE  = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts  = [0] * len(self.buckets)
+        self.count   = 0
+        self.sum     = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum   += value
+
+class MrcStats(QtCore.QObject):
+    """Collects request and poll statistics of a single MRC by watching the
+    signals of its connection."""
+    def __init__(self, mrc, parent=None):
+        super(MrcStats, self).__init__(parent)
+        self.mrc                = mrc
+        self.connection         = mrc.controller.connection if mrc.controller is not None else None
+        self.queue_size         = 0
+        self.requests           = dict() # message type name -> count
+        self.request_errors     = 0
+        self.latency            = Histogram()
+        self.poll_notifications = 0
+        self.polled_values      = 0
+        self.poll_cycle_seconds = None
+        self._t_last_poll       = None
+        self._t_queued          = weakref.WeakKeyDictionary() # Future -> time
+
+        if self.connection is not None:
+            self.queue_size = self.connection.get_queue_size()
+            self.connection.request_queued.connect(self._on_request_queued)
+            self.connection.response_received.connect(self._on_response_received)
+            self.connection.notification_received.connect(self._on_notification_received)
+            self.connection.queue_size_changed.connect(self._on_queue_size_changed)
+
+    def detach(self):
+        if self.connection is not None:
+            self.connection.request_queued.disconnect(self._on_request_queued)
+            self.connection.response_received.disconnect(self._on_response_received)
+            self.connection.notification_received.disconnect(self._on_notification_received)
+            self.connection.queue_size_changed.disconnect(self._on_queue_size_changed)
+            self.connection = None
+
+    def _on_request_queued(self, request, future):
+        self._t_queued[future] = time.monotonic()
+
+    def _on_response_received(self, request, response, future):
+        name = proto.message_type_name(request)
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+        if proto.is_error_response(response):
+            self.request_errors += 1
+
+        t_queued = self._t_queued.pop(future, None)
+
+        if t_queued is not None:
+            self.latency.observe(time.monotonic() - t_queued)
+
+    def _on_notification_received(self, message):
+        if message.type != proto.Message.NOTIFY_POLLED_ITEMS:
+            return
+
+        now = time.monotonic()
+
+        if self._t_last_poll is not None:
+            self.poll_cycle_seconds = now - self._t_last_poll
+
+        self._t_last_poll = now
+        self.poll_notifications += 1
+        self.polled_values += sum(len(item.values) for item in message.notify_polled_items.items)
+
+    def _on_queue_size_changed(self, size):
+        self.queue_size = size
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+class _Writer(object):
+    """Accumulates metric families in either output format."""
+    def __init__(self, openmetrics):
+        self.openmetrics = openmetrics
+        self.lines       = list()
+
+    def family(self, name, type_, help_):
+        # Prometheus text format puts the _total suffix into the family name.
+        if type_ == 'counter' and not self.openmetrics:
+            name += '_total'
+        self.lines.append('# HELP %s %s' % (name, help_))
+        self.lines.append('# TYPE %s %s' % (name, type_))
+
+    def sample(self, name, labels, value):
+        if len(labels):
+            label_str = '{%s}' % ','.join('%s="%s"' % (k, escape_label_value(v))
+                    for k, v in labels)
+        else:
+            label_str = ''
+        self.lines.append('%s%s %s' % (name, label_str, format_value(value)))
+
+    def getvalue(self):
+        if self.openmetrics:
+            self.lines.append('# EOF')
+        return '\n'.join(self.lines) + '\n'
+
+class MetricsExporter(QtCore.QObject):
+    """Exports metrics of the MRCs in the given hardware registry. Parameter
+    values are exported for all named parameters of the device profiles which
+    are present in the devices memory cache."""
+    def __init__(self, hw_registry, device_registry, parent=None):
+        super(MetricsExporter, self).__init__(parent)
+        self.log             = util.make_logging_source_adapter(__name__, self)
+        self.hw_registry     = hw_registry
+        self.device_registry = device_registry
+        self.server          = None
+        self._stats          = dict() # mrc -> MrcStats
+
+        hw_registry.mrc_added.connect(self._on_mrc_added)
+        hw_registry.mrc_about_to_be_removed.connect(self._on_mrc_about_to_be_removed)
+
+        for mrc in hw_registry.get_mrcs():
+            self._on_mrc_added(mrc)
+
+    def listen(self, host='127.0.0.1', port=9101):
+        """Serves the metrics on http://host:port/metrics. Returns True on
+        success."""
+        if self.server is None:
+            self.server = http_server.HttpServer(self)
+            self.register(self.server)
+
+        return self.server.listen(host, port)
+
+    def register(self, server):
+        """Adds the /metrics route to the given http_server.HttpServer."""
+        server.add_route('/metrics', self.handle_request)
+
+    def handle_request(self, request):
+        openmetrics = 'application/openmetrics-text' in request.headers.get('accept', '')
+        return http_server.Response(200, self.render(openmetrics),
+                OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+
+    def get_stats(self, mrc):
+        return self._stats.get(mrc, None)
+
+    def _on_mrc_added(self, mrc):
+        self._stats[mrc] = MrcStats(mrc, self)
+
+    def _on_mrc_about_to_be_removed(self, mrc):
+        stats = self._stats.pop(mrc, None)
+
+        if stats is not None:
+            stats.detach()
+            stats.deleteLater()
+
+    def render(self, openmetrics=False):
+        w    = _Writer(openmetrics)
+        mrcs = sorted(self.hw_registry.get_mrcs(), key=lambda mrc: mrc.url)
+
+        def per_mrc(name, type_, help_, value_fn):
+            w.family(name, type_, help_)
+            sample_name = name + '_total' if type_ == 'counter' else name
+            for mrc in mrcs:
+                value = value_fn(mrc)
+                if value is not None:
+                    w.sample(sample_name, [('url', mrc.url)], value)
+
+        per_mrc('mesycontrol_mrc_connected', 'gauge', 'MRC connection is established.',
+                lambda mrc: mrc.is_connected())
+        per_mrc('mesycontrol_mrc_connecting', 'gauge', 'MRC connection is being established.',
+                lambda mrc: mrc.is_connecting())
+        per_mrc('mesycontrol_mrc_connection_error', 'gauge', 'Last connection attempt failed.',
+                lambda mrc: mrc.last_connection_error is not None)
+        per_mrc('mesycontrol_mrc_write_access', 'gauge', 'This client owns write access.',
+                lambda mrc: mrc.has_write_access())
+        per_mrc('mesycontrol_mrc_can_acquire_write_access', 'gauge',
+                'Write access is available to this client.',
+                lambda mrc: mrc.can_acquire_write_access())
+        per_mrc('mesycontrol_mrc_silenced', 'gauge', 'MRC is silenced.',
+                lambda mrc: mrc.is_silenced())
+        per_mrc('mesycontrol_mrc_queue_size', 'gauge', 'Number of queued requests.',
+                lambda mrc: self._stats[mrc].queue_size if mrc in self._stats else None)
+        per_mrc('mesycontrol_request_errors', 'counter', 'Error responses received.',
+                lambda mrc: self._stats[mrc].request_errors if mrc in self._stats else None)
+        per_mrc('mesycontrol_poll_notifications', 'counter', 'Polled item notifications received.',
+                lambda mrc: self._stats[mrc].poll_notifications if mrc in self._stats else None)
+        per_mrc('mesycontrol_polled_values', 'counter', 'Polled parameter values received.',
+                lambda mrc: self._stats[mrc].polled_values if mrc in self._stats else None)
+        per_mrc('mesycontrol_poll_cycle_seconds', 'gauge',
+                'Time between the last two polled item notifications.',
+                lambda mrc: self._stats[mrc].poll_cycle_seconds if mrc in self._stats else None)
+
+        w.family('mesycontrol_requests', 'counter', 'Responses received by request type.')
+        for mrc in mrcs:
+            stats = self._stats.get(mrc)
+            for name, count in sorted(stats.requests.items() if stats else []):
+                w.sample('mesycontrol_requests_total', [('url', mrc.url), ('type', name)], count)
+
+        w.family('mesycontrol_request_latency_seconds', 'histogram',
+                'Time from queueing a request until its response is received.')
+        for mrc in mrcs:
+            stats = self._stats.get(mrc)
+            if stats is None:
+                continue
+            h = stats.latency
+            for bound, count in zip(h.buckets, h.counts):
+                w.sample('mesycontrol_request_latency_seconds_bucket',
+                        [('url', mrc.url), ('le', format_value(bound))], count)
+            w.sample('mesycontrol_request_latency_seconds_bucket',
+                    [('url', mrc.url), ('le', '+Inf')], h.count)
+            w.sample('mesycontrol_request_latency_seconds_count', [('url', mrc.url)], h.count)
+            w.sample('mesycontrol_request_latency_seconds_sum', [('url', mrc.url)], h.sum)
+
+        self._render_devices(w, mrcs)
+
+        return w.getvalue()
+
+    def _render_devices(self, w, mrcs):
+        devices = [(mrc, device) for mrc in mrcs for device in mrc.get_devices()]
+
+        def device_labels(mrc, device):
+            return [('url', mrc.url), ('bus', device.bus), ('dev', device.address)]
+
+        w.family('mesycontrol_device_info', 'gauge', 'Devices present on the MRC busses.')
+        for mrc, device in devices:
+            profile = self.device_registry.get_device_profile(device.idc)
+            w.sample('mesycontrol_device_info', device_labels(mrc, device)
+                    + [('idc', device.idc), ('device_type', profile.name)], 1)
+
+        w.family('mesycontrol_device_rc', 'gauge', 'Device RC (remote control) state.')
+        for mrc, device in devices:
+            w.sample('mesycontrol_device_rc', device_labels(mrc, device), device.rc)
+
+        w.family('mesycontrol_device_address_conflict', 'gauge', 'Bus address conflict detected.')
+        for mrc, device in devices:
+            w.sample('mesycontrol_device_address_conflict', device_labels(mrc, device),
+                    device.address_conflict)
+
+        raw_samples  = list()
+        unit_samples = list()
+
+        for mrc, device in devices:
+            if device.idc is None or device.address_conflict:
+                continue
+
+            profile = self.device_registry.get_device_profile(device.idc)
+            memory  = device.get_memory_snapshot()
+
+            for pp in profile.get_parameters():
+                if not pp.is_named() or pp.address not in memory:
+                    continue
+
+                value  = memory[pp.address]
+                labels = device_labels(mrc, device) + [('device_type', profile.name),
+                        ('name', pp.name), ('address', pp.address)]
+
+                raw_samples.append((labels, value))
+
+                if len(pp.units) > 1:
+                    unit = pp.units[-1]
+                    unit_samples.append((labels + [('unit', unit.label or unit.name)],
+                        float(unit.unit_value(value))))
+
+        w.family('mesycontrol_parameter_raw', 'gauge', 'Cached raw parameter values.')
+        for labels, value in raw_samples:
+            w.sample('mesycontrol_parameter_raw', labels, value)
+
+        w.family('mesycontrol_parameter_value', 'gauge',
+                'Cached parameter values converted using the parameters unit.')
+        for labels, value in unit_samples:
+            w.sample('mesycontrol_parameter_value', labels, value)
@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Headless monitoring of MRCs using server side polling.
+
+Instead of reading parameters in a loop the Monitor registers poll
+subscriptions for the volatile parameters of each device with the server. The
+server polls the parameters and pushes changes (NOTIFY_POLLED_ITEMS) which
+end up in the hardware model. Device hot-plug is handled via the servers
+scanbus notifications (NOTIFY_SCANBUS) which add and remove devices from the
+hardware model.
+
+Changes are forwarded as events to sinks. A sink is any object implementing
+handle_event(event) and optionally close(). Sinks implementing
+handle_polled_values(event) additionally receive all values of each poll
+notification, including unchanged ones, as PolledValuesEvents.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import signal
+import sys
+import time
+
+from mesycontrol.qt import QtCore
+from mesycontrol import memory_cache
+from mesycontrol import proto
+from mesycontrol import util
+
+ParameterEventBase = collections.namedtuple('ParameterEventBase',
+        'time url bus device idc address value profile')
+
+class ParameterEvent(ParameterEventBase):
+    """A parameter value changed. profile is the ParameterProfile of the
+    parameter or None if the device profile does not know the address."""
+    __slots__ = ()
+
+    @property
+    def name(self):
+        return self.profile.name if self.profile is not None else None
+
+    @property
+    def unit(self):
+        """The parameters last Unit or None."""
+        if self.profile is None or not len(self.profile.units):
+            return None
+        return self.profile.units[-1]
+
+DeviceEvent = collections.namedtuple('DeviceEvent',
+        'time kind url bus device idc') #: kind is 'added' or 'removed'
+
+ConnectionEvent = collections.namedtuple('ConnectionEvent',
+        'time kind url info') #: kind is 'connected', 'disconnected' or 'error'
+
+PolledValuesEvent = collections.namedtuple('PolledValuesEvent',
+        'time url bus device idc address values') #: values of address, address+1, ...
+
+class PrintSink(object):
+    """Prints events in human readable form."""
+    def __init__(self, fp=None):
+        self.fp = fp if fp is not None else sys.stdout
+
+    def handle_event(self, event):
+        if isinstance(event, ParameterEvent):
+            unit = event.unit
+            print("%s bus=%d dev=%d addr=%03d name=%s raw=%d%s" % (
+                event.url, event.bus, event.device, event.address, event.name, event.value,
+                " unit_value=%s %s" % (unit.unit_value(event.value), unit.label) if unit else ""),
+                file=self.fp)
+        elif isinstance(event, DeviceEvent):
+            print("%s bus=%d dev=%d idc=%s %s" % (
+                event.url, event.bus, event.device, event.idc, event.kind), file=self.fp)
+        else:
+            print("%s %s %s" % (event.url, event.kind, event.info or ""), file=self.fp)
+        self.fp.flush()
+
+def event_to_dict(event):
+    """Returns a JSON serializable dict describing the given event."""
+    ret = dict(event._asdict())
+
+    if isinstance(event, ParameterEvent):
+        del ret['profile']
+        ret['type'] = 'parameter'
+        ret['name'] = event.name
+        unit = event.unit
+        if unit is not None:
+            ret['unit_value'] = unit.unit_value(event.value)
+            ret['unit'] = unit.label
+    elif isinstance(event, DeviceEvent):
+        ret['type'] = 'device'
+    else:
+        ret['type'] = 'connection'
+        ret['info'] = str(event.info) if event.info is not None else None
+
+    return ret
+
+class JsonLinesSink(object):
+    """Appends one JSON object per event to the given file object."""
+    def __init__(self, fp):
+        self.fp = fp
+
+    def handle_event(self, event):
+        self.fp.write(json.dumps(event_to_dict(event)) + '\n')
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+class _DeviceSubscription(object):
+    """Poll subscriber for a single device. The controller keeps the poll
+    items while this object is alive."""
+    def __init__(self, device, profile):
+        self.device     = device
+        self.profile    = profile
+        self.parameters = dict((p.address, p) for p in profile.get_parameters())
+        self.items      = list()
+
+class Monitor(QtCore.QObject):
+    """Monitors the devices of a hardware_model.HardwareMrc using server side
+    polling of the devices volatile parameters.
+
+    The MRC is connected when start() is called and reconnected after
+    reconnect_interval_ms if the connection is lost.
+    """
+    def __init__(self, mrc, device_registry, sinks=None,
+            reconnect_interval_ms=5000, parent=None):
+        super(Monitor, self).__init__(parent)
+        self.log             = util.make_logging_source_adapter(__name__, self)
+        self.mrc             = mrc
+        self.device_registry = device_registry
+        self.sinks           = list(sinks) if sinks is not None else list()
+        self._subscriptions  = dict() # device -> _DeviceSubscription
+        self._running        = False
+        self._connection     = None
+
+        self._reconnect_timer = QtCore.QTimer(self)
+        self._reconnect_timer.setSingleShot(True)
+        self._reconnect_timer.setInterval(reconnect_interval_ms)
+        self._reconnect_timer.timeout.connect(self._connect)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def start(self):
+        if self._running:
+            return
+
+        self._running = True
+        self.mrc.device_added.connect(self._on_device_added)
+        self.mrc.device_about_to_be_removed.connect(self._on_device_about_to_be_removed)
+        self.mrc.connected.connect(self._on_connected)
+        self.mrc.disconnected.connect(self._on_disconnected)
+        self.mrc.connection_error.connect(self._on_connection_error)
+
+        # Parameter changes only report values which differ from the cached
+        # ones. Sinks recording every polled value need the notifications.
+        if self.mrc.controller is not None:
+            self._connection = self.mrc.controller.connection
+            self._connection.notification_received.connect(self._on_notification_received)
+
+        for device in self.mrc.get_devices():
+            self._watch_device(device)
+
+        if self.mrc.is_connected():
+            self._on_connected()
+        else:
+            self._connect()
+
+    def stop(self):
+        if not self._running:
+            return
+
+        self._running = False
+        self._reconnect_timer.stop()
+        self.mrc.device_added.disconnect(self._on_device_added)
+        self.mrc.device_about_to_be_removed.disconnect(self._on_device_about_to_be_removed)
+        self.mrc.connected.disconnect(self._on_connected)
+        self.mrc.disconnected.disconnect(self._on_disconnected)
+        self.mrc.connection_error.disconnect(self._on_connection_error)
+
+        if self._connection is not None:
+            self._connection.notification_received.disconnect(self._on_notification_received)
+            self._connection = None
+
+        for device in self.mrc.get_devices():
+            self._unwatch_device(device)
+
+    def get_polled_items(self):
+        """Returns a list of the (bus, address, item) poll items currently
+        subscribed to."""
+        return [(sub.device.bus, sub.device.address, item)
+                for sub in self._subscriptions.values() for item in sub.items]
+
+    # ===== connection =====
+    def _connect(self):
+        if self._running and not self.mrc.is_connected() and not self.mrc.is_connecting():
+            self.log.info("Connecting to %s", self.mrc.get_display_url())
+            self.mrc.connectMrc()
+
+    def _on_connected(self):
+        self._emit(ConnectionEvent(time.time(), 'connected', self.mrc.url, None))
+
+        # The server forgets the poll items of a connection. Register them
+        # again. The controller scans the busses on connect, later changes
+        # are pushed by the server.
+        for device in self.mrc.get_devices():
+            self._update_subscription(device)
+
+    def _on_disconnected(self):
+        self._emit(ConnectionEvent(time.time(), 'disconnected', self.mrc.url, None))
+
+        if self._running:
+            self._reconnect_timer.start()
+
+    def _on_connection_error(self, error):
+        self._emit(ConnectionEvent(time.time(), 'error', self.mrc.url, error))
+
+        if self._running:
+            self._reconnect_timer.start()
+
+    # ===== devices =====
+    def _on_device_added(self, device):
+        self._emit(DeviceEvent(time.time(), 'added', self.mrc.url,
+            device.bus, device.address, device.idc))
+        self._watch_device(device)
+
+    def _on_device_about_to_be_removed(self, device):
+        self._emit(DeviceEvent(time.time(), 'removed', self.mrc.url,
+            device.bus, device.address, device.idc))
+        self._unwatch_device(device)
+
+    def _watch_device(self, device):
+        device.parameter_changed.connect(self._on_parameter_changed)
+        device.idc_changed.connect(self._on_device_state_changed)
+        device.address_conflict_changed.connect(self._on_device_state_changed)
+        self._update_subscription(device)
+
+    def _unwatch_device(self, device):
+        device.parameter_changed.disconnect(self._on_parameter_changed)
+        device.idc_changed.disconnect(self._on_device_state_changed)
+        device.address_conflict_changed.disconnect(self._on_device_state_changed)
+        self._remove_subscription(device)
+
+    def _on_device_state_changed(self, *args):
+        self._update_subscription(self.sender())
+
+    def _remove_subscription(self, device):
+        sub = self._subscriptions.pop(device, None)
+
+        if sub is not None and len(sub.items):
+            device.remove_polling_subscriber(sub)
+
+    def _update_subscription(self, device):
+        """(Re-)registers the poll items of the given device."""
+        self._remove_subscription(device)
+
+        if device.idc is None or device.address_conflict:
+            return
+
+        sub = _DeviceSubscription(device, self.device_registry.get_device_profile(device.idc))
+        self._subscriptions[device] = sub
+
+        addresses = sorted(sub.profile.get_volatile_addresses())
+
+        if self.mrc.controller.has_read_multi():
+            # Poll consecutive addresses using a single range request.
+            for first, count in memory_cache.make_read_ranges(addresses, max_gap=0):
+                sub.items.append(first if count == 1 else (first, first + count - 1))
+        else:
+            sub.items = addresses
+
+        if len(sub.items) and self.mrc.is_connected():
+            self.log.debug("Subscribing to %d poll items of %s", len(sub.items), device)
+            device.add_poll_items(sub, sub.items)
+
+    def _on_parameter_changed(self, address, value):
+        device  = self.sender()
+        sub     = self._subscriptions.get(device, None)
+        profile = sub.parameters.get(address, None) if sub is not None else None
+
+        self._emit(ParameterEvent(time.time(), self.mrc.url, device.bus,
+            device.address, device.idc, address, value, profile))
+
+    def _on_notification_received(self, message):
+        if message.type != proto.Message.NOTIFY_POLLED_ITEMS:
+            return
+
+        sinks = [sink for sink in self.sinks if hasattr(sink, 'handle_polled_values')]
+
+        if not len(sinks):
+            return
+
+        t = time.time()
+
+        for item in message.notify_polled_items.items:
+            device = self.mrc.get_device(item.bus, item.dev)
+
+            if device is None or device not in self._subscriptions:
+                continue
+
+            event = PolledValuesEvent(t, self.mrc.url, item.bus, item.dev, device.idc,
+                    item.par, list(item.values))
+
+            for sink in sinks:
+                try:
+                    sink.handle_polled_values(event)
+                except Exception:
+                    self.log.exception("Sink %s raised", sink)
+
+    def _emit(self, event):
+        for sink in self.sinks:
+            try:
+                sink.handle_event(event)
+            except Exception:
+                self.log.exception("Sink %s raised", sink)
+
+def monitor_main(argv=None):
+    """
+    Entry point for the headless monitoring daemon.
+    <mrc-url>... [--jsonl FILE] [--influxdb URL] [--record DIR] [--metrics [HOST:]PORT]
+                 [--status-api [HOST:]PORT] [--live-table [FILE]] [--quiet] [--debug]
+    """
+    from mesycontrol.script import get_script_context
+
+    parser = argparse.ArgumentParser(
+            description="Monitor the volatile parameters of all devices connected"
+            " to the given MRCs using server side polling.")
+    parser.add_argument('urls', metavar='mrc-url', nargs='+',
+            help="MRC to monitor. See mesycontrol_script_runner for accepted url schemes.")
+    parser.add_argument('--jsonl', metavar='FILE',
+            help="Append events as JSON lines to FILE.")
+    parser.add_argument('--influxdb', metavar='URL',
+            help="Write parameter changes to the InfluxDB at URL. Organization, bucket"
+            " and token are taken from INFLUXDB_ORG, INFLUXDB_BUCKET and INFLUXDB_TOKEN.")
+    parser.add_argument('--influxdb-spool', metavar='FILE', default='mesycontrol_monitor.spool',
+            help="Spool file used while the InfluxDB is unreachable"
+            " (default: mesycontrol_monitor.spool)")
+    parser.add_argument('--record', metavar='DIR',
+            help="Record parameter values to memory-mapped segment files in DIR.")
+    parser.add_argument('--record-retention', metavar='DAYS', type=float,
+            help="Delete recorded segments older than DAYS (default: keep all)")
+    parser.add_argument('--metrics', metavar='[HOST:]PORT',
+            help="Serve Prometheus/OpenMetrics metrics on http://HOST:PORT/metrics"
+            " (HOST defaults to 127.0.0.1)")
+    parser.add_argument('--status-api', metavar='[HOST:]PORT',
+            help="Serve the read-only JSON status API on http://HOST:PORT/"
+            " (HOST defaults to 127.0.0.1). May be the same as --metrics.")
+    parser.add_argument('--live-table', metavar='FILE', nargs='?', const='',
+            help="Publish the current parameter values in a shared memory table"
+            " (default: /dev/shm/mesycontrol-live). See mesycontrol.live_table.")
+    parser.add_argument('--quiet', action='store_true',
+            help="Do not print events to standard output.")
+    parser.add_argument('--reconnect-interval', type=float, default=5.0,
+            help="Seconds to wait before reconnecting (default: 5)")
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args(argv)
+
+    with get_script_context(logging.DEBUG if args.debug else logging.INFO) as ctx:
+        qapp       = QtCore.QCoreApplication.instance()
+        sinks      = list()
+        monitors   = list()
+        servers    = dict()
+        live_table = None
+
+        # Sinks and monitors are shut down on every exit path so that files
+        # are closed and the InfluxDB writer flushes its queue and spool.
+        try:
+            if not args.quiet:
+                sinks.append(PrintSink())
+
+            if args.jsonl:
+                sinks.append(JsonLinesSink(open(args.jsonl, 'a')))
+
+            if args.record:
+                from mesycontrol.recorder import Recorder
+                sinks.append(Recorder(args.record, retention_seconds=(args.record_retention * 86400.0
+                    if args.record_retention is not None else None)))
+
+            if args.influxdb:
+                from mesycontrol.scripts.influxdb_sink import InfluxDBSink
+                sinks.append(InfluxDBSink(args.influxdb,
+                    os.environ.get("INFLUXDB_ORG", "mesytec"),
+                    os.environ.get("INFLUXDB_BUCKET", "mesycontrol"),
+                    token=os.environ.get("INFLUXDB_TOKEN"),
+                    spool_filename=args.influxdb_spool,
+                    device_registry=ctx.appContext.device_registry))
+
+            for url in args.urls:
+                ctx.make_mrc(url)
+                mrc = ctx.appContext.app_registry.hw.get_mrc(url)
+                monitor = Monitor(mrc, ctx.appContext.device_registry, sinks,
+                        reconnect_interval_ms=int(args.reconnect_interval * 1000))
+                monitor.start()
+                monitors.append(monitor)
+
+            # --metrics and --status-api share a server if the addresses match.
+            def get_server(spec):
+                host, sep, port = spec.rpartition(':')
+                address = (host or '127.0.0.1', int(port))
+                if address not in servers:
+                    from mesycontrol.http_server import HttpServer
+                    servers[address] = HttpServer()
+                return servers[address]
+
+            if args.metrics:
+                from mesycontrol.metrics_exporter import MetricsExporter
+                exporter = MetricsExporter(ctx.appContext.app_registry.hw,
+                        ctx.appContext.device_registry)
+                exporter.register(get_server(args.metrics))
+
+            if args.status_api:
+                from mesycontrol.status_api import StatusApi
+                status_api = StatusApi(ctx.appContext.app_registry)
+                status_api.register(get_server(args.status_api))
+
+            for (host, port), server in servers.items():
+                if not server.listen(host, port):
+                    return 1
+
+            if args.live_table is not None:
+                from mesycontrol.live_table import LiveTable
+                live_table = LiveTable(ctx.appContext.app_registry.hw, args.live_table or None)
+
+            signal.signal(signal.SIGINT, lambda signum, frame: qapp.quit())
+            signal.signal(signal.SIGTERM, lambda signum, frame: qapp.quit())
+
+            # Python signal handlers only run when control returns to the
+            # interpreter. Wake up periodically to allow that.
+            wakeup_timer = QtCore.QTimer()
+            wakeup_timer.timeout.connect(lambda: None)
+            wakeup_timer.start(500)
+
+            qapp.exec_()
+        finally:
+            for server in servers.values():
+                server.close()
+
+            for monitor in monitors:
+                monitor.stop()
+
+            for sink in sinks:
+                if hasattr(sink, 'close'):
+                    sink.close()
+
+            if live_table is not None:
+                live_table.close()
+
+    return 0
@@ -90,6 +90,10 @@ class AbstractParameterBinding(object):
         self.device.hardware_set.connect(self._on_device_hw_set)
         self.device.config_set.connect(self._on_device_cfg_set)
 
+        # Only changes of the bound addresses are dispatched to the binding.
+        self.device.add_hw_parameter_observer(self.read_address, self._on_hw_parameter_changed)
+        self.device.add_cfg_parameter_observer(self.write_address, self._on_cfg_parameter_changed)
+
         self._on_device_hw_set(self.device, None, self.device.hw)
         self._on_device_cfg_set(self.device, None, self.device.cfg)
 
@@ -250,12 +254,10 @@ class AbstractParameterBinding(object):
 
     def _on_device_hw_set(self, device, old_hw, new_hw):
         if old_hw is not None:
-            old_hw.parameter_changed.disconnect(self._on_hw_parameter_changed)
             old_hw.disconnected.disconnect(self.populate)
             old_hw.connected.disconnect(self.populate)
 
         if new_hw is not None:
-            new_hw.parameter_changed.connect(self._on_hw_parameter_changed)
             new_hw.disconnected.connect(self.populate)
             new_hw.connected.connect(self.populate)
 
@@ -263,20 +265,14 @@ class AbstractParameterBinding(object):
         log.debug("_on_device_cfg_set: device=%s, old=%s, new=%s",
                 device, old_cfg, new_cfg)
 
-        if old_cfg is not None:
-            old_cfg.parameter_changed.disconnect(self._on_cfg_parameter_changed)
-
-        if new_cfg is not None:
-            new_cfg.parameter_changed.connect(self._on_cfg_parameter_changed)
-
     def _on_hw_parameter_changed(self, address, value):
-        if self.device is not None and self.device.has_hw and address == self.read_address:
+        if self.device is not None and self.device.has_hw:
             f = self.device.hw.get_parameter(self.read_address).add_done_callback(self._update_wrapper)
             log.debug("_on_hw_parameter_changed: target=%s, addr=%d, future=%s", self.target, self.read_address, f)
             self.populate()
 
     def _on_cfg_parameter_changed(self, address, value):
-        if self.device is not None and self.device.has_cfg and address == self.write_address:
+        if self.device is not None and self.device.has_cfg:
             f = self.device.cfg.get_parameter(self.write_address).add_done_callback(self._update_wrapper)
             log.debug("_on_cfg_parameter_changed: target=%s, addr=%d, future=%s", self.target, self.write_address, f)
             self.populate()
@@ -21,11 +21,32 @@
 __author__ = 'Florian Lüke'
 __email__  = 'f.lueke@mesytec.com'
 
+import importlib
+
 import PySide2
 
 from PySide2 import QtCore
-from PySide2 import QtGui
-from PySide2 import QtWidgets
 from PySide2 import QtNetwork
 from PySide2.QtCore import Qt, Property, Signal, Slot
-from PySide2.QtUiTools import QUiLoader
+
+# The GUI modules are imported on first access. This keeps headless users
+# (scripts, the monitor daemon) from loading QtGui and QtWidgets.
+_LAZY_ATTRIBUTES = {
+        'QtGui':        ('PySide2.QtGui', None),
+        'QtWidgets':    ('PySide2.QtWidgets', None),
+        'QUiLoader':    ('PySide2.QtUiTools', 'QUiLoader'),
+        }
+
+def __getattr__(name):
+    try:
+        module_name, attr = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    ret = importlib.import_module(module_name)
+
+    if attr is not None:
+        ret = getattr(ret, attr)
+
+    globals()[name] = ret
+    return ret
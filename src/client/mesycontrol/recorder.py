@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Embedded time-series storage for polled parameter values.
+
+Values are appended as fixed size records to memory-mapped segment files in
+the NumPy .npy format. The active segment is preallocated and named
+'current.npy'. Unused records have a time of 0. Once the active segment is full
+or older than segment_seconds it is truncated to its used size and renamed to
+'segment-<first>-<last>.npy' where first and last are the minimum and maximum
+record times in microseconds. Finished segments can be loaded with numpy.load().
+
+MRC urls are stored as indexes into the list kept in 'mrcs.json'.
+
+A Recorder implements the mesycontrol.monitor sink interface. It records every
+polled value, not only changes, so each downsampling bucket holds the samples
+taken during its interval.
+"""
+
+import glob
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from mesycontrol import util
+
+RECORD_DTYPE = np.dtype([
+    ('time',    '<f8'),     # seconds since the epoch
+    ('value',   '<i8'),
+    ('mrc',     '<u4'),     # index into Recorder.get_mrc_urls()
+    ('bus',     'u1'),
+    ('dev',     'u1'),
+    ('par',     '<u2'),
+    ])
+
+DOWNSAMPLE_DTYPE = np.dtype([
+    ('time',    '<f8'),     # start of the interval
+    ('min',     '<i8'),
+    ('max',     '<i8'),
+    ('mean',    '<f8'),
+    ('count',   '<u8'),
+    ])
+
+CURRENT_SEGMENT = 'current.npy'
+MRCS_FILE       = 'mrcs.json'
+
+_SEGMENT_RE     = re.compile(r'segment-(\d+)-(\d+)\.npy$')
+
+class Recorder(object):
+    """Records parameter values to the segment files in directory.
+
+    records_per_segment: capacity of a segment file.
+    segment_seconds: the active segment is rolled over once its first record
+                     is older than this. None disables time based rollover.
+    retention_seconds: finished segments whose last record is older than this
+                       are deleted. None keeps all segments.
+    max_bytes: the oldest finished segments are deleted while the total size of
+               the finished segments exceeds this. None disables the limit.
+    """
+    def __init__(self, directory, records_per_segment=1 << 20,
+            segment_seconds=3600.0, retention_seconds=None, max_bytes=None):
+        self.log                    = util.make_logging_source_adapter(__name__, self)
+        self.directory              = directory
+        self.records_per_segment    = records_per_segment
+        self.segment_seconds        = segment_seconds
+        self.retention_seconds      = retention_seconds
+        self.max_bytes              = max_bytes
+
+        self._current   = None  # memmap of the active segment
+        self._count     = 0     # number of used records in the active segment
+
+        os.makedirs(directory, exist_ok=True)
+
+        try:
+            with open(os.path.join(directory, MRCS_FILE)) as fp:
+                self._mrc_urls = json.load(fp)
+        except FileNotFoundError:
+            self._mrc_urls = list()
+
+        self._mrc_indexes = dict((url, i) for i, url in enumerate(self._mrc_urls))
+
+        self._open_current()
+
+    # ===== writing =====
+    def record(self, t, url, bus, dev, par, value):
+        """Appends a single value. t is the time in seconds since the epoch."""
+        if self._count >= len(self._current) or (self.segment_seconds is not None
+                and self._count > 0
+                and t - self._current['time'][0] >= self.segment_seconds):
+            self.rollover()
+
+        self._current[self._count] = (t, value, self._get_mrc_index(url), bus, dev, par)
+        self._count += 1
+
+    def handle_event(self, event):
+        """monitor sink interface. Parameter changes are not recorded as the
+        changed values are also delivered to handle_polled_values()."""
+        pass
+
+    def handle_polled_values(self, event):
+        """monitor sink interface. Records all values of a poll notification."""
+        for i, value in enumerate(event.values):
+            self.record(event.time, event.url, event.bus, event.device,
+                    event.address + i, value)
+
+    def flush(self):
+        self._current.flush()
+
+    def close(self):
+        if self._current is not None:
+            self._current.flush()
+            self._current = None
+
+    def rollover(self):
+        """Finishes the active segment and starts a new one. Retention is
+        applied afterwards."""
+        if self._count > 0:
+            records = self._current[:self._count]
+            first   = int(records['time'].min() * 1e6)
+            last    = int(records['time'].max() * 1e6)
+            name    = os.path.join(self.directory, 'segment-%016d-%016d.npy' % (first, last))
+
+            util.write_file_atomic(name, lambda fp: np.save(fp, records), binary=True)
+
+            self._current = None
+            os.unlink(os.path.join(self.directory, CURRENT_SEGMENT))
+            self._open_current()
+
+        self.apply_retention()
+
+    def apply_retention(self, now=None):
+        """Deletes finished segments according to retention_seconds and
+        max_bytes. Returns the list of deleted files."""
+        now      = time.time() if now is None else now
+        segments = self._get_segments()
+        deleted  = list()
+
+        if self.retention_seconds is not None:
+            limit = int((now - self.retention_seconds) * 1e6)
+            while len(segments) and segments[0][2] < limit:
+                deleted.append(segments.pop(0)[0])
+
+        if self.max_bytes is not None:
+            sizes = [os.path.getsize(s[0]) for s in segments]
+            while len(segments) and sum(sizes) > self.max_bytes:
+                deleted.append(segments.pop(0)[0])
+                sizes.pop(0)
+
+        for filename in deleted:
+            self.log.debug("Removing segment %s", filename)
+            os.unlink(filename)
+
+        return deleted
+
+    # ===== reading =====
+    def get_mrc_urls(self):
+        return list(self._mrc_urls)
+
+    def query(self, t_start=None, t_end=None, url=None, bus=None, dev=None, par=None):
+        """Returns a RECORD_DTYPE array of the records with
+        t_start <= time < t_end matching the given url, bus, dev and par.
+        None matches anything. The result is sorted by time."""
+        if url is not None:
+            if url not in self._mrc_indexes:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            mrc = self._mrc_indexes[url]
+        else:
+            mrc = None
+
+        parts = list()
+
+        for records in self._iter_records(t_start, t_end):
+            mask = np.ones(len(records), dtype=bool)
+
+            if t_start is not None:
+                mask &= records['time'] >= t_start
+            if t_end is not None:
+                mask &= records['time'] < t_end
+
+            for field, value in (('mrc', mrc), ('bus', bus), ('dev', dev), ('par', par)):
+                if value is not None:
+                    mask &= records[field] == value
+
+            parts.append(records[mask])
+
+        if not len(parts):
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        ret = np.concatenate(parts)
+        return ret[np.argsort(ret['time'], kind='stable')]
+
+    def downsample(self, interval, t_start=None, t_end=None, url=None, bus=None,
+            dev=None, par=None):
+        """Returns a DOWNSAMPLE_DTYPE array holding the min, max, mean and
+        count of the matching values in each interval seconds wide bucket.
+        Buckets start at t_start (or the first record) and empty buckets are
+        omitted. Usually url, bus, dev and par should be given to select a
+        single parameter."""
+        records = self.query(t_start, t_end, url, bus, dev, par)
+
+        if not len(records):
+            return np.empty(0, dtype=DOWNSAMPLE_DTYPE)
+
+        t0      = t_start if t_start is not None else records['time'][0]
+        buckets = np.floor((records['time'] - t0) / interval).astype(np.int64)
+        keys, starts, counts = np.unique(buckets, return_index=True, return_counts=True)
+        values  = records['value']
+
+        ret = np.empty(len(keys), dtype=DOWNSAMPLE_DTYPE)
+        ret['time']  = t0 + keys * interval
+        ret['min']   = np.minimum.reduceat(values, starts)
+        ret['max']   = np.maximum.reduceat(values, starts)
+        ret['mean']  = np.add.reduceat(values.astype(np.float64), starts) / counts
+        ret['count'] = counts
+        return ret
+
+    # ===== internals =====
+    def _get_mrc_index(self, url):
+        try:
+            return self._mrc_indexes[url]
+        except KeyError:
+            self._mrc_indexes[url] = len(self._mrc_urls)
+            self._mrc_urls.append(url)
+            util.write_file_atomic(os.path.join(self.directory, MRCS_FILE),
+                    lambda fp: json.dump(self._mrc_urls, fp))
+            return self._mrc_indexes[url]
+
+    def _open_current(self):
+        filename = os.path.join(self.directory, CURRENT_SEGMENT)
+
+        if os.path.exists(filename):
+            self._current = np.lib.format.open_memmap(filename, mode='r+')
+
+            if self._current.dtype != RECORD_DTYPE:
+                raise ValueError("%s: unexpected record type %s" % (filename, self._current.dtype))
+
+            # Records are appended in order, the first unused record ends the
+            # used part.
+            unused = np.flatnonzero(self._current['time'] == 0.0)
+            self._count = int(unused[0]) if len(unused) else len(self._current)
+        else:
+            self._current = np.lib.format.open_memmap(filename, mode='w+',
+                    dtype=RECORD_DTYPE, shape=(self.records_per_segment,))
+            self._count = 0
+
+    def _get_segments(self):
+        """Returns a list of (filename, first_us, last_us) of the finished
+        segments, oldest first."""
+        ret = list()
+
+        for filename in glob.glob(os.path.join(self.directory, 'segment-*.npy')):
+            m = _SEGMENT_RE.search(filename)
+            if m:
+                ret.append((filename, int(m.group(1)), int(m.group(2))))
+
+        return sorted(ret, key=lambda s: (s[1], s[2]))
+
+    def _iter_records(self, t_start, t_end):
+        for filename, first, last in self._get_segments():
+            if t_start is not None and last < int(t_start * 1e6):
+                continue
+            if t_end is not None and first > int(t_end * 1e6) + 1:
+                continue
+            yield np.load(filename, mmap_mode='r')
+
+        if self._current is not None:
+            yield self._current[:self._count]
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Event loop based task scheduling for scripts.
+
+A single timer drives all tasks of a Scheduler. It is armed for the earliest
+deadline only, and all tasks due within the coalescing window are run in the
+same wakeup. Periodic deadlines advance by whole intervals from the previous
+deadline, so the schedule does not drift with the time spent in callbacks.
+Missed ticks are skipped instead of being run back to back.
+
+Callbacks run one after the other, never nested: a task that waits for
+results runs a local event loop, during which signals may fire. Events
+posted from signal handlers are queued and dispatched after the running task
+returns. Repeated events with the same key are coalesced, so only the latest
+arguments are delivered.
+"""
+
+import collections
+import heapq
+import itertools
+import math
+import time
+
+from mesycontrol.qt import QtCore
+import mesycontrol.util as util
+
+DEFAULT_COALESCE_WINDOW = 0.005 # seconds
+QUIT_CHECK_INTERVAL_MS  = 250
+
+class Task(object):
+    """Handle of a scheduled callback. Use cancel() to stop it."""
+    def __init__(self, scheduler, fn, args=(), interval=None):
+        self.scheduler  = scheduler
+        self.fn         = fn
+        self.args       = args
+        self.interval   = interval  # None for single shot and event tasks
+        self.deadline   = None      # monotonic time of the next timed run
+        self.runs       = 0
+        self.active     = True
+        self._cleanups  = list()
+
+    def add_cleanup(self, fn):
+        """Registers fn to be called when the task is cancelled. Used to
+        disconnect signals."""
+        self._cleanups.append(fn)
+
+    def cancel(self):
+        if not self.active:
+            return
+
+        self.active = False
+
+        for fn in self._cleanups:
+            fn()
+
+        self._cleanups = list()
+        self.scheduler._remove(self)
+
+    def is_active(self):
+        return self.active
+
+class Scheduler(QtCore.QObject):
+    def __init__(self, coalesce_window=DEFAULT_COALESCE_WINDOW, parent=None):
+        super(Scheduler, self).__init__(parent)
+        self.log                = util.make_logging_source_adapter(__name__, self)
+        self.coalesce_window    = coalesce_window
+        self._tasks             = set()
+        self._heap              = list() # (deadline, seq, task)
+        self._seq               = itertools.count()
+        self._events            = collections.OrderedDict() # (task, key) -> args
+        self._dispatching       = False
+        self._loops             = list()
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self._dispatch)
+
+    def call_every(self, interval, fn, *args, delay=None):
+        """Calls fn(*args) every interval seconds. The first call happens after
+        delay seconds which defaults to interval."""
+        if interval <= 0.0:
+            raise ValueError("interval must be positive")
+
+        task = Task(self, fn, args, interval)
+        self._schedule(task, time.monotonic() + (interval if delay is None else delay))
+        return task
+
+    def call_later(self, delay, fn, *args):
+        """Calls fn(*args) once after delay seconds."""
+        task = Task(self, fn, args)
+        self._schedule(task, time.monotonic() + delay)
+        return task
+
+    def make_event_task(self, fn):
+        """Returns a task for fn which is invoked via post()."""
+        task = Task(self, fn)
+        self._tasks.add(task)
+        return task
+
+    def post(self, task, *args, key=None):
+        """Queues a call of task.fn(*args). A pending call of the same task with
+        the same key is replaced."""
+        if not task.active:
+            return
+
+        self._events[(task, key)] = args
+        self._arm()
+
+    def get_tasks(self):
+        return list(self._tasks)
+
+    def cancel_all(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def run(self, timeout=None, should_quit=None):
+        """Runs the event loop until stop() is called or timeout seconds have
+        passed. should_quit is checked periodically, the loop exits once it
+        returns True. The periodic check also allows Python signal handlers to
+        run."""
+        loop = QtCore.QEventLoop()
+
+        def check_quit():
+            if should_quit is not None and should_quit():
+                loop.quit()
+
+        quit_timer = QtCore.QTimer()
+        quit_timer.timeout.connect(check_quit)
+        quit_timer.start(QUIT_CHECK_INTERVAL_MS)
+
+        timeout_timer = QtCore.QTimer()
+        timeout_timer.setSingleShot(True)
+        timeout_timer.timeout.connect(loop.quit)
+
+        if timeout is not None:
+            timeout_timer.start(int(timeout * 1000))
+
+        self._loops.append(loop)
+
+        try:
+            if should_quit is None or not should_quit():
+                loop.exec_()
+        finally:
+            self._loops.remove(loop)
+            quit_timer.stop()
+            timeout_timer.stop()
+
+    def stop(self):
+        """Makes all running run() calls return."""
+        for loop in self._loops:
+            loop.quit()
+
+    def _schedule(self, task, deadline):
+        task.deadline = deadline
+        self._tasks.add(task)
+        heapq.heappush(self._heap, (deadline, next(self._seq), task))
+        self._arm()
+
+    def _remove(self, task):
+        self._tasks.discard(task)
+
+        for k in [k for k in self._events if k[0] is task]:
+            del self._events[k]
+
+        # Heap entries of inactive tasks are dropped lazily.
+        self._arm()
+
+    def _arm(self):
+        if self._dispatching:
+            return
+
+        while len(self._heap) and not self._heap[0][2].active:
+            heapq.heappop(self._heap)
+
+        if len(self._events):
+            self._timer.start(0)
+        elif len(self._heap):
+            delay = max(0.0, self._heap[0][0] - time.monotonic())
+            self._timer.start(int(math.ceil(delay * 1000)))
+        else:
+            self._timer.stop()
+
+    def _dispatch(self):
+        self._dispatching = True
+
+        try:
+            self._run_events()
+
+            now = time.monotonic()
+            due = list()
+
+            while len(self._heap) and self._heap[0][0] <= now + self.coalesce_window:
+                deadline, seq, task = heapq.heappop(self._heap)
+
+                if task.active and task.deadline == deadline:
+                    due.append(task)
+
+            for task in due:
+                if not task.active:
+                    continue
+
+                if task.interval is not None:
+                    # Advance from the previous deadline, skipping missed ticks.
+                    ticks = max(1, math.floor((now - task.deadline) / task.interval) + 1)
+                    task.deadline += ticks * task.interval
+                    heapq.heappush(self._heap, (task.deadline, next(self._seq), task))
+                else:
+                    task.active = False
+                    self._tasks.discard(task)
+
+                self._invoke(task, task.args)
+                # Deliver events caused by the task before running the next one.
+                self._run_events()
+        finally:
+            self._dispatching = False
+            self._arm()
+
+    def _run_events(self):
+        while len(self._events):
+            (task, key), args = self._events.popitem(last=False)
+            self._invoke(task, args)
+
+    def _invoke(self, task, args):
+        task.runs += 1
+
+        try:
+            task.fn(*args)
+        except Exception:
+            self.log.exception("Scheduled task %s raised", task.fn)
@@ -14,14 +14,47 @@ import typing
 
 from mesycontrol.qt import QtCore, Property
 from mesycontrol import app_context, util, mrc_connection, hardware_controller, hardware_model
-from mesycontrol.future import get_future_result
+from mesycontrol import memory_cache
+from mesycontrol import scheduler
+from mesycontrol.future import get_future_result, wait_all
+
+def _queue_reads(device, addresses):
+    """Queues reads of the given addresses on the hardware device at once.
+    Consecutive addresses are read using read_multi() which falls back to
+    pipelined single reads if the MRC does not support the read multi
+    request."""
+    return [device.read_multi(first, count)
+            for first, count in memory_cache.make_read_ranges(addresses)]
+
+def _wait_for(futures, timeout):
+    """Waits for all futures. Pending futures are cancelled and TimeoutError
+    is raised if the timeout expires. Otherwise the first exception of the
+    futures is raised."""
+    if not wait_all(futures, timeout):
+        for f in futures:
+            f.cancel()
+        raise TimeoutError("timeout waiting for %d requests" % len(futures))
+
+    # Observe all exceptions, not just the first one.
+    errors = [f.exception() for f in futures if f.exception() is not None]
+
+    if len(errors):
+        raise errors[0]
+
+def _read_results(futures, addresses):
+    """Returns an address -> ReadResult dict for the given addresses from
+    completed read futures."""
+    wanted = set(addresses)
+    return dict((result.address, result) for f in futures for result in f.result()
+            if result.address in wanted)
 
 class DeviceWrapper(QtCore.QObject):
     """Represents a device connected to one of the busses on a MRC."""
 
-    def __init__(self, device, parent=None):
+    def __init__(self, device, device_registry=None, parent=None):
         super(DeviceWrapper, self).__init__(parent)
         self._wrapped = device
+        self._device_registry = device_registry
 
     def __getitem__(self, key):
         """Shortcut for read_parameter()."""
@@ -55,12 +88,49 @@ class DeviceWrapper(QtCore.QObject):
         """Write to the specified address on the device."""
         return get_future_result(self._wrapped.set_parameter(addr, value))
 
+    def get_address_of(self, addr_or_name):
+        """Returns the address of the given parameter address or name. Names
+        are looked up in the devices profile."""
+        if isinstance(addr_or_name, str):
+            if self._device_registry is None:
+                raise KeyError("No device profile to look up parameter '%s'" % addr_or_name)
+            profile = self._device_registry.get_device_profile(self._wrapped.idc)
+            return profile[addr_or_name].address
+        return int(addr_or_name)
+
+    def read_parameters(self, addrs_or_names, timeout=None):
+        """Read the given parameters from the device.
+        All reads are issued at once and waited for in a single event loop.
+        Returns a dict mapping each of the given addresses or names to its
+        ReadResult. Raises TimeoutError if timeout (in seconds) expires."""
+        keys      = list(addrs_or_names)
+        addresses = dict((key, self.get_address_of(key)) for key in keys)
+        futures   = _queue_reads(self._wrapped, addresses.values())
+
+        _wait_for(futures, timeout)
+
+        results = _read_results(futures, addresses.values())
+        return dict((key, results[addresses[key]]) for key in keys)
+
+    def set_parameters(self, mapping, timeout=None):
+        """Write the parameters given as a dict of address or name -> value.
+        All writes are issued at once and waited for in a single event loop.
+        Returns a dict mapping the given keys to their SetResult. Raises
+        TimeoutError if timeout (in seconds) expires."""
+        futures = dict((key, self._wrapped.set_parameter(self.get_address_of(key), value))
+                for key, value in mapping.items())
+
+        _wait_for(list(futures.values()), timeout)
+
+        return dict((key, f.result()) for key, f in futures.items())
+
 
 class MRCWrapper(QtCore.QObject):
     """Represents an MRC object with its two busses."""
-    def __init__(self, mrc, parent=None):
+    def __init__(self, mrc, device_registry=None, parent=None):
         super(MRCWrapper, self).__init__(parent)
         self._wrapped = mrc
+        self._device_registry = device_registry
 
     def __getitem__(self, bus):
         """
@@ -73,7 +143,7 @@ class MRCWrapper(QtCore.QObject):
         class bus_proxy(object):
             """Holds a list of devices connected to a specific bus on a MRC."""
             def __getitem__(proxy_self, dev):
-                return DeviceWrapper(self._wrapped.get_device(bus, dev))
+                return DeviceWrapper(self._wrapped.get_device(bus, dev), self._device_registry)
 
             def __str__(proxy_self):
                 parts = list()
@@ -117,7 +187,43 @@ class MRCWrapper(QtCore.QObject):
         If no bus is specified the devices connected to all busses is returned.
         """
         devices = self._wrapped.get_devices(bus)
-        return [DeviceWrapper(dev) for dev in devices]
+        return [DeviceWrapper(dev, self._device_registry) for dev in devices]
+
+    def read_all(self, devices=None, addrs=None, timeout=None):
+        """
+        Read parameters from multiple devices at once.
+
+        devices is a list of DeviceWrapper objects and defaults to all known
+        devices. addrs is the list of addresses to read from each device. If
+        addrs is None the volatile parameters of each devices profile are
+        read. All requests are issued at once and waited for in a single event
+        loop.
+
+        Returns a dict mapping (bus, address) of each device to a dict of
+        parameter address -> ReadResult. Raises TimeoutError if timeout (in
+        seconds) expires.
+        """
+        if devices is None:
+            devices = self.get_devices()
+
+        futures = dict()
+
+        for device in devices:
+            if addrs is not None:
+                addresses = list(addrs)
+            elif self._device_registry is not None:
+                addresses = list(self._device_registry.get_device_profile(
+                        device.idc).get_volatile_addresses())
+            else:
+                raise KeyError("No device profiles to look up volatile parameters")
+
+            key = (device.bus, device.address)
+            futures[key] = (addresses, _queue_reads(device, addresses))
+
+        _wait_for([f for addresses, fs in futures.values() for f in fs], timeout)
+
+        return dict((key, _read_results(fs, addresses))
+                for key, (addresses, fs) in futures.items())
 
 class ScriptContext(object):
     """
@@ -130,6 +236,7 @@ class ScriptContext(object):
     def __init__(self, appContext):
         self.appContext: app_context.Context = appContext
         self.quit = False
+        self._scheduler = None
 
     def make_mrc(self, url):
         connection = mrc_connection.factory(url=url)
@@ -137,7 +244,7 @@ class ScriptContext(object):
         mrc = hardware_model.HardwareMrc(url)
         mrc.set_controller(controller)
         self.appContext.app_registry.hw.add_mrc(mrc)
-        return MRCWrapper(mrc)
+        return MRCWrapper(mrc, self.appContext.device_registry)
 
     def get_device_profile(self, device_idc):
         return self.appContext.device_registry.get_device_profile(device_idc)
@@ -145,7 +252,107 @@ class ScriptContext(object):
     def get_all_mrcs(self):
         return [mrc for mrc in self.appContext.app_registry.get_mrcs()]
 
+    def get_scheduler(self):
+        if self._scheduler is None:
+            self._scheduler = scheduler.Scheduler()
+        return self._scheduler
+
+    def every(self, interval, fn, *args, delay=None):
+        """
+        Calls fn(*args) every interval seconds from within run(). The first
+        call happens after delay seconds, which defaults to interval.
+        Returns a scheduler.Task which can be cancelled.
+        """
+        return self.get_scheduler().call_every(interval, fn, *args, delay=delay)
+
+    def after(self, delay, fn, *args):
+        """Calls fn(*args) once after delay seconds. Returns a scheduler.Task."""
+        return self.get_scheduler().call_later(delay, fn, *args)
+
+    def on_parameter_change(self, device, address, fn):
+        """
+        Calls fn(device, address, value) when the cached value of the given
+        parameter changes, e.g. through polling or reads. device is a
+        DeviceWrapper, address a parameter address or name or None for all
+        parameters. Changes are delivered between scheduled tasks. Only the
+        latest value is delivered if a parameter changes several times in the
+        meantime. value is None if the parameter was removed from the cache.
+        Returns a scheduler.Task.
+        """
+        if not isinstance(device, DeviceWrapper):
+            device = DeviceWrapper(device, self.appContext.device_registry)
+
+        if address is not None:
+            address = device.get_address_of(address)
+
+        sched = self.get_scheduler()
+        task  = sched.make_event_task(fn)
+        hw    = device._wrapped
+
+        def on_parameter_changed(addr, value):
+            if address is None or addr == address:
+                sched.post(task, device, addr, value, key=addr)
+
+        hw.parameter_changed.connect(on_parameter_changed)
+        task.add_cleanup(lambda: hw.parameter_changed.disconnect(on_parameter_changed))
+        return task
+
+    def on_device_added(self, fn):
+        """
+        Calls fn(device) with a DeviceWrapper for each device appearing on any
+        MRC from now on, e.g. as the result of a scanbus. Devices already
+        present are not reported, use MRCWrapper.get_devices() for those.
+        Returns a scheduler.Task.
+        """
+        sched    = self.get_scheduler()
+        task     = sched.make_event_task(fn)
+        registry = self.appContext.app_registry.hw
+        mrcs     = list()
+
+        def on_device_added(device):
+            sched.post(task, DeviceWrapper(device, self.appContext.device_registry), key=device)
+
+        def on_mrc_added(mrc):
+            mrc.device_added.connect(on_device_added)
+            mrcs.append(mrc)
+
+        def on_mrc_about_to_be_removed(mrc):
+            if mrc in mrcs:
+                mrc.device_added.disconnect(on_device_added)
+                mrcs.remove(mrc)
+
+        def cleanup():
+            registry.mrc_added.disconnect(on_mrc_added)
+            registry.mrc_about_to_be_removed.disconnect(on_mrc_about_to_be_removed)
+
+            for mrc in list(mrcs):
+                on_mrc_about_to_be_removed(mrc)
+
+        registry.mrc_added.connect(on_mrc_added)
+        registry.mrc_about_to_be_removed.connect(on_mrc_about_to_be_removed)
+
+        for mrc in registry.get_mrcs():
+            on_mrc_added(mrc)
+
+        task.add_cleanup(cleanup)
+        return task
+
+    def run(self, timeout=None):
+        """
+        Runs the event loop, executing the scheduled tasks, until stop() is
+        called, ctx.quit is set (e.g. by the script runners SIGINT handler) or
+        timeout seconds have passed. The process sleeps while no task is due.
+        """
+        self.get_scheduler().run(timeout, lambda: self.quit)
+
+    def stop(self):
+        """Makes run() return."""
+        if self._scheduler is not None:
+            self._scheduler.stop()
+
     def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel_all()
         self.appContext.shutdown()
 
 @contextlib.contextmanager
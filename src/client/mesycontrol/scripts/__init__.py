@@ -18,3 +18,8 @@ def scanbus_main():
 def scanbus_basic_main():
     from .scanbus_basic import main
     script_runner_run(main)
+
+def convert_setup_main():
+    import sys
+    from .convert_setup import main
+    sys.exit(main())
@@ -14,10 +14,11 @@
 
 import signal
 import sys
-import time
 from mesycontrol.script import get_script_context
 
 def poll_volatile_parameters(ctx, mrc):
+    devices = list()
+
     for device in mrc.get_devices():
         # device is a script.DeviceWrapper instance
         # profile is a device_profile.DeviceProfile instance
@@ -29,11 +30,18 @@ def poll_volatile_parameters(ctx, mrc):
             print(", address conflict detected!")
             continue
 
-        volatiles = list(profile.get_volatile_addresses())
-        print(": polling {} volatile parameters".format(len(volatiles)))
+        print(": polling {} volatile parameters".format(len(profile.get_volatile_addresses())))
+        devices.append(device)
+
+    # Read the volatile parameters of all devices at once. The result maps
+    # (bus, address) to a dict of parameter address -> ReadResult.
+    pollResults = mrc.read_all(devices)
+
+    for device in devices:
+        profile = ctx.get_device_profile(device.idc)
+        print("bus={}, addr=0x{:x}:".format(device.bus, device.address))
 
-        for addr in volatiles:
-            readResult = device.read_parameter(addr)
+        for addr, readResult in sorted(pollResults[(device.bus, device.address)].items()):
             paramProfile = profile[readResult.address]
             paramUnit = paramProfile.units[-1] # device_profile.Unit
             print("  addr={:03d}, raw_value={}, name={}, unit_value={} {}".format(
@@ -48,21 +56,20 @@ def main(ctx, mrc, args):
     ScanbusInterval = 5.0 # in seconds
     PollInterval = 1.0 # in seconds
 
-    tScanbus = 0.0
-    tPoll = 0.0
+    def scanbus():
+        print("scanbus")
+        for bus in range(2):
+            mrc.scanbus(bus)
 
-    print("Entering polling loop, press Ctrl-C to quit")
+    def poll():
+        print("poll")
+        poll_volatile_parameters(ctx, mrc)
 
-    while not ctx.quit:
-        if time.monotonic() - tScanbus >= ScanbusInterval:
-            print("scanbus")
-            for bus in range(2):
-                mrc.scanbus(bus)
-            tScanbus = time.monotonic()
+    # The tasks are run from the event loop inside ctx.run(). Notifications
+    # from the MRC are processed between tasks and the process sleeps while no
+    # task is due.
+    ctx.every(ScanbusInterval, scanbus, delay=0)
+    ctx.every(PollInterval, poll, delay=0)
 
-        if time.monotonic() - tPoll >= PollInterval:
-            print("poll")
-            poll_volatile_parameters(ctx, mrc)
-            tPoll = time.monotonic()
-        else:
-            time.sleep(0.1)
+    print("Entering polling loop, press Ctrl-C to quit")
+    ctx.run()
@@ -9,26 +9,29 @@
 # other settings from the environment variables INFLUXDB_TOKEN, INFLUXDB_ORG,
 # INFLUXDB_URL and INFLUXDB_BUCKET. INFLUXDB_TOKEN is required, the other values
 # have defaults.
-
-import influxdb_client
-from influxdb_client.client.write_api import SYNCHRONOUS
-from influxdb_client import InfluxDBClient, Point, WritePrecision
+#
+# Points are written in the background by an influxdb_sink.InfluxDBSink so
+# that a slow or unreachable database does not stall the polling loop. While
+# the database is down points are spooled to INFLUXDB_SPOOL and written once
+# it is reachable again.
 
 import os
 import signal
 import sys
-import time
 
 from mesycontrol.script import script_runner_run
+from mesycontrol.scripts.influxdb_sink import InfluxDBSink
 
 # InfluxDB settings
 mesyflux_token  = os.environ.get("INFLUXDB_TOKEN")
 mesyflux_org    = os.environ.get("INFLUXDB_ORG", default="mesytec")
 mesyflux_url    = os.environ.get("INFLUXDB_URL", default="http://localhost:8086")
 mesyflux_bucket = os.environ.get("INFLUXDB_BUCKET", default="mesycontrol")
+mesyflux_spool  = os.environ.get("INFLUXDB_SPOOL", default="mesyflux_auto_poll.spool")
 
 def poll_volatile_parameters(ctx, mrc):
     ret = dict()
+    devices = list()
 
     for device in mrc.get_devices():
         # device is a script.DeviceWrapper instance
@@ -41,12 +44,18 @@ def poll_volatile_parameters(ctx, mrc):
             print(", address conflict detected!")
             continue
 
-        volatiles = list(profile.get_volatile_addresses())
-        print(": polling {} volatile parameters".format(len(volatiles)))
+        print(": polling {} volatile parameters".format(len(profile.get_volatile_addresses())))
+        devices.append(device)
+
+    # Read the volatile parameters of all devices at once. The result maps
+    # (bus, address) to a dict of parameter address -> ReadResult.
+    readResults = mrc.read_all(devices)
 
+    for device in devices:
+        profile = ctx.get_device_profile(device.idc)
         paramTuples = list()
-        for addr in volatiles:
-            readResult = device.read_parameter(addr)
+
+        for addr, readResult in sorted(readResults[(device.bus, device.address)].items()):
             paramProfile = profile[readResult.address]
             paramTuples.append((readResult, paramProfile))
 
@@ -54,76 +63,78 @@ def poll_volatile_parameters(ctx, mrc):
 
     return ret
 
-def write_poll_results_to_influxdb(ctx, mesyfluxWriteApi: influxdb_client.WriteApi, pollResults):
+def write_poll_results_to_influxdb(ctx, sink: InfluxDBSink, pollResults):
     for device, paramTuples in pollResults.items():
         deviceProfile = ctx.get_device_profile(device.idc)
-        p = influxdb_client.Point("mesyflux_auto_poll")
 
         # These tags are used to uniquely identify each device by mrc-url, bus,
         # bus address and device type.
-        p.tag("mrc_url", device.mrc.url)
-        p.tag("mrc_bus", device.bus)
-        p.tag("mrc_bus_addr", device.address)
-        p.tag("device_idc", device.idc)
-        p.tag("device_type", deviceProfile.name)
+        tags = dict(
+                mrc_url=device.mrc.url,
+                mrc_bus=device.bus,
+                mrc_bus_addr=device.address,
+                device_idc=device.idc,
+                device_type=deviceProfile.name)
+
+        fields = dict()
 
-        # Add parameter values and other attribues to the Point instance.
+        # Add parameter values and other attribues to the point.
         for readResult, paramProfile in paramTuples:
             paramUnit = paramProfile.units[-1] # device_profile.Unit
 
             # The raw parameter value as read from the device.
-            p.field(paramProfile.name + "_raw", readResult.value)
+            fields[paramProfile.name + "_raw"] = readResult.value
 
             # Optional: the parameters register address value
-            #p.field(paramProfile.name + "_address", readResult.address)
+            #fields[paramProfile.name + "_address"] = readResult.address
 
             # Optional: parameter unit value obtained from the parameters Unit definition
-            p.field(paramProfile.name + "_unit_value", paramUnit.unit_value(readResult.value))
+            fields[paramProfile.name + "_unit_value"] = float(paramUnit.unit_value(readResult.value))
 
             # Label of the parameters unit value, e.g. 'V', 'mA', etc.
-            p.field(paramProfile.name + "_unit", paramUnit.label)
-
-        mesyfluxWriteApi.write(bucket=mesyflux_bucket, org=mesyflux_org, record=p)
+            fields[paramProfile.name + "_unit"] = paramUnit.label
 
-g_quit = False
-
-def signal_handler(signum, frame):
-    global g_quit
-    g_quit = True
+        sink.write_point(tags, fields)
 
 def main(ctx, mrc, args):
 
-    mesyfluxClient = influxdb_client.InfluxDBClient(url=mesyflux_url, token=mesyflux_token, org=mesyflux_org)
-    mesyfluxWriteApi = mesyfluxClient.write_api(write_options=SYNCHRONOUS)
+    sink = InfluxDBSink(mesyflux_url, mesyflux_org, mesyflux_bucket,
+            token=mesyflux_token, spool_filename=mesyflux_spool)
 
-    with mesyfluxClient, mesyfluxWriteApi:
+    try:
         ScanbusInterval = 5.0 # in seconds
         PollInterval = 1.0 # in seconds
 
-        tScanbus = 0.0
-        tPoll = 0.0
-
-        print("Entering polling loop, press Ctrl-C to quit")
-
-        while not g_quit:
+        def is_connected():
             if not mrc.is_connected():
                 mrc.connectMrc()
-                if mrc.is_connected():
-                    print("Connected to mrc {}".format(mrc))
-            else:
-                if time.monotonic() - tScanbus >= ScanbusInterval:
-                    print("scanbus")
-                    for bus in range(2):
-                        mrc.scanbus(bus)
-                    tScanbus = time.monotonic()
-
-                if time.monotonic() - tPoll >= PollInterval:
-                    print("poll")
-                    pollResults = poll_volatile_parameters(ctx, mrc)
-                    write_poll_results_to_influxdb(ctx, mesyfluxWriteApi, pollResults)
-                    tPoll = time.monotonic()
-                else:
-                    time.sleep(0.1)
+                if not mrc.is_connected():
+                    return False
+                print("Connected to mrc {}".format(mrc))
+            return True
+
+        def scanbus():
+            if is_connected():
+                print("scanbus")
+                for bus in range(2):
+                    mrc.scanbus(bus)
+
+        def poll():
+            if is_connected():
+                print("poll")
+                pollResults = poll_volatile_parameters(ctx, mrc)
+                write_poll_results_to_influxdb(ctx, sink, pollResults)
+
+        # The tasks are run from the event loop inside ctx.run(), see
+        # auto_poll_parameters.py.
+        ctx.every(ScanbusInterval, scanbus, delay=0)
+        ctx.every(PollInterval, poll, delay=0)
+
+        print("Entering polling loop, press Ctrl-C to quit")
+        ctx.run()
+    finally:
+        sink.close()
+        print("InfluxDB sink: {}".format(sink.get_metrics()))
 
 if __name__ == "__main__":
     script_runner_run(main)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""Converts mesycontrol setup files between the XML and the binary format.
+
+The output format is determined by the extension of the output filename:
+files ending in '.mcsetup' are written in the binary format, all other files
+as XML.
+"""
+
+import argparse
+import sys
+
+from mesycontrol import config_binary
+from mesycontrol import config_xml
+
+def convert_setup(input_filename, output_filename, idc_to_parameter_names=dict(), verify=True):
+    """Converts the setup file input_filename to output_filename. If verify
+    is True the output is read back and compared against the input. Raises
+    ValueError if the setups differ."""
+    setup = config_xml.read_setup(input_filename)
+    config_xml.write_setup(setup, output_filename, idc_to_parameter_names)
+
+    if verify:
+        written = config_xml.read_setup(output_filename)
+
+        if config_binary.setup_to_bytes(setup) != config_binary.setup_to_bytes(written):
+            raise ValueError("%s differs from %s after conversion" % (
+                output_filename, input_filename))
+
+    return setup
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help="setup file to read")
+    parser.add_argument('output', help="setup file to write")
+    parser.add_argument('--no-parameter-names', action='store_true',
+            help="do not add parameter names as comments to XML output")
+    parser.add_argument('--no-verify', action='store_true',
+            help="do not read back and compare the output file")
+    args = parser.parse_args(argv)
+
+    names = dict()
+
+    if not args.no_parameter_names and not config_binary.is_binary_filename(args.output):
+        from mesycontrol import device_registry
+        names = device_registry.DeviceRegistry(
+                auto_load_modules=True).get_parameter_name_mapping()
+
+    try:
+        setup = convert_setup(args.input, args.output, names, verify=not args.no_verify)
+    except (OSError, ValueError) as e:
+        print("Error: %s" % e, file=sys.stderr)
+        return 1
+
+    print("%s -> %s: %d MRCs, %d devices" % (args.input, args.output,
+        len(setup), sum(len(mrc) for mrc in setup)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
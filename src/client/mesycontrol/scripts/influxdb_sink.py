@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+# Batched, non-blocking InfluxDB writer usable as a mesycontrol.monitor sink.
+#
+# Points are converted to InfluxDB line protocol and handed to a background
+# thread which writes them in batches using the InfluxDB v2 HTTP API
+# (/api/v2/write). Batches are sent once max_batch_points are queued or the
+# oldest queued point is older than flush_interval seconds.
+#
+# The in-memory queue is bounded. If the database is unreachable or the queue
+# is full, points are appended to a local spool file instead. Once writes
+# succeed again the spool is moved aside and replayed in batches while new
+# points go to a fresh spool. Replaying a partially replayed spool after a
+# crash is harmless: InfluxDB overwrites points with identical measurement,
+# tags and timestamp.
+#
+# Only the python standard library is used. The sink does not need the
+# influxdb_client package.
+
+import collections
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from mesycontrol import monitor
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MEASUREMENT = "mesyflux_auto_poll"
+
+def _escape_key(s):
+    return str(s).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+def _escape_measurement(s):
+    return str(s).replace('\\', '\\\\').replace(',', '\\,').replace(' ', '\\ ')
+
+def _format_field_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return '%di' % value
+    if isinstance(value, float):
+        return repr(value)
+    return '"%s"' % str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def format_line(measurement, tags, fields, timestamp_ns):
+    """Returns a line protocol line for the given point. tags and fields
+    are dicts, timestamp_ns is the time in nanoseconds since the epoch."""
+    tag_str   = ''.join(',%s=%s' % (_escape_key(k), _escape_key(v))
+            for k, v in sorted(tags.items()) if v is not None and str(v) != '')
+    field_str = ','.join('%s=%s' % (_escape_key(k), _format_field_value(v))
+            for k, v in sorted(fields.items()) if v is not None)
+    return '%s%s %s %d' % (_escape_measurement(measurement), tag_str, field_str, timestamp_ns)
+
+class WriteError(RuntimeError):
+    pass
+
+class InfluxDBSink(object):
+    """Writes points to InfluxDB in batches from a background thread.
+
+    write_point() and handle_event() never block on the database. Call
+    close() to flush pending points and stop the writer thread.
+    """
+    def __init__(self, url, org, bucket, token=None, spool_filename=None,
+            max_batch_points=5000, flush_interval=1.0, max_queue_points=100000,
+            timeout=5.0, retry_interval=5.0, measurement=DEFAULT_MEASUREMENT,
+            device_registry=None):
+        self.write_url = "%s/api/v2/write?%s" % (url.rstrip('/'), urllib.parse.urlencode(
+            dict(org=org, bucket=bucket, precision='ns')))
+        self.token              = token
+        self.spool_filename     = spool_filename
+        self.max_batch_points   = max_batch_points
+        self.flush_interval     = flush_interval
+        self.max_queue_points   = max_queue_points
+        self.timeout            = timeout
+        self.retry_interval     = retry_interval
+        self.measurement        = measurement
+        self.device_registry    = device_registry
+
+        self._queue     = collections.deque() # (enqueue time, line)
+        self._cond      = threading.Condition()
+        self._stopping  = False
+        self._db_down   = False
+        self._t_retry   = 0.0
+        self._t_replay  = 0.0 # next replay attempt after a spool file error
+        self._spool_lock = threading.Lock()
+        self._replay_offset = 0 # position in the replay file, writer thread only
+
+        self._metrics   = dict(
+                points_received=0,
+                points_written=0,
+                points_spooled=0,
+                points_replayed=0,
+                points_dropped=0,
+                batches_written=0,
+                write_errors=0,
+                last_write_seconds=0.0,
+                last_error=None,
+                )
+        self._t_start   = time.monotonic()
+
+        self._thread = threading.Thread(target=self._run, name="InfluxDBSink", daemon=True)
+        self._thread.start()
+
+    # ===== producer side =====
+    def write_point(self, tags, fields, timestamp=None, measurement=None):
+        """Queues a point. timestamp is in seconds since the epoch and
+        defaults to the current time."""
+        if timestamp is None:
+            timestamp = time.time()
+
+        line = format_line(measurement or self.measurement, tags, fields,
+                int(timestamp * 1e9))
+        self.write_lines([line])
+
+    def write_lines(self, lines):
+        """Queues already formatted line protocol lines. If the queue is full
+        the lines are spooled to disk instead."""
+        now   = time.monotonic()
+        lines = list(lines)
+
+        with self._cond:
+            self._metrics['points_received'] += len(lines)
+            room = self.max_queue_points - len(self._queue)
+            self._queue.extend((now, line) for line in lines[:max(room, 0)])
+            overflow = lines[max(room, 0):]
+
+            if len(self._queue) >= self.max_batch_points:
+                self._cond.notify()
+
+        if len(overflow):
+            self._spool(overflow)
+
+    def handle_event(self, event):
+        """monitor sink interface: parameter changes are written as points.
+        Other events are ignored."""
+        if not isinstance(event, monitor.ParameterEvent):
+            return
+
+        tags = dict(mrc_url=event.url, mrc_bus=event.bus, mrc_bus_addr=event.device,
+                device_idc=event.idc)
+
+        if self.device_registry is not None:
+            tags['device_type'] = self.device_registry.get_device_name(event.idc)
+
+        name   = event.name or 'param%d' % event.address
+        fields = { name + "_raw": event.value }
+        unit   = event.unit
+
+        if unit is not None:
+            fields[name + "_unit_value"] = float(unit.unit_value(event.value))
+            fields[name + "_unit"] = unit.label
+
+        self.write_point(tags, fields, event.time)
+
+    def get_metrics(self):
+        """Returns a dict of counters and current state: queue size, spool
+        size in bytes, lag of the oldest queued point in seconds and the
+        average write throughput in points per second."""
+        with self._cond:
+            ret = dict(self._metrics)
+            ret['queue_points'] = len(self._queue)
+            ret['lag_seconds']  = (time.monotonic() - self._queue[0][0]) if len(self._queue) else 0.0
+            ret['db_down']      = self._db_down
+
+        ret['spool_bytes'] = self._get_spool_size()
+        elapsed = time.monotonic() - self._t_start
+        ret['points_per_second'] = ret['points_written'] / elapsed if elapsed > 0 else 0.0
+        return ret
+
+    def flush(self, timeout=None):
+        """Waits until the queue is empty or timeout seconds passed. Returns
+        True if the queue was emptied."""
+        t_end = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            self._cond.notify()
+            while len(self._queue) or self._writing:
+                remaining = None if t_end is None else t_end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(0.05 if remaining is None else min(remaining, 0.05))
+            return True
+
+    def close(self, timeout=None):
+        """Writes pending points and stops the writer thread. Points which
+        could not be written remain in the spool."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    # ===== writer thread =====
+    _writing = False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._batch_due():
+                    self._cond.wait(self._wait_time())
+
+                stopping = self._stopping
+                batch = [self._queue.popleft()[1]
+                        for i in range(min(self.max_batch_points, len(self._queue)))]
+                self._writing = len(batch) > 0
+
+            try:
+                if len(batch):
+                    self._write_or_spool(batch)
+
+                if self._replay_due():
+                    self._replay_spool()
+            except OSError as e:
+                # Spool file errors must not end the writer thread.
+                log.error("InfluxDBSink: replaying the spool failed: %s", e)
+                with self._cond:
+                    self._metrics['write_errors'] += 1
+                    self._metrics['last_error'] = str(e)
+                self._t_replay = time.monotonic() + self.retry_interval
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+            if stopping:
+                with self._cond:
+                    remaining = [line for t, line in self._queue]
+                    self._queue.clear()
+                if len(remaining):
+                    self._write_or_spool(remaining)
+                return
+
+    def _batch_due(self):
+        if len(self._queue) >= self.max_batch_points:
+            return True
+        if len(self._queue) and time.monotonic() - self._queue[0][0] >= self.flush_interval:
+            return True
+        # Wake up periodically to retry replaying the spool.
+        return self._get_spool_size() > 0 and self._replay_due()
+
+    def _wait_time(self):
+        ret = self.retry_interval
+
+        if self._db_down:
+            ret = max(self._t_retry - time.monotonic(), 0.001)
+
+        if self._t_replay > time.monotonic():
+            ret = min(ret, max(self._t_replay - time.monotonic(), 0.001))
+
+        if len(self._queue):
+            ret = min(ret, max(self.flush_interval - (time.monotonic() - self._queue[0][0]), 0.001))
+
+        return ret
+
+    def _retry_due(self):
+        return not self._db_down or time.monotonic() >= self._t_retry
+
+    def _replay_due(self):
+        return self._retry_due() and time.monotonic() >= self._t_replay
+
+    def _write_or_spool(self, lines):
+        if self._db_down and not self._retry_due():
+            self._spool(lines)
+            return
+
+        try:
+            self._post(lines)
+            self._count(points_written=len(lines), batches_written=1)
+            self._db_down = False
+        except Exception as e:
+            log.warning("InfluxDB write of %d points failed: %s", len(lines), e)
+            with self._cond:
+                self._metrics['write_errors'] += 1
+                self._metrics['last_error'] = str(e)
+            self._db_down = True
+            self._t_retry = time.monotonic() + self.retry_interval
+            self._spool(lines)
+
+    def _post(self, lines):
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        req  = urllib.request.Request(self.write_url, data=data, method='POST')
+        req.add_header('Content-Type', 'text/plain; charset=utf-8')
+
+        if self.token:
+            req.add_header('Authorization', 'Token %s' % self.token)
+
+        t_start = time.monotonic()
+
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+
+        with self._cond:
+            self._metrics['last_write_seconds'] = time.monotonic() - t_start
+
+        if status // 100 != 2:
+            raise WriteError("HTTP status %d" % status)
+
+    def _count(self, **kwargs):
+        with self._cond:
+            for k, v in kwargs.items():
+                self._metrics[k] += v
+
+    # ===== spool =====
+    def _spool(self, lines):
+        if self.spool_filename is None:
+            log.warning("InfluxDBSink: dropping %d points (no spool file)", len(lines))
+            self._count(points_dropped=len(lines))
+            return
+
+        try:
+            with self._spool_lock, open(self.spool_filename, 'a', encoding='utf-8') as fp:
+                fp.write(''.join(line + '\n' for line in lines))
+            self._count(points_spooled=len(lines))
+        except OSError as e:
+            log.error("InfluxDBSink: spooling %d points failed: %s", len(lines), e)
+            self._count(points_dropped=len(lines))
+
+    def _get_spool_size(self):
+        """Returns the number of spooled bytes not yet replayed."""
+        if self.spool_filename is None:
+            return 0
+
+        size = 0
+
+        for filename, offset in ((self.spool_filename, 0),
+                (self._get_replay_filename(), self._replay_offset)):
+            try:
+                size += max(os.path.getsize(filename) - offset, 0)
+            except OSError:
+                pass
+
+        return size
+
+    def _get_replay_filename(self):
+        return self.spool_filename + '.replay'
+
+    def _replay_spool(self):
+        """Writes the spooled points in batches.
+
+        The spool is renamed to '<spool>.replay' under the lock, so producers
+        spooling concurrently start a fresh spool file and never wait for the
+        database. The renamed file is read and written in chunks of
+        max_batch_points lines. On failure the position is kept and the
+        replay continues from there on the next retry. The file is removed
+        once all of it has been written."""
+        if self.spool_filename is None:
+            return
+
+        replay_filename = self._get_replay_filename()
+
+        if not os.path.exists(replay_filename):
+            with self._spool_lock:
+                if self._get_spool_size() == 0:
+                    return
+                os.replace(self.spool_filename, replay_filename)
+            self._replay_offset = 0
+
+        with open(replay_filename, 'rb') as fp:
+            fp.seek(self._replay_offset)
+
+            while True:
+                batch = list()
+
+                while len(batch) < self.max_batch_points:
+                    line = fp.readline()
+                    if not line:
+                        break
+                    line = line.decode('utf-8').rstrip('\n')
+                    if line.strip():
+                        batch.append(line)
+
+                if not len(batch):
+                    break
+
+                try:
+                    self._post(batch)
+                except Exception as e:
+                    log.warning("InfluxDB spool replay failed: %s", e)
+                    with self._cond:
+                        self._metrics['write_errors'] += 1
+                        self._metrics['last_error'] = str(e)
+                    self._db_down = True
+                    self._t_retry = time.monotonic() + self.retry_interval
+                    return
+
+                # Advance only after the batch has been written. A crash
+                # before the file is removed replays it from the start.
+                self._replay_offset = fp.tell()
+                self._count(points_written=len(batch), points_replayed=len(batch),
+                        batches_written=1)
+                self._db_down = False
+
+        os.unlink(replay_filename)
+        self._replay_offset = 0
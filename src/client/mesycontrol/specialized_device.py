@@ -27,6 +27,7 @@ from mesycontrol.qt import QtCore
 from mesycontrol.qt import QtWidgets
 from mesycontrol.qt import Qt
 
+import mesycontrol.basic_model as bm
 import mesycontrol.future as future
 import mesycontrol.gui_util as gui_util
 import mesycontrol.util as util
@@ -100,12 +101,15 @@ class DeviceBase(QtCore.QObject):
 
         self.app_device.hw_parameter_changed.connect(self._on_hw_parameter_changed)
         self.app_device.cfg_parameter_changed.connect(self._on_cfg_parameter_changed)
+        self.app_device.hw_memory_cleared.connect(self._on_hw_memory_cleared)
+        self.app_device.cfg_memory_cleared.connect(self._on_cfg_memory_cleared)
 
         self.app_device.hw_extension_changed.connect(self._on_hw_extension_changed)
         self.app_device.cfg_extension_changed.connect(self._on_cfg_extension_changed)
 
         self._read_mode  = read_mode
         self._write_mode = write_mode
+        self._observers  = bm.ParameterObservers()
 
     def get_read_mode(self):
         return self._read_mode
@@ -171,6 +175,12 @@ class DeviceBase(QtCore.QObject):
         dev = self.hw if self.write_mode == util.HARDWARE else self.cfg
         return dev.set_parameter(address, value)
 
+    def get_memory_snapshot(self):
+        """Returns a snapshot of the memory of the device selected by the read
+        mode. Use it to read related parameters consistently."""
+        dev = self.hw if self.read_mode == util.HARDWARE else self.cfg
+        return dev.get_memory_snapshot()
+
     def get_extension(self, name):
         dev = self.hw if self.read_mode == util.HARDWARE else self.cfg
         return dev.get_extension(name)
@@ -188,6 +198,15 @@ class DeviceBase(QtCore.QObject):
         dev = self.hw if self.read_mode == util.HARDWARE else self.cfg
         return dev.get_extensions()
 
+    def add_parameter_observer(self, address_or_name, callback):
+        """Registers callback(address, value) to be invoked on changes of the
+        given parameter. Changes are reported for the device selected by the
+        read mode, the same as for the parameter_changed signal."""
+        self._observers.add(self.profile[address_or_name].address, callback)
+
+    def remove_parameter_observer(self, address_or_name, callback):
+        return self._observers.remove(self.profile[address_or_name].address, callback)
+
     def get_module(self):
         return self.cfg_module if self.read_mode & util.CONFIG else self.hw_module
 
@@ -217,6 +236,11 @@ class DeviceBase(QtCore.QObject):
     def _on_hw_parameter_changed(self, address, value):
         if self.read_mode & util.HARDWARE:
             self.parameter_changed.emit(address, value)
+            self._observers.notify(address, value)
+
+    def _on_hw_memory_cleared(self):
+        if self.read_mode & util.HARDWARE:
+            self._observers.notify_all(self.hw.get_cached_memory_ref().get)
 
     def _on_hw_extension_changed(self, name, value):
         if self.read_mode & util.HARDWARE:
@@ -241,6 +265,11 @@ class DeviceBase(QtCore.QObject):
     def _on_cfg_parameter_changed(self, address, value):
         if self.read_mode & util.CONFIG:
             self.parameter_changed.emit(address, value)
+            self._observers.notify(address, value)
+
+    def _on_cfg_memory_cleared(self):
+        if self.read_mode & util.CONFIG:
+            self._observers.notify_all(self.cfg.get_cached_memory_ref().get)
 
     def _on_cfg_extension_changed(self, name, value):
         if self.read_mode & util.CONFIG:
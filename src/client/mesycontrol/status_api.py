@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Read-only JSON status API served from the app_model.
+
+Resources:
+    /mrcs                         All MRCs including a summary of their devices.
+    /devices/<url>/<bus>/<addr>   A single device including its parameters.
+                                  <url> may be percent-encoded.
+    /changes?since=<generation>   Change feed. Returns the changes after the
+                                  given generation. Waits up to 'timeout'
+                                  seconds (default 30) if there are none.
+                                  'reset' is set if the changes are not
+                                  available, e.g. after a restart.
+
+Responses carry an ETag. A request with a matching If-None-Match header is
+answered with 304. If additionally the 'wait' query parameter is given the
+request is held until the resource changes or 'wait' seconds have passed.
+The X-Generation header contains the change feed generation the response
+corresponds to.
+
+Everything is served from the cached model state. No requests are sent to the
+MRCs.
+"""
+
+import collections
+import hashlib
+import json
+import time
+
+from mesycontrol.qt import QtCore
+from mesycontrol import http_server
+from mesycontrol.future import Future
+import mesycontrol.util as util
+
+JSON_CONTENT_TYPE   = 'application/json'
+MAX_WAIT_SECONDS    = 300.0
+DEFAULT_FEED_WAIT   = 30.0
+FEED_SIZE           = 10000
+
+Change = collections.namedtuple('Change', 'generation time type url bus address parameter source value')
+
+def _error(status, message):
+    return http_server.Response(status, json.dumps({'error': message}) + '\n', JSON_CONTENT_TYPE)
+
+def _wait_seconds(request, name, default=None):
+    try:
+        value = float(request.query[name])
+    except KeyError:
+        return default
+    except ValueError:
+        return default
+    return max(0.0, min(value, MAX_WAIT_SECONDS))
+
+class _Waiter(object):
+    def __init__(self, check, on_timeout, timeout):
+        self.future     = Future()
+        self.check      = check      # returns a Response or None
+        self.on_timeout = on_timeout # returns a Response
+        self.timer      = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._timeout)
+        self.timer.start(int(timeout * 1000))
+
+    def _timeout(self):
+        if not self.future.done():
+            self.future.set_result(self.on_timeout())
+
+    def poll(self):
+        if self.future.done():
+            return True
+
+        response = self.check()
+
+        if response is not None:
+            self.timer.stop()
+            self.future.set_result(response)
+            return True
+
+        return False
+
+class StatusApi(QtCore.QObject):
+    """Serves the state of the given app_model.MRCRegistry as JSON."""
+    def __init__(self, app_registry, parent=None):
+        super(StatusApi, self).__init__(parent)
+        self.log            = util.make_logging_source_adapter(__name__, self)
+        self.app_registry   = app_registry
+        self.server         = None
+        self.generation     = 0
+        self._feed          = collections.deque(maxlen=FEED_SIZE)
+        self._waiters       = list()
+        self._connections   = dict() # object -> [(signal, slot)]
+        self._renders       = dict() # path -> (data, etag), valid for _render_generation
+        self._render_generation = 0
+
+        # Waiters are checked once per event loop iteration instead of after
+        # each single change.
+        self._notify_timer = QtCore.QTimer(self)
+        self._notify_timer.setSingleShot(True)
+        self._notify_timer.setInterval(0)
+        self._notify_timer.timeout.connect(self._notify_waiters)
+
+        self._connect(app_registry, app_registry.mrc_added, self._on_mrc_added)
+        self._connect(app_registry, app_registry.mrc_about_to_be_removed, self._on_mrc_removed)
+
+        for mrc in app_registry.get_mrcs():
+            self._watch_mrc(mrc)
+
+    def listen(self, host='127.0.0.1', port=8200):
+        """Serves the API on http://host:port/. Returns True on success."""
+        if self.server is None:
+            self.server = http_server.HttpServer(self)
+            self.register(self.server)
+
+        return self.server.listen(host, port)
+
+    def register(self, server):
+        """Adds the APIs routes to the given http_server.HttpServer."""
+        server.add_route('/mrcs', self.handle_mrcs)
+        server.add_route('/devices/', self.handle_device)
+        server.add_route('/changes', self.handle_changes)
+
+    # ===== request handlers =====
+    def handle_mrcs(self, request):
+        if request.path not in ('/mrcs', '/mrcs/'):
+            return _error(404, "not found")
+
+        return self._serve(request, lambda: {
+            'mrcs': [self.mrc_to_dict(mrc) for mrc in self.app_registry.get_mrcs()],
+            })
+
+    def handle_device(self, request):
+        # Split from the right: the url itself contains slashes unless it was
+        # percent-encoded.
+        try:
+            url, bus, address = request.path[len('/devices/'):].rsplit('/', 2)
+            bus, address = int(bus), int(address)
+        except ValueError:
+            return _error(400, "expected /devices/<url>/<bus>/<address>")
+
+        if self._find_device(url, bus, address) is None:
+            return _error(404, "no device at %s bus=%d address=%d" % (url, bus, address))
+
+        def make_body():
+            # The device may be removed while a long-poll request waits.
+            device = self._find_device(url, bus, address)
+            return self.device_to_dict(device, with_parameters=True) if device is not None else None
+
+        return self._serve(request, make_body)
+
+    def handle_changes(self, request):
+        try:
+            since = int(request.query.get('since', self.generation))
+        except ValueError:
+            return _error(400, "invalid 'since' value")
+
+        timeout = _wait_seconds(request, 'timeout', DEFAULT_FEED_WAIT)
+
+        def check():
+            # A generation ahead of ours stems from before a restart.
+            if self.generation != since:
+                return self._feed_response(since)
+            return None
+
+        response = check()
+
+        if response is not None or timeout == 0.0:
+            return response or self._feed_response(since)
+
+        return self._add_waiter(check, lambda: self._feed_response(since), timeout)
+
+    def _feed_response(self, since):
+        body = {'generation': self.generation}
+
+        if ((len(self._feed) and since < self._feed[0].generation - 1)
+                or since > self.generation):
+            # Changes were dropped from the feed or the generation counter
+            # restarted. Clients have to reload the full state.
+            body['reset'] = True
+            body['changes'] = list()
+        else:
+            body['reset'] = False
+            body['changes'] = [dict((k, v) for k, v in c._asdict().items() if v is not None)
+                    for c in self._feed if c.generation > since]
+
+        return http_server.Response(200, json.dumps(body) + '\n', JSON_CONTENT_TYPE)
+
+    def _serve(self, request, make_body):
+        """Renders the body returned by make_body() and handles ETag and
+        long-polling."""
+        path = request.path
+
+        def render():
+            return self._render(path, make_body)
+
+        data, etag = render()
+        if_none_match = request.headers.get('if-none-match', None)
+
+        def headers(etag):
+            return {'ETag': etag, 'X-Generation': str(self.generation)}
+
+        if etag != if_none_match:
+            return http_server.Response(200, data, JSON_CONTENT_TYPE, headers(etag))
+
+        wait = _wait_seconds(request, 'wait')
+
+        if not wait:
+            return http_server.Response(304, headers=headers(etag))
+
+        def check():
+            data, new_etag = render()
+            if new_etag == etag:
+                return None
+            if data is None:
+                return _error(404, "gone")
+            return http_server.Response(200, data, JSON_CONTENT_TYPE, headers(new_etag))
+
+        return self._add_waiter(check, lambda: http_server.Response(304, headers=headers(etag)), wait)
+
+    def _render(self, path, make_body):
+        """Returns the (data, etag) of the resource at path. Renders are
+        cached until the next change, so all requests and long-poll waiters
+        of a resource share a single render per generation."""
+        if self._render_generation != self.generation:
+            self._renders.clear()
+            self._render_generation = self.generation
+
+        try:
+            return self._renders[path]
+        except KeyError:
+            pass
+
+        body = make_body()
+
+        if body is None:
+            ret = (None, None)
+        else:
+            data = json.dumps(body, sort_keys=True) + '\n'
+            ret  = (data, '"%s"' % hashlib.sha1(data.encode('utf-8')).hexdigest()[:20])
+
+        self._renders[path] = ret
+        return ret
+
+    def _add_waiter(self, check, on_timeout, timeout):
+        waiter = _Waiter(check, on_timeout, timeout)
+        self._waiters = [w for w in self._waiters if not w.future.done()]
+        self._waiters.append(waiter)
+        return waiter.future
+
+    def _notify_waiters(self):
+        self._waiters = [w for w in self._waiters if not w.poll()]
+
+    # ===== serialization =====
+    def mrc_to_dict(self, mrc):
+        hw  = mrc.hw
+        ret = {
+                'url': mrc.url,
+                'has_hw': hw is not None,
+                'has_cfg': mrc.cfg is not None,
+                'devices': [self.device_to_dict(d) for d in mrc.get_devices()],
+                }
+
+        if hw is not None:
+            error = hw.last_connection_error
+            ret.update({
+                'connected': hw.is_connected(),
+                'connecting': hw.is_connecting(),
+                'connection_error': str(error) if error is not None else None,
+                'write_access': hw.has_write_access(),
+                'can_acquire_write_access': hw.can_acquire_write_access(),
+                'silenced': hw.is_silenced(),
+                })
+
+        return ret
+
+    def device_to_dict(self, device, with_parameters=False):
+        hw, cfg = device.hw, device.cfg
+        profile = device.hw_profile if hw is not None else device.cfg_profile
+
+        ret = {
+                'bus': device.bus,
+                'address': device.address,
+                'idc': hw.idc if hw is not None else cfg.idc,
+                'type': profile.name,
+                'has_hw': hw is not None,
+                'has_cfg': cfg is not None,
+                'idc_conflict': device.idc_conflict,
+                'config_applied': device.config_applied,
+                }
+
+        if hw is not None:
+            ret['rc'] = hw.rc
+            ret['address_conflict'] = hw.address_conflict
+
+        if with_parameters:
+            hw_mem  = hw.get_memory_snapshot() if hw is not None else dict()
+            cfg_mem = cfg.get_memory_snapshot() if cfg is not None else dict()
+            params  = list()
+
+            for address in sorted(set(hw_mem) | set(cfg_mem)):
+                pp = profile[address]
+                p  = {'address': address, 'name': pp.name if pp is not None else None}
+
+                if address in hw_mem:
+                    p['value'] = hw_mem[address]
+                if address in cfg_mem:
+                    p['config_value'] = cfg_mem[address]
+
+                if pp is not None and len(pp.units) > 1 and address in hw_mem:
+                    unit = pp.units[-1]
+                    p['unit_value'] = unit.unit_value(hw_mem[address])
+                    p['unit'] = unit.label
+
+                params.append(p)
+
+            ret['parameters'] = params
+
+        return ret
+
+    def _find_device(self, url, bus, address):
+        mrc = self.app_registry.get_mrc(url)
+        return mrc.get_device(bus, address) if mrc is not None else None
+
+    # ===== change tracking =====
+    def _connect(self, obj, signal, slot):
+        signal.connect(slot)
+        self._connections.setdefault(obj, list()).append((signal, slot))
+
+    def _disconnect(self, obj):
+        for signal, slot in self._connections.pop(obj, list()):
+            signal.disconnect(slot)
+
+    def _changed(self, type_, url=None, bus=None, address=None, parameter=None,
+            source=None, value=None):
+        self.generation += 1
+        self._feed.append(Change(self.generation, time.time(), type_, url, bus, address,
+            parameter, source, value))
+
+        if len(self._waiters):
+            self._notify_timer.start()
+
+    def _on_mrc_added(self, mrc):
+        self._watch_mrc(mrc)
+        self._changed('mrc_added', mrc.url)
+
+    def _on_mrc_removed(self, mrc):
+        self._unwatch_mrc(mrc)
+        self._changed('mrc_removed', mrc.url)
+
+    def _watch_mrc(self, mrc):
+        def mrc_changed(*args):
+            self._changed('mrc', mrc.url)
+
+        def hardware_set(app_mrc, old, new):
+            if old is not None:
+                self._disconnect(old)
+            if new is not None:
+                for signal in (new.connected, new.connecting, new.disconnected,
+                        new.connection_error, new.write_access_changed, new.silenced_changed):
+                    self._connect(new, signal, mrc_changed)
+            mrc_changed()
+
+        def device_added(device):
+            self._watch_device(mrc, device)
+            self._changed('device_added', mrc.url, device.bus, device.address)
+
+        def device_removed(device):
+            self._unwatch_device(device)
+            self._changed('device_removed', mrc.url, device.bus, device.address)
+
+        self._connect(mrc, mrc.hardware_set, hardware_set)
+        self._connect(mrc, mrc.config_set, mrc_changed)
+        self._connect(mrc, mrc.device_added, device_added)
+        self._connect(mrc, mrc.device_about_to_be_removed, device_removed)
+
+        if mrc.hw is not None:
+            hardware_set(mrc, None, mrc.hw)
+
+        for device in mrc.get_devices():
+            self._watch_device(mrc, device)
+
+    def _unwatch_mrc(self, mrc):
+        for device in mrc.get_devices():
+            self._unwatch_device(device)
+        if mrc.hw is not None:
+            self._disconnect(mrc.hw)
+        self._disconnect(mrc)
+
+    def _watch_device(self, mrc, device):
+        def device_changed(*args):
+            self._changed('device', mrc.url, device.bus, device.address)
+
+        def hw_parameter_changed(address, value):
+            self._changed('parameter', mrc.url, device.bus, device.address, address, 'hw', value)
+
+        def cfg_parameter_changed(address, value):
+            self._changed('parameter', mrc.url, device.bus, device.address, address, 'cfg', value)
+
+        def hardware_set(app_device, old, new):
+            if old is not None:
+                self._disconnect(old)
+            if new is not None:
+                for signal in (new.rc_changed, new.address_conflict_changed, new.memory_cleared):
+                    self._connect(new, signal, device_changed)
+            device_changed()
+
+        self._connect(device, device.hardware_set, hardware_set)
+        self._connect(device, device.config_set, device_changed)
+        self._connect(device, device.config_applied_changed, device_changed)
+        self._connect(device, device.idc_changed, device_changed)
+        self._connect(device, device.module_changed, device_changed)
+        self._connect(device, device.cfg_memory_cleared, device_changed)
+        self._connect(device, device.hw_parameter_changed, hw_parameter_changed)
+        self._connect(device, device.cfg_parameter_changed, cfg_parameter_changed)
+
+        if device.hw is not None:
+            hardware_set(device, None, device.hw)
+
+    def _unwatch_device(self, device):
+        if device.hw is not None:
+            self._disconnect(device.hw)
+        self._disconnect(device)
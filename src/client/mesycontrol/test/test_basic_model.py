@@ -140,6 +140,28 @@ def test_add_device():
     assert mrc.get_device(0, 15) is d2
     assert mrc.get_device(1, 0) is d3
 
+def test_add_devices():
+    mrc = bm.BasicMrc("example.com")
+    d1  = bm.Device(1, 0, 13)
+    d2  = bm.Device(0, 15, 42)
+    d3  = bm.Device(0, 0, 42)
+
+    mrc.device_added = mock.MagicMock()
+
+    assert mrc.add_devices([d1, d2, d3])
+    assert mrc.get_devices() == [d3, d2, d1]
+    assert all(d.mrc is mrc for d in (d1, d2, d3))
+    assert mrc.device_added.emit.call_args_list == [
+            mock.call(d1), mock.call(d2), mock.call(d3)]
+    mrc.device_added.reset_mock()
+
+    # Duplicates within the new devices or with existing devices are rejected
+    # before any device is added.
+    assert_raises(ValueError, mrc.add_devices, [bm.Device(1, 1, 1), bm.Device(1, 1, 2)])
+    assert_raises(ValueError, mrc.add_devices, [bm.Device(1, 2, 1), bm.Device(0, 0, 2)])
+    assert len(mrc.get_devices()) == 3
+    assert not mrc.device_added.emit.called
+
 def test_remove_device():
     mrc = bm.BasicMrc("example.com")
     d1  = bm.Device(0, 0, 42)
@@ -268,3 +290,150 @@ def test_device():
         assert rr.value == i*i
         d1.parameter_changed.emit.assert_called_once_with(i, i*i)
         d1.parameter_changed.reset_mock()
+
+def test_clear_cached_memory():
+    d = bm.Device(0, 1, 42)
+
+    for i in range(256):
+        d.set_cached_parameter(i, i)
+
+    memory = d.get_cached_memory()
+
+    d.parameter_changed = mock.MagicMock()
+    d.memory_about_to_be_cleared = mock.MagicMock()
+    d.memory_cleared = mock.MagicMock()
+
+    assert d.clear_cached_memory()
+    assert len(d.get_cached_memory()) == 0
+    assert not d.has_cached_parameter(0)
+
+    # One bulk notification instead of one signal per address.
+    d.memory_about_to_be_cleared.emit.assert_called_once_with(memory)
+    d.memory_cleared.emit.assert_called_once_with()
+    assert d.parameter_changed.emit.call_count == 0
+
+    assert not d.clear_cached_memory()
+
+def test_set_cached_memory():
+    d = bm.Device(0, 1, 42)
+    d.set_cached_parameter(0, 1)
+
+    memory = d.get_cached_memory()
+    gen    = d.get_generation()
+
+    d.parameter_changed = mock.MagicMock()
+    d.memory_about_to_be_cleared = mock.MagicMock()
+    d.memory_cleared = mock.MagicMock()
+
+    assert d.set_cached_memory({1: 2, 2: '3'})
+    assert d.get_cached_memory() == {1: 2, 2: 3}
+    assert d.has_memory_changed_since(gen)
+    d.memory_about_to_be_cleared.emit.assert_called_once_with(memory)
+    d.memory_cleared.emit.assert_called_once_with()
+    assert d.parameter_changed.emit.call_count == 0
+
+    assert not d.set_cached_memory({1: 2, 2: 3})
+    assert_raises(ValueError, d.set_cached_memory, {256: 0})
+    assert d.get_cached_memory() == {1: 2, 2: 3}
+
+def test_memory_snapshot():
+    d = bm.Device(0, 1, 42)
+    d.set_cached_parameter(0, 1)
+    d.set_cached_parameter(1, 2)
+
+    snap = d.get_memory_snapshot()
+    gen  = d.get_generation()
+
+    assert snap.generation == gen
+    assert dict(snap) == {0: 1, 1: 2}
+    # Unchanged memory: the same snapshot is returned.
+    assert d.get_memory_snapshot() is snap
+    assert not d.has_memory_changed_since(gen)
+
+    # Setting an equal value is not a modification.
+    d.set_cached_parameter(0, 1)
+    assert not d.has_memory_changed_since(gen)
+
+    # Writes do not affect existing snapshots.
+    d.set_cached_parameter(0, 100)
+    d.clear_cached_parameter(1)
+    assert d.has_memory_changed_since(gen)
+    assert dict(snap) == {0: 1, 1: 2}
+    assert dict(d.get_memory_snapshot()) == {0: 100}
+    assert d.get_memory_snapshot().generation > gen
+
+    snap = d.get_memory_snapshot()
+    d.clear_cached_memory()
+    assert dict(snap) == {0: 100}
+    assert len(d.get_memory_snapshot()) == 0
+    assert d.get_memory_snapshot().generation > snap.generation
+
+def test_device_extensions():
+    d = bm.Device(0, 0, 42)
+    d.extension_changed = mock.MagicMock()
+
+    assert d.set_extension('jumpers', [1, 2, 3])
+    d.extension_changed.emit.assert_called_once_with('jumpers', [1, 2, 3])
+    d.extension_changed.reset_mock()
+
+    # Reads do not copy and the returned values are immutable.
+    jumpers = d.get_extension('jumpers')
+    assert jumpers is d.get_extension('jumpers')
+    assert jumpers == [1, 2, 3]
+    assert_raises(TypeError, jumpers.__setitem__, 0, 42)
+    assert_raises(TypeError, jumpers.append, 42)
+
+    # Setting an equal value is not a change.
+    assert not d.set_extension('jumpers', [1, 2, 3])
+    assert not d.set_extension('jumpers', jumpers)
+    assert d.extension_changed.emit.call_count == 0
+
+    # Copy-on-write
+    exts = d.get_extensions()
+    assert d.set_extension('jumpers', jumpers.set(0, 42))
+    assert d.get_extension('jumpers') == [42, 2, 3]
+    assert exts['jumpers'] == [1, 2, 3]
+    assert jumpers == [1, 2, 3]
+    assert d.get_extensions() is not exts
+
+    d2 = bm.Device(0, 1, 42)
+    for name, value in d.get_extensions().items():
+        d2.set_extension(name, value)
+
+    assert d2.get_extension('jumpers') is d.get_extension('jumpers')
+    assert d2.get_extensions() == d.get_extensions()
+
+    assert d.remove_extension('jumpers')
+    assert not d.has_extension('jumpers')
+    assert d2.has_extension('jumpers')
+
+def test_parameter_observers():
+    observers = bm.ParameterObservers()
+    calls     = list()
+
+    class Observer(object):
+        def on_change(self, address, value):
+            calls.append(('method', address, value))
+
+    def on_change(address, value):
+        calls.append(('func', address, value))
+
+    o = Observer()
+    observers.add(1, on_change)
+    observers.add(2, o.on_change)
+    assert len(observers) == 2
+
+    observers.notify(1, 42)
+    observers.notify(2, 43)
+    observers.notify(3, 44)
+    assert calls == [('func', 1, 42), ('method', 2, 43)]
+
+    # Bound methods are referenced weakly.
+    del o
+    observers.notify(2, 45)
+    assert len(calls) == 2
+    assert not observers.has_observers(2)
+
+    assert observers.remove(1, on_change)
+    assert not observers.remove(1, on_change)
+    assert len(observers) == 0
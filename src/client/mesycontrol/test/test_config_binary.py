@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import io
+
+from nose.tools import assert_raises
+
+from mesycontrol import config_binary
+from mesycontrol import config_model as cm
+from mesycontrol import config_xml as cxml
+from mesycontrol.scripts.convert_setup import convert_setup
+from mesycontrol.test.test_config_xml import expected2
+
+def make_setup():
+    setup = cm.Setup()
+    setup.autoconnect = False
+
+    mrc = cm.ConfigMrc(url='/dev/ttyUSB0')
+    mrc.name = 'the_mrc €'
+    mrc.autoconnect = False
+
+    d1 = cm.Device(bus=0, address=1, idc=17)
+    d1.name = 'd1'
+    for i in range(256):
+        d1.set_parameter(i, i * 100)
+
+    d2 = cm.Device(bus=1, address=15, idc=20)
+    d2.set_parameter(3, -1)
+    d2.set_parameter(200, 2**40)
+    d2.set_extension('ext', {'b': [1, -2**70, 2.5, 'x'], 'a': {'inner': ''}})
+    d2.set_extension('empty', [])
+
+    mrc.add_device(d1)
+    mrc.add_device(d2)
+    setup.add_mrc(mrc)
+    setup.add_mrc(cm.ConfigMrc(url='mc://localhost:23000'))
+
+    return setup
+
+def test_binary_round_trip():
+    setup = make_setup()
+    data  = config_binary.setup_to_bytes(setup)
+
+    loaded = config_binary.read_setup(io.BytesIO(data))
+
+    assert not loaded.modified
+    assert not loaded.autoconnect
+    assert config_binary.setup_to_bytes(loaded) == data
+
+    mrc = loaded.get_mrc('/dev/ttyUSB0')
+    assert mrc.name == 'the_mrc €'
+    assert not mrc.autoconnect
+    assert mrc.get_device(0, 1).get_cached_memory() == dict((i, i * 100) for i in range(256))
+
+    d2 = mrc.get_device(1, 15)
+    assert d2.get_cached_memory() == {3: -1, 200: 2**40}
+    assert d2.get_extension('ext') == {'b': [1, -2**70, 2.5, 'x'], 'a': {'inner': ''}}
+    assert d2.get_extension('empty') == []
+
+def test_xml_round_trip():
+    # XML -> binary -> XML yields the original document.
+    setup = cxml.read_setup(io.StringIO(expected2))
+    data  = config_binary.setup_to_bytes(setup)
+
+    idc_to_param_names = {1:{}, 2:{}}
+
+    for i in range(10):
+        idc_to_param_names[1][i] = 'idc=1, p=%i' % i
+        idc_to_param_names[2][i] = 'idc=2, p=%i' % i
+
+    dest = io.StringIO()
+    cxml.write_setup(config_binary.setup_from_bytes(data), dest, idc_to_param_names)
+    assert dest.getvalue() == expected2
+
+    # binary -> XML -> binary yields the original data.
+    setup = make_setup()
+    dest  = io.StringIO()
+    cxml.write_setup(setup, dest)
+    loaded = cxml.read_setup(io.StringIO(dest.getvalue()))
+    assert config_binary.setup_to_bytes(loaded) == config_binary.setup_to_bytes(setup)
+
+def test_invalid_data():
+    data = config_binary.setup_to_bytes(make_setup())
+
+    assert_raises(config_binary.FormatError, config_binary.setup_from_bytes, b'<?xml')
+    assert_raises(config_binary.FormatError, config_binary.setup_from_bytes, data[:-1])
+    assert_raises(config_binary.FormatError, config_binary.setup_from_bytes, data + b'\0')
+
+def test_convert_setup(tmp_path):
+    xml_file    = str(tmp_path / "setup.xml")
+    binary_file = str(tmp_path / "setup.mcsetup")
+    xml_file2   = str(tmp_path / "setup2.xml")
+
+    cxml.write_setup(make_setup(), xml_file)
+
+    convert_setup(xml_file, binary_file)
+    convert_setup(binary_file, xml_file2)
+
+    with open(binary_file, 'rb') as fp:
+        assert fp.read(len(config_binary.MAGIC)) == config_binary.MAGIC
+
+    assert cxml.read_setup(binary_file).filename == binary_file
+
+    with open(xml_file) as a, open(xml_file2) as b:
+        assert a.read() == b.read()
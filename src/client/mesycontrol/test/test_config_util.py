@@ -0,0 +1,537 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import time
+
+from .. import config_util
+from ..devices import mhv4_profile
+from .. import device_profile
+from .. import basic_model as bm
+from .. import future
+
+def make_mhv4_params():
+    profile       = device_profile.from_dict(mhv4_profile.profile_dict)
+    params        = profile.get_config_parameters()
+    criticals     = [pp for pp in params if pp.critical]
+    non_criticals = [pp for pp in params if not pp.critical]
+    return profile, criticals, non_criticals
+
+def test_plan_parameter_writes_full():
+    profile, criticals, non_criticals = make_mhv4_params()
+    values = dict((pp.address, 1) for pp in criticals + non_criticals)
+
+    safe, writes, crit = config_util.plan_parameter_writes(criticals, non_criticals, values)
+
+    assert len(safe) == len(criticals)
+    assert len(writes) == len(non_criticals)
+    assert len(crit) == len(criticals)
+
+def test_plan_parameter_writes_minimal():
+    profile, criticals, non_criticals = make_mhv4_params()
+    values = dict((pp.address, 1) for pp in criticals + non_criticals)
+
+    # Nothing differs: nothing is written.
+    plan = config_util.plan_parameter_writes(criticals, non_criticals, values, dict(values))
+    assert plan == ([], [], [])
+
+    # A dependent of channel 1 changes: only channel 1 is cycled through its
+    # safe value.
+    dest_values = dict(values)
+    voltage1    = profile['channel1_voltage_write'].address
+    enable1     = profile['channel1_enable_write'].address
+    dest_values[voltage1] = 0
+
+    safe, writes, crit = config_util.plan_parameter_writes(
+            criticals, non_criticals, values, dest_values)
+
+    assert safe   == [(enable1, profile[enable1].safe_value)]
+    assert writes == [(voltage1, 1)]
+    assert crit   == [(enable1, 1)]
+
+    # Only a critical parameter changes: written once without cycling.
+    dest_values = dict(values)
+    dest_values[enable1] = 0
+
+    plan = config_util.plan_parameter_writes(criticals, non_criticals, values, dest_values)
+    assert plan == ([], [], [(enable1, 1)])
+
+    # Unknown destination values are written.
+    dest_values = dict(values)
+    del dest_values[voltage1]
+
+    safe, writes, crit = config_util.plan_parameter_writes(
+            criticals, non_criticals, values, dest_values)
+    assert writes == [(voltage1, 1)]
+
+def test_run_generators_concurrently():
+    futures = dict(a=future.Future(), b=future.Future())
+    trace   = list()
+
+    def pipeline(name):
+        f = yield futures[name]
+        trace.append((name, f.result()))
+        answer = yield "question %s" % name
+        trace.append((name, answer))
+
+    gen = config_util.run_generators_concurrently([pipeline('a'), pipeline('b')])
+
+    # Both pipelines are waiting: a single combined future is yielded.
+    waiter = gen.send(None)
+    assert isinstance(waiter, future.Future)
+    assert not waiter.done()
+
+    futures['b'].set_result(2)
+    assert waiter.done()
+
+    # The question is sent back to the pipeline that asked it.
+    assert gen.send(waiter) == "question b"
+    waiter = gen.send("answer b")
+    assert not waiter.done()
+
+    futures['a'].set_result(1)
+    assert gen.send(waiter) == "question a"
+
+    try:
+        gen.send("answer a")
+        assert False
+    except StopIteration:
+        pass
+
+    assert trace == [('b', 2), ('b', 'answer b'), ('a', 1), ('a', 'answer a')]
+
+def test_semaphore_limits_concurrent_slots():
+    slots = future.Semaphore(2)
+    a, b, c = slots.acquire(), slots.acquire(), slots.acquire()
+
+    assert a.done() and b.done()
+    assert not c.done()
+
+    slots.release()
+    assert c.done()
+    assert slots.active == 2
+
+    # Cancelled waiters are skipped.
+    d, e = slots.acquire(), slots.acquire()
+    d.cancel()
+    slots.release()
+    assert e.done()
+
+    slots.release()
+    slots.release()
+    assert slots.active == 0
+
+def test_generator_runner_bounds_completed_batches():
+    from ..qt import QtCore
+
+    app   = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    steps = list()
+
+    def gen():
+        for i in range(10):
+            yield [future.Future().set_result(i)]
+            steps.append(i)
+
+    runner = config_util.GeneratorRunner(gen())
+    runner.max_immediate_steps = 3
+    runner.arg    = None
+    runner.result = future.Future()
+
+    # Completed batches count against max_immediate_steps. The next step is
+    # queued once the limit is reached.
+    runner._next()
+    assert steps == [0, 1, 2]
+
+    deadline = time.monotonic() + 5.0
+    while not runner.result.done() and time.monotonic() < deadline:
+        app.processEvents()
+
+    assert runner.result.result() is True
+    assert steps == list(range(10))
+
+class FakeMrc(object):
+    def get_display_url(self):
+        return "fake"
+
+class FakeMirrorDevice(object):
+    def __init__(self, values, mirror):
+        self.mrc    = FakeMrc()
+        self.bus    = 0
+        self.address = 1
+        self.idc    = 27
+        self.values = dict(values)
+        self.mirror = dict(mirror)
+        self.copies = 0
+        self.mirror_writes = list()
+        self.ops    = list()
+
+    def get_parameter(self, address):
+        return future.Future().set_result(bm.ReadResult(0, 1, address, self.values[address]))
+
+    def read_mirror_parameter(self, address):
+        return future.Future().set_result(bm.ReadResult(0, 1, address, self.mirror.get(address, 0)))
+
+    def set_mirror_parameter(self, address, value):
+        self.mirror_writes.append(address)
+        self.mirror[address] = value
+        return future.Future().set_result(bm.SetResult(0, 1, address, value, value))
+
+    def set_parameter(self, address, value):
+        self.ops.append(('set', address, value))
+        self.values[address] = value
+        return future.Future().set_result(bm.SetResult(0, 1, address, value, value))
+
+    def copy_mirror(self):
+        self.copies += 1
+        self.ops.append(('copy', ))
+        self.values.update(self.mirror)
+        return future.Future().set_result(True)
+
+    def set_cached_parameter(self, address, value):
+        self.values[address] = value
+
+def run_generator(gen, answer=None):
+    arg = None
+    yielded = list()
+    try:
+        while True:
+            obj = gen.send(arg)
+            yielded.append(obj)
+            if isinstance(obj, (future.Future, list)):
+                arg = obj
+            elif isinstance(obj, config_util.ProgressUpdate):
+                arg = None
+            else:
+                arg = answer
+    except StopIteration:
+        pass
+    return yielded
+
+def test_apply_parameters_staged():
+    profile, criticals, non_criticals = make_mhv4_params()
+    params = non_criticals + criticals
+    source = FakeMirrorDevice(dict((pp.address, pp.address + 1) for pp in params), {})
+    mirror = dict((pp.address, pp.address + 1) for pp in non_criticals)
+    mirror.update((pp.address, pp.safe_value) for pp in criticals)
+    mirror[params[0].address] = 0
+    dest   = FakeMirrorDevice(dict((pp.address, 0) for pp in params), mirror)
+    stats  = config_util.ApplyStats()
+
+    run_generator(config_util.apply_parameters_staged(source, dest, params, stats))
+
+    # Only the differing value is written to the mirror, then activated once.
+    assert dest.mirror_writes == [params[0].address]
+    assert dest.copies == 1
+    assert stats.written == 1 + 2 * len(criticals)
+    assert all(dest.values[pp.address] == pp.address + 1 for pp in params)
+
+def test_apply_parameters_staged_critical_ordering():
+    profile, criticals, non_criticals = make_mhv4_params()
+    params = non_criticals + criticals
+    source = FakeMirrorDevice(dict((pp.address, pp.address + 1) for pp in params), {})
+    dest   = FakeMirrorDevice(dict((pp.address, 0) for pp in params), {})
+
+    run_generator(config_util.apply_parameters_staged(source, dest, params))
+
+    # Critical parameters only reach the mirror with their safe values.
+    assert all(dest.mirror.get(pp.address, 0) == pp.safe_value for pp in criticals)
+
+    copy_idx = dest.ops.index(('copy', ))
+    assert (sorted(dest.ops[:copy_idx]) ==
+            sorted(('set', pp.address, pp.safe_value) for pp in criticals))
+    assert (sorted(dest.ops[copy_idx+1:]) ==
+            sorted(('set', pp.address, pp.address + 1) for pp in criticals))
+    assert all(dest.values[pp.address] == pp.address + 1 for pp in params)
+
+def test_apply_parameters_staged_verify_failure_does_not_copy():
+    profile, criticals, non_criticals = make_mhv4_params()
+    params = non_criticals + criticals
+    source = FakeMirrorDevice(dict((pp.address, 1) for pp in params), {})
+    dest   = FakeMirrorDevice(dict((pp.address, 0) for pp in params), {})
+    # The mirror ignores writes.
+    dest.set_mirror_parameter = lambda a, v: future.Future().set_result(bm.SetResult(0, 1, a, 0, v))
+
+    yielded = run_generator(config_util.apply_parameters_staged(source, dest, params),
+            answer=config_util.ACTION_SKIP)
+
+    assert any(isinstance(o, config_util.MirrorVerifyError) for o in yielded)
+    assert dest.copies == 0
+
+def test_apply_parameters_staged_skips_missing_source_values():
+    profile, criticals, non_criticals = make_mhv4_params()
+    params  = non_criticals + criticals
+    missing = params[0].address
+    source  = FakeMirrorDevice(dict((pp.address, 1) for pp in params[1:]), {})
+    dest    = FakeMirrorDevice(dict((pp.address, 0) for pp in params), {})
+
+    # Like a config device without a value for the address.
+    def get_parameter(address):
+        if address not in source.values:
+            return future.Future().set_exception(KeyError(address))
+        return future.Future().set_result(bm.ReadResult(0, 1, address, source.values[address]))
+
+    source.get_parameter = get_parameter
+
+    yielded = run_generator(config_util.apply_parameters_staged(source, dest, params),
+            answer=config_util.ACTION_SKIP)
+
+    assert any(isinstance(o, KeyError) for o in yielded)
+    assert missing not in dest.mirror_writes
+    assert dest.copies == 1
+    assert dest.values[missing] == 0
+    assert all(dest.values[pp.address] == 1 for pp in params[1:])
+
+class FakeHardwareDevice(FakeMirrorDevice):
+    def __init__(self, values, cached, polled):
+        super(FakeHardwareDevice, self).__init__(values, {})
+        self.cached = dict(cached)
+        self.polled = set(polled)
+        self.reads  = list()
+
+    def has_cached_parameter(self, address):
+        return address in self.cached
+
+    def get_cached_parameter(self, address):
+        return self.cached[address]
+
+    def is_parameter_polled(self, address):
+        return address in self.polled
+
+    def read_multi(self, address, count):
+        self.reads.append((address, count))
+        return future.Future().set_result([bm.ReadResult(0, 1, a, self.values.get(a, 0))
+            for a in range(address, address + count)])
+
+def test_read_destination_values_rereads_unpolled():
+    dest   = FakeHardwareDevice({1: 10, 2: 20, 3: 30, 100: 1000},
+            {1: 0, 2: 0, 3: 0, 100: 0}, polled=[1])
+    values = dict()
+    stats  = config_util.ApplyStats()
+
+    yielded = run_generator(config_util.read_destination_values(
+        dest, [1, 2, 3, 100], values, stats))
+
+    # Only polled values are taken from the cache. The reads of all ranges
+    # are queued at once.
+    assert values == {1: 0, 2: 20, 3: 30, 100: 1000}
+    assert dest.reads == [(2, 2), (100, 1)]
+    assert len(yielded) == 1 and len(yielded[0]) == 2
+    assert stats.read == 3
+
+def test_write_parameter_values_counts_matching_writes():
+    profile, criticals, non_criticals = make_mhv4_params()
+    params = non_criticals[:2]
+    values = dict((pp.address, 5) for pp in params)
+    dest   = FakeMirrorDevice(dict((pp.address, 0) for pp in params), {})
+    stats  = config_util.ApplyStats()
+
+    # The device limits the value of the first parameter.
+    def set_parameter(address, value):
+        if address == params[0].address:
+            value = 3
+        return future.Future().set_result(bm.SetResult(0, 1, address, value, 5))
+
+    dest.set_parameter = set_parameter
+
+    run_generator(config_util.write_parameter_values(dest, [], params, values, stats=stats),
+            answer=config_util.ACTION_SKIP)
+
+    assert stats.planned == 2
+    assert stats.written == 1
+
+def test_run_callables_generator_batches():
+    issued = list()
+
+    def make_callable(i):
+        def c():
+            issued.append(i)
+            return future.Future().set_result(bm.ReadResult(0, 0, i, i))
+        return c
+
+    gen     = config_util.run_callables_generator(
+            [make_callable(i) for i in range(5)], batch_size=2)
+    yielded = run_generator(gen)
+
+    batches = [o for o in yielded if isinstance(o, list)]
+    singles = [o for o in yielded if isinstance(o, future.Future)]
+
+    # Two full batches, the remaining callable is invoked on its own.
+    assert [len(b) for b in batches] == [2, 2]
+    assert [f.result().value for f in singles] == list(range(5))
+    assert issued == list(range(5))
+
+def test_run_generators_concurrently_batches():
+    futures = [future.Future(), future.Future()]
+    trace   = list()
+
+    def pipeline():
+        fs = yield futures
+        trace.append([f.result() for f in fs])
+
+    gen    = config_util.run_generators_concurrently([pipeline()])
+    waiter = gen.send(None)
+    futures[1].set_result(2)
+    assert not waiter.done()
+    futures[0].set_result(1)
+    assert waiter.done()
+
+    try:
+        gen.send(waiter)
+        assert False
+    except StopIteration:
+        pass
+
+    assert trace == [[1, 2]]
+
+def test_run_generators_concurrently_callbacks():
+    slow  = future.Future()
+    steps = [future.Future() for i in range(10)]
+
+    def slow_pipeline():
+        yield slow
+
+    def fast_pipeline():
+        for f in steps:
+            yield f
+
+    gen    = config_util.run_generators_concurrently([slow_pipeline(), fast_pipeline()])
+    waiter = gen.send(None)
+
+    # Each wakeup caused by the fast pipeline must not add another callback
+    # to the still pending slow future.
+    for f in steps:
+        f.set_result(True)
+        assert waiter.done()
+        waiter = gen.send(waiter)
+
+    assert len(slow._callbacks) == 1
+
+    slow.set_result(True)
+
+    try:
+        gen.send(waiter)
+        assert False
+    except StopIteration:
+        pass
+
+def test_run_pipelines_combines_progress():
+    futures = dict(a=future.Future(), b=future.Future())
+
+    def pipeline(name, progress):
+        progress.text = "MRC %s" % name
+        progress.subprogress = config_util.ProgressUpdate(current=1, total=4, text="dev " + name)
+        yield progress
+        yield futures[name]
+        progress.subprogress = config_util.ProgressUpdate(current=4, total=4, text="dev " + name)
+        yield progress.increment()
+
+    progress  = config_util.ProgressUpdate(current=0, total=2)
+    pipelines = list()
+
+    for name in ('a', 'b'):
+        p = config_util.ProgressUpdate(current=0, total=1)
+        pipelines.append((pipeline(name, p), p))
+
+    gen = config_util.run_pipelines(progress, pipelines)
+    assert gen.send(None) is progress
+    assert gen.send(None) is progress
+
+    # Both pipelines are running: the first one is shown, sub progress is
+    # summed.
+    assert progress.text == "MRC a (+1 more)"
+    assert (progress.subprogress.current, progress.subprogress.total) == (2, 8)
+    assert progress.subprogress.text == "dev a (+1 more)"
+
+    obj = gen.send(None)
+    futures['a'].set_result(True)
+    assert obj.done()
+    updates = list()
+    arg = obj
+
+    try:
+        while True:
+            obj = gen.send(arg)
+            arg = None
+
+            if isinstance(obj, config_util.ProgressUpdate):
+                updates.append((obj.current, obj.text, obj.subprogress.text))
+            elif not obj.done():
+                futures['b'].set_result(True)
+                arg = obj
+            else:
+                arg = obj
+    except StopIteration:
+        pass
+
+    # Once a has finished only b is shown.
+    assert (1, "MRC b", "dev b") in updates
+    assert updates[-1][0] == 2
+
+class FakeHwDevice(object):
+    def __init__(self, memory):
+        self.mrc    = FakeMrc()
+        self.bus    = 0
+        self.address = 1
+        self.memory = dict(memory)
+        self.writes = list()
+
+    def has_cached_parameter(self, address):
+        return address in self.memory
+
+    def get_cached_parameter(self, address):
+        return self.memory.get(address)
+
+    def get_parameter(self, address):
+        return future.Future().set_result(bm.ReadResult(0, 1, address, self.memory[address]))
+
+    def set_parameter(self, address, value):
+        self.writes.append((address, value))
+        self.memory[address] = value
+        return future.Future().set_result(bm.SetResult(0, 1, address, value, value))
+
+def test_rollback_restores_touched_registers():
+    profile, criticals, non_criticals = make_mhv4_params()
+    params   = criticals + non_criticals
+    original = dict((pp.address, 1) for pp in params)
+    dest     = FakeHwDevice(original)
+    values   = dict((pp.address, 2) for pp in params)
+    journal  = config_util.ApplyJournal()
+
+    # Interrupt the apply after a few writes.
+    gen = config_util.write_parameter_values(dest, criticals, non_criticals, values,
+            journal=journal)
+    arg = None
+    while len(dest.writes) < 5:
+        obj = gen.send(arg)
+        arg = obj if isinstance(obj, (future.Future, list)) else None
+    gen.close()
+
+    assert len(journal) == 5
+    assert dest.memory != original
+
+    dest.writes = list()
+    run_generator(config_util.rollback_apply(journal))
+
+    assert dest.memory == original
+    # Only registers touched by the apply are restored.
+    assert set(a for a, v in dest.writes).issubset(set(a for a in values))
+    assert len(journal) == 0
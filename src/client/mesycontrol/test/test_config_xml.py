@@ -270,6 +270,7 @@ def test_value2xml_string_types():
             "Hello World!",
             u"Hello Unicode World!",
             u"Hello unicode €uro World!",
+            "",
             ]
 
     for txt in l:
@@ -284,3 +285,100 @@ def test_value2xml_string_types():
         #print(type(txt), type(value))
 
         assert txt == value
+
+def test_serializer_matches_minidom():
+    from xml.dom import minidom
+
+    device = cm.Device(bus=0, address=3, idc=17)
+    device.name = 'a "quoted" <name> & more €'
+    device.description = ''
+
+    for i in range(4):
+        device.set_parameter(i, i)
+
+    device.set_extension('ext_list', [1, 2.5, 'three', ['nested']])
+    device.set_extension('ext_dict', {'b': 'x>y', 'a': {'inner': 1}})
+    device.set_extension('ext_empty', '')
+
+    tb = cxml.CommentTreeBuilder()
+    tb.start('mesycontrol', {'version': '1'})
+    cxml._build_device_tree(device, {0: 'first -> param', 2: 'third'}, tb)
+    tb.end('mesycontrol')
+    tree = ET.ElementTree(tb.close())
+
+    reference = minidom.parseString(ET.tostring(tree.getroot())).toprettyxml(indent='  ')
+
+    assert cxml._xml_tree_to_string(tree) == reference
+
+def test_write_setup_to_file_is_atomic(tmp_path):
+    import os
+
+    setup = cm.Setup()
+    mrc   = cm.ConfigMrc(url='/dev/ttyUSB0')
+    mrc.add_device(cm.Device(bus=0, address=1, idc=17))
+    setup.add_mrc(mrc)
+
+    filename = str(tmp_path / "setup.xml")
+
+    with open(filename, 'w') as fp:
+        fp.write("old contents")
+
+    cxml.write_setup(setup, filename)
+
+    # No temporary files are left behind.
+    assert os.listdir(str(tmp_path)) == ["setup.xml"]
+    assert cxml.read_setup(filename).get_mrc('/dev/ttyUSB0').get_device(0, 1).idc == 17
+
+def test_read_setup_streaming():
+    setup = cm.Setup()
+    mrc   = cm.ConfigMrc(url='/dev/ttyUSB0')
+    mrc.autoconnect = False
+
+    device = cm.Device(bus=1, address=3, idc=17)
+    device.name = 'dev'
+    device.set_parameter(0, 42)
+    device.set_extension('ext', {'a': [1, 2.5, 'three']})
+    device.set_extension('empty', '')
+    mrc.add_device(device)
+    mrc.add_device(cm.Device(bus=0, address=2, idc=20))
+
+    setup.add_mrc(mrc)
+    setup.add_mrc(cm.ConfigMrc(url='mc://localhost:23000'))
+    setup.autoconnect = False
+
+    dest = io.StringIO()
+    cxml.write_setup(setup, dest)
+
+    loaded = cxml.read_setup(io.StringIO(dest.getvalue()))
+
+    assert not loaded.modified
+    assert not loaded.autoconnect
+    assert [m.url for m in loaded] == ['/dev/ttyUSB0', 'mc://localhost:23000']
+
+    mrc = loaded.get_mrc('/dev/ttyUSB0')
+    assert not mrc.autoconnect
+    assert [(d.bus, d.address) for d in mrc] == [(0, 2), (1, 3)]
+
+    device = mrc.get_device(1, 3)
+    assert device.name == 'dev'
+    assert device.get_cached_memory() == {0: 42}
+    assert device.get_extension('ext') == {'a': [1, 2.5, 'three']}
+    assert device.get_extension('empty') == ''
+    assert not device.modified
+
+    # Writing the loaded setup yields the original document.
+    dest2 = io.StringIO()
+    cxml.write_setup(loaded, dest2)
+    assert dest2.getvalue() == dest.getvalue()
+
+    # Modifications after loading propagate to the setup.
+    device.set_parameter(0, 43)
+    assert loaded.modified
+
+def test_read_setup_errors():
+    from nose.tools import assert_raises
+
+    assert_raises(ValueError, cxml.read_setup, io.StringIO('<foo><setup/></foo>'))
+    assert_raises(ValueError, cxml.read_setup, io.StringIO('<mesycontrol version="1"/>'))
+    # A device config file does not contain a setup.
+    assert_raises(ValueError, cxml.read_setup, io.StringIO(expected))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import json
+import os
+import socket
+import tempfile
+
+from .. import fleet
+
+SCRIPT = """
+print("script loaded")
+
+def main(ctx, mrc, args):
+    return args
+"""
+
+def get_unused_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def test_unreachable_mrcs():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        script_file = os.path.join(tmpdir, 'script.py')
+        json_file   = os.path.join(tmpdir, 'results.json')
+
+        with open(script_file, 'w') as f:
+            f.write(SCRIPT)
+
+        urls = ['mc://127.0.0.1:%d' % get_unused_port() for i in range(3)]
+        argv = ['-j', '2', '--quiet', '--json', json_file]
+        for url in urls:
+            argv += ['--mrc', url]
+        argv += [script_file, 'a', '--b']
+
+        assert fleet.fleet_runner_main(argv) == 1
+
+        with open(json_file) as f:
+            results = json.load(f)
+
+        assert [r['url'] for r in results] == urls
+
+        for r in results:
+            assert not r['ok'] and r['result'] is None
+            assert 'Connection refused' in r['error']
+            assert 'script loaded' in r['output']
+            assert r['duration'] > 0.0
+
+        summary = fleet.format_summary([fleet.FleetResult(**r) for r in results]
+                + [fleet.FleetResult('mc://ok', True, ['a', '--b'], None, '', 0.5)])
+        assert summary.splitlines()[-1] == '4 MRCs, 1 succeeded, 3 failed'
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import subprocess
+import sys
+
+GUI_MODULES = (
+    'PySide2.QtWidgets',
+    'PySide2.QtGui',
+    'pyqtgraph',
+    'mesycontrol.resources',
+    'mesycontrol.specialized_device',
+    'mesycontrol.parameter_binding',
+    'mesycontrol.devices.mhv4',
+    )
+
+# Runs in a fresh interpreter as other tests may already have imported the
+# GUI modules.
+SCRIPT = """
+import sys
+from mesycontrol.script import get_script_context
+with get_script_context() as ctx:
+    assert ctx.get_device_profile(27).idc == 27
+    print(' '.join(sorted(sys.modules)))
+    print(ctx.appContext.device_registry.get_device_class(27).__name__)
+"""
+
+def test_script_context_is_headless():
+    result = subprocess.run([sys.executable, '-c', SCRIPT], stdout=subprocess.PIPE,
+            universal_newlines=True, check=True)
+    loaded_modules, device_class = result.stdout.splitlines()[-2:]
+    loaded_modules = loaded_modules.split()
+
+    for name in GUI_MODULES:
+        assert name not in loaded_modules
+
+    # The device module is imported on first access of the device class.
+    assert device_class == 'MHV4'
+
+def test_util_forwards_widget_helpers():
+    from .. import util
+    from .. import widget_util
+
+    assert util.make_spinbox is widget_util.make_spinbox
+    assert util.DelayedSpinBox is widget_util.DelayedSpinBox
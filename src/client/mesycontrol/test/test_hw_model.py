@@ -22,7 +22,12 @@ __author__ = 'Florian Lüke'
 __email__  = 'f.lueke@mesytec.com'
 
 from nose.tools import assert_raises
+from .. import future
+from .. import hardware_controller
 from .. import hardware_model as hm
+from .. import mrc_connection
+from .. import proto
+from .. import tcp_client
 
 #def test_set_scanbus_data_creates_devices():
 #    scanbus_data = [(0, 0) for i in range(16)]
@@ -81,3 +86,116 @@ def test_add_duplicate_device_raises():
 #
 #    assert not mrc.has_device(0, 0)
 #    assert device.mrc is None
+
+class FakeConnection(mrc_connection.AbstractMrcConnection):
+    def __init__(self):
+        super(FakeConnection, self).__init__()
+        self.requests = list()
+
+    def get_url(self):
+        return "mc://localhost:23000"
+
+    def is_connected(self):
+        return True
+
+    def is_connecting(self):
+        return False
+
+    def is_disconnected(self):
+        return False
+
+    def queue_request(self, msg):
+        ret = future.Future()
+        self.requests.append((msg, ret))
+        return ret
+
+    def get_queue_size(self):
+        return 0
+
+def make_scanbus_response(bus, conflict_addr=None, msg_type=proto.Message.RESP_SCANBUS):
+    m = proto.Message()
+    m.type = msg_type
+    m.scanbus_result.bus = bus
+
+    for addr in range(16):
+        entry = m.scanbus_result.entries.add()
+        entry.conflict = (addr == conflict_addr)
+
+    return m
+
+def test_scanbus_cached():
+    connection = FakeConnection()
+    controller = hardware_controller.Controller(connection)
+    mrc        = hm.HardwareMrc(connection.url)
+    mrc.set_controller(controller)
+
+    def respond(conflict_addr=None):
+        msg, f = connection.requests[-1]
+        f.set_result(tcp_client.RequestResult(msg, make_scanbus_response(
+            msg.request_scanbus.bus, conflict_addr)))
+
+    # Pending and fresh scans are reused.
+    f = mrc.scanbus_cached(0)
+    assert mrc.scanbus_cached(0) is f
+    respond()
+    assert mrc.scanbus_cached(0) is f
+    assert len(connection.requests) == 1
+
+    # Expired results are not.
+    assert mrc.scanbus_cached(0, max_age_ms=-1) is not f
+    respond()
+    assert len(connection.requests) == 2
+
+    # Notifications invalidate the cache.
+    f = mrc.scanbus_cached(0)
+    connection.notification_received.emit(
+            make_scanbus_response(0, msg_type=proto.Message.NOTIFY_SCANBUS))
+    assert mrc.scanbus_cached(0) is not f
+    respond()
+    assert len(connection.requests) == 3
+
+    # RC changes invalidate the cache.
+    f = mrc.scanbus_cached(0)
+    controller.set_rc(0, 1, True)
+    assert mrc.scanbus_cached(0) is not f
+    respond()
+
+    # Results with address conflicts are not cached.
+    n = len(connection.requests)
+    mrc.scanbus_cached(1)
+    respond(conflict_addr=3)
+    mrc.scanbus_cached(1)
+    assert len(connection.requests) == n + 2
+
+def test_read_multi_cancel():
+    connection = FakeConnection()
+    controller = hardware_controller.Controller(connection)
+
+    # Single read fallback: the queued reads are cancelled with the result.
+    f = controller.read_multi(0, 1, 10, 3)
+    f.cancel()
+    assert len(connection.requests) == 3
+    assert all(rf.cancelled() for msg, rf in connection.requests)
+
+    # Read multi request: a late response is ignored.
+    controller.has_read_multi = lambda: True
+    f = controller.read_multi(0, 1, 10, 3)
+    msg, rf = connection.requests[-1]
+    f.cancel()
+    assert rf.cancelled()
+
+def test_is_polled():
+    connection = FakeConnection()
+    controller = hardware_controller.Controller(connection)
+    subscriber = hm.Device(0, 1, 17)
+
+    controller.add_poll_item(subscriber, 0, 1, 5)
+    controller.add_poll_item(subscriber, 0, 1, (10, 12))
+
+    assert controller.is_polled(0, 1, 5)
+    assert controller.is_polled(0, 1, 11)
+    assert not controller.is_polled(0, 1, 6)
+    assert not controller.is_polled(1, 1, 5)
+
+    controller.remove_polling_subscriber(subscriber)
+    assert not controller.is_polled(0, 1, 5)
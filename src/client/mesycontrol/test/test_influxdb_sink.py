@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+from .. import device_profile
+from .. import monitor
+from ..scripts import influxdb_sink
+from .test_monitor import profile_dict
+
+class FakeInfluxDB(object):
+    """Local HTTP stand-in for the InfluxDB v2 write endpoint. Records the
+    received lines. Answers 503 while available is False. Each request is
+    delayed by delay seconds. max_requests limits the number of successful
+    requests."""
+    def __init__(self):
+        self.lines     = list()
+        self.requests  = list()
+        self.available = True
+        self.delay     = 0.0
+        self.max_requests = None
+
+        db = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+                db.requests.append((self.path, self.headers.get('Authorization')))
+                time.sleep(db.delay)
+
+                if db.max_requests is not None:
+                    db.available = db.max_requests > 0
+                    db.max_requests -= 1
+
+                if db.available:
+                    db.lines.extend(l for l in data.split('\n') if l)
+                    self.send_response(204)
+                else:
+                    self.send_response(503)
+
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        self.url    = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def wait_until(pred, timeout=5.0):
+    t_end = time.monotonic() + timeout
+    while not pred():
+        if time.monotonic() > t_end:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_format_line():
+    line = influxdb_sink.format_line('m m', {'url': 'mc://a b,c', 'bus': 0, 'empty': ''},
+            {'v_raw': 42, 'v_unit_value': 1.5, 'v_unit': 'µ"A'}, 123)
+
+    assert line == 'm\\ m,bus=0,url=mc://a\\ b\\,c v_raw=42i,v_unit="µ\\"A",v_unit_value=1.5 123'
+
+def test_batching():
+    db   = FakeInfluxDB()
+    sink = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket', token='secret',
+            max_batch_points=10, flush_interval=60.0)
+
+    try:
+        for i in range(25):
+            sink.write_point({'dev': 1}, {'v': i}, timestamp=i)
+
+        # Two full batches are sent right away, the rest waits for the flush
+        # interval or close().
+        assert wait_until(lambda: len(db.lines) == 20)
+        assert sink.get_metrics()['queue_points'] == 5
+        assert sink.get_metrics()['lag_seconds'] > 0.0
+
+        sink.close()
+
+        assert len(db.lines) == 25
+        assert db.lines[3] == 'mesyflux_auto_poll,dev=1 v=3i 3000000000'
+        assert len(db.requests) == 3
+
+        path, auth = db.requests[0]
+        assert path.startswith('/api/v2/write?')
+        assert 'bucket=bucket' in path and 'org=org' in path and 'precision=ns' in path
+        assert auth == 'Token secret'
+
+        metrics = sink.get_metrics()
+        assert metrics['points_received'] == 25
+        assert metrics['points_written'] == 25
+        assert metrics['batches_written'] == 3
+        assert metrics['write_errors'] == 0
+    finally:
+        sink.close()
+        db.shutdown()
+
+def test_spool_and_replay():
+    db = FakeInfluxDB()
+    db.available = False
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spool = os.path.join(tmpdir, 'influx.spool')
+        sink  = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket', spool_filename=spool,
+                max_batch_points=4, flush_interval=0.01, retry_interval=0.05)
+
+        try:
+            for i in range(8):
+                sink.write_point({}, {'v': i}, timestamp=i)
+
+            assert wait_until(lambda: sink.get_metrics()['points_spooled'] == 8)
+            assert sink.get_metrics()['db_down']
+            assert sink.get_metrics()['write_errors'] >= 1
+            assert os.path.getsize(spool) > 0
+            assert len(db.lines) == 0
+
+            db.available = True
+
+            # The spool is replayed once the retry interval passed.
+            assert wait_until(lambda: sink.get_metrics()['points_replayed'] == 8)
+            assert sorted(db.lines) == sorted('mesyflux_auto_poll v=%di %d' % (i, i * 10**9)
+                    for i in range(8))
+            assert sink.get_metrics()['spool_bytes'] == 0
+            assert not os.path.exists(spool + '.replay')
+            assert not sink.get_metrics()['db_down']
+        finally:
+            sink.close()
+            db.shutdown()
+
+def write_spool(filename, n):
+    with open(filename, 'w') as fp:
+        for i in range(n):
+            fp.write('m v=%di %d\n' % (i, i))
+
+def test_replay_does_not_block_producers():
+    db = FakeInfluxDB()
+    db.delay = 0.2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spool = os.path.join(tmpdir, 'influx.spool')
+        write_spool(spool, 20)
+
+        sink = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket', spool_filename=spool,
+                max_batch_points=4, flush_interval=60.0, max_queue_points=2)
+
+        try:
+            # Wait for the replay of the five batches to start.
+            assert wait_until(lambda: os.path.exists(spool + '.replay'))
+
+            # The queue overflows into the fresh spool without waiting for
+            # the replay.
+            t_start = time.monotonic()
+            sink.write_lines(['n v=%di %d' % (i, i) for i in range(5)])
+            assert time.monotonic() - t_start < 0.1
+            assert sink.get_metrics()['points_spooled'] == 3
+
+            assert wait_until(lambda: sink.get_metrics()['points_replayed'] == 23)
+        finally:
+            sink.close()
+            db.shutdown()
+
+        assert sorted(db.lines) == sorted(['m v=%di %d' % (i, i) for i in range(20)]
+                + ['n v=%di %d' % (i, i) for i in range(5)])
+
+def test_partial_replay_is_resumed():
+    db = FakeInfluxDB()
+    db.max_requests = 2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spool = os.path.join(tmpdir, 'influx.spool')
+        write_spool(spool, 10)
+
+        sink = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket', spool_filename=spool,
+                max_batch_points=3, flush_interval=60.0, retry_interval=0.05)
+
+        try:
+            # Two batches are written, the third one fails.
+            assert wait_until(lambda: sink.get_metrics()['write_errors'] == 1)
+            assert sink.get_metrics()['points_replayed'] == 6
+            assert os.path.exists(spool + '.replay')
+
+            db.max_requests = None
+            db.available    = True
+
+            # The replay continues after the written batches.
+            assert wait_until(lambda: sink.get_metrics()['points_replayed'] == 10)
+            assert not os.path.exists(spool + '.replay')
+        finally:
+            sink.close()
+            db.shutdown()
+
+        assert sorted(db.lines) == sorted('m v=%di %d' % (i, i) for i in range(10))
+
+def test_replay_survives_spool_file_errors():
+    db = FakeInfluxDB()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spool = os.path.join(tmpdir, 'influx.spool')
+        write_spool(spool, 4)
+        # The replay file cannot be opened.
+        os.mkdir(spool + '.replay')
+
+        sink = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket', spool_filename=spool,
+                max_batch_points=4, flush_interval=0.01, retry_interval=0.05)
+
+        try:
+            assert wait_until(lambda: sink.get_metrics()['write_errors'] >= 1)
+            assert sink._thread.is_alive()
+
+            # The writer keeps working and retries the replay.
+            sink.write_point({}, {'v': 1}, timestamp=1)
+            assert wait_until(lambda: sink.get_metrics()['points_written'] == 1)
+
+            os.rmdir(spool + '.replay')
+            assert wait_until(lambda: sink.get_metrics()['points_replayed'] == 4)
+        finally:
+            sink.close()
+            db.shutdown()
+
+def test_queue_overflow_spools():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spool = os.path.join(tmpdir, 'influx.spool')
+        # Nothing listens on the port: the server was shut down.
+        db = FakeInfluxDB()
+        db.shutdown()
+
+        sink = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket', spool_filename=spool,
+                max_batch_points=1000, flush_interval=60.0, max_queue_points=5, timeout=0.5)
+
+        try:
+            sink.write_lines(['m v=%di %d' % (i, i) for i in range(8)])
+
+            metrics = sink.get_metrics()
+            assert metrics['queue_points'] == 5
+            assert metrics['points_spooled'] == 3
+        finally:
+            sink.close()
+
+        # Unwritten points remain in the spool after close().
+        with open(spool) as fp:
+            assert len(fp.read().splitlines()) == 8
+
+        assert sink.get_metrics()['points_dropped'] == 0
+
+def test_handle_event():
+    db      = FakeInfluxDB()
+    sink    = influxdb_sink.InfluxDBSink(db.url, 'org', 'bucket')
+    profile = device_profile.from_dict(profile_dict)
+
+    try:
+        sink.handle_event(monitor.ParameterEvent(1.0, 'mc://localhost:23000', 0, 3, 17,
+            1, 21, profile[1]))
+        sink.handle_event(monitor.ParameterEvent(2.0, 'mc://localhost:23000', 0, 3, 17,
+            200, 5, None))
+        sink.handle_event(monitor.ConnectionEvent(3.0, 'connected', 'mc://localhost:23000', None))
+        sink.close()
+
+        assert db.lines == [
+                'mesyflux_auto_poll,device_idc=17,mrc_bus=0,mrc_bus_addr=3,mrc_url=mc://localhost:23000'
+                ' temperature_raw=21i,temperature_unit="C",temperature_unit_value=10.5 1000000000',
+                'mesyflux_auto_poll,device_idc=17,mrc_bus=0,mrc_bus_addr=3,mrc_url=mc://localhost:23000'
+                ' param200_raw=5i 2000000000',
+                ]
+    finally:
+        sink.close()
+        db.shutdown()
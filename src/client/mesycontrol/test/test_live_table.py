@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .. import basic_model as bm
+from .. import hardware_controller
+from .. import hardware_model as hm
+from .. import live_table
+from .test_hw_model import FakeConnection
+from .test_monitor import make_scanbus_notification, make_polled_items_notification
+
+def test_publish_hw_model():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename   = os.path.join(tmpdir, 'live')
+        connection = FakeConnection()
+        registry   = bm.MRCRegistry()
+        mrc        = hm.HardwareMrc(connection.url)
+        mrc.set_controller(hardware_controller.Controller(connection))
+        registry.add_mrc(mrc)
+
+        connection.notification_received.emit(make_scanbus_notification(0, {3: 17}))
+        mrc.get_device(0, 3).set_cached_parameter(0, 42)
+
+        table  = live_table.LiveTable(registry, filename, n_slots=2)
+        reader = live_table.LiveTableReader(filename)
+        assert reader.n_slots == 2
+
+        # Values present before the table was created are published.
+        device = reader.get_device(connection.url, 0, 3)
+        assert device.idc == 17 and device.get(0) == 42 and device.get(1) is None
+
+        generation = reader.get_generation()
+        connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [21, 7]))
+        assert reader.get_generation() > generation
+        assert reader.get_device(connection.url, 0, 3).get_memory() == {0: 42, 1: 21, 2: 7}
+        assert reader.get_parameter(connection.url, 0, 3, 2) == 7
+
+        # Device added later, table full, device removed
+        connection.notification_received.emit(make_scanbus_notification(1, {0: 17, 5: 17}))
+        assert len(reader.snapshot()) == 2
+        assert reader.get_device(connection.url, 1, 5) is None
+
+        connection.notification_received.emit(make_scanbus_notification(1, {5: 17}))
+        assert reader.get_device(connection.url, 1, 0) is None
+        assert [(d.bus, d.dev) for d in reader.snapshot()] == [(0, 3)]
+
+        mrc.get_device(0, 3).clear_cached_memory()
+        assert reader.get_device(connection.url, 0, 3).get_memory() == {}
+
+        assert not reader.is_replaced()
+        table.close()
+        assert reader.is_replaced()
+        reader.close()
+
+def _stress_writer(filename, n_updates):
+    table = live_table.LiveTableFile(filename, n_slots=1)
+    index = table.allocate('mc://stress', 0, 0)
+    values = np.empty(live_table.N_PARAMS, dtype=np.int64)
+
+    for i in range(1, n_updates + 1):
+        values.fill(i)
+        table.update(index, 0, values)
+
+    table.close(unlink=False)
+
+def test_concurrent_readers():
+    # Every update writes the same value to all parameters of the slot.
+    # Readers must never see a mix of two updates.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'live')
+        writer   = multiprocessing.get_context('fork').Process(
+                target=_stress_writer, args=(filename, 20000))
+        writer.start()
+
+        t_end = time.monotonic() + 30.0
+
+        while not os.path.exists(filename):
+            assert time.monotonic() < t_end
+            time.sleep(0.001)
+
+        reader    = live_table.LiveTableReader(filename)
+        snapshots = 0
+        last      = 0
+
+        while writer.is_alive() or snapshots == 0:
+            assert time.monotonic() < t_end
+            device = reader.read_slot(0)
+
+            if device is None or not device.valid.all():
+                continue
+
+            assert (device.values == device.values[0]).all()
+            assert device.values[0] >= last
+            last = device.values[0]
+            snapshots += 1
+
+        writer.join()
+        assert writer.exitcode == 0
+        assert reader.read_slot(0).get(255) == 20000
+        reader.close()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import os
+import tempfile
+
+from .. import device_registry
+from .. import hardware_model as hm
+from .. import memory_cache
+
+def test_make_read_ranges():
+    assert memory_cache.make_read_ranges([]) == []
+    assert memory_cache.make_read_ranges([3]) == [(3, 1)]
+    assert memory_cache.make_read_ranges([5, 0, 1, 2]) == [(0, 6)]
+    assert memory_cache.make_read_ranges([0, 1, 100, 101], max_gap=4) == [(0, 2), (100, 2)]
+
+def test_store_and_prime():
+    registry = device_registry.DeviceRegistry()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fn    = os.path.join(tmpdir, "cache.json")
+        cache = memory_cache.MemoryCache(fn, registry)
+        mrc   = hm.HardwareMrc("/dev/ttyUSB0")
+        dev   = hm.Device(0, 1, 42)
+        mrc.add_device(dev)
+
+        for i in range(4):
+            dev.set_cached_parameter(i, i * 10)
+
+        cache.store(dev, dev.get_cached_memory())
+        cache.save()
+
+        cache = memory_cache.MemoryCache(fn, registry)
+        cache.load()
+
+        dev2 = hm.Device(0, 1, 42)
+        mrc.remove_device(dev)
+        mrc.add_device(dev2)
+        dev2.set_cached_parameter(0, 1234)
+
+        cache.prime(dev2)
+
+        assert dev2.get_cached_parameter(0) == 1234
+        assert dev2.is_parameter_verified(0)
+
+        for i in range(1, 4):
+            assert dev2.get_cached_parameter(i) == i * 10
+            assert not dev2.is_parameter_verified(i)
+
+        dev2.set_cached_parameter(1, 10)
+        assert dev2.is_parameter_verified(1)
+        assert dev2.get_unverified_addresses() == {2, 3}
+
+        # Different idc: nothing is primed
+        dev3 = hm.Device(0, 2, 43)
+        mrc.add_device(dev3)
+        cache.prime(dev3)
+        assert len(dev3.get_cached_memory()) == 0
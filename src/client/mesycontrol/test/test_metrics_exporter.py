@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import threading
+import urllib.request
+
+from mesycontrol.qt import QtCore
+from .. import basic_model as bm
+from .. import future
+from .. import hardware_controller
+from .. import hardware_model as hm
+from .. import metrics_exporter
+from .. import proto
+from .test_hw_model import FakeConnection
+from .test_monitor import FakeRegistry, make_scanbus_notification, make_polled_items_notification
+
+def get_app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+def make_setup():
+    connection = FakeConnection()
+    registry   = bm.MRCRegistry()
+    mrc        = hm.HardwareMrc(connection.url)
+    mrc.set_controller(hardware_controller.Controller(connection))
+    registry.add_mrc(mrc)
+    exporter   = metrics_exporter.MetricsExporter(registry, FakeRegistry())
+
+    connection.notification_received.emit(make_scanbus_notification(0, {3: 17}))
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [21, 7]))
+
+    return connection, mrc, exporter
+
+def get_samples(text):
+    return dict(line.rsplit(' ', 1) for line in text.splitlines()
+            if line and not line.startswith('#'))
+
+def test_render():
+    connection, mrc, exporter = make_setup()
+    n_requests = len(connection.requests)
+
+    # Simulate a request/response round trip.
+    request = proto.Message()
+    request.type = proto.Message.REQ_READ
+    response = proto.Message()
+    response.type = proto.Message.RESP_READ
+    f = future.Future()
+    connection.request_queued.emit(request, f)
+    connection.queue_size_changed.emit(3)
+    connection.response_received.emit(request, response, f)
+
+    text    = exporter.render()
+    samples = get_samples(text)
+    url     = connection.url
+
+    assert samples['mesycontrol_mrc_connected{url="%s"}' % url] == '1'
+    assert samples['mesycontrol_mrc_write_access{url="%s"}' % url] == '0'
+    assert samples['mesycontrol_mrc_queue_size{url="%s"}' % url] == '3'
+    assert samples['mesycontrol_requests_total{url="%s",type="REQ_READ"}' % url] == '1'
+    assert samples['mesycontrol_request_latency_seconds_count{url="%s"}' % url] == '1'
+    assert samples['mesycontrol_request_latency_seconds_bucket{url="%s",le="+Inf"}' % url] == '1'
+    assert samples['mesycontrol_poll_notifications_total{url="%s"}' % url] == '1'
+    assert samples['mesycontrol_polled_values_total{url="%s"}' % url] == '2'
+
+    dev = 'url="%s",bus="0",dev="3"' % url
+    assert samples['mesycontrol_device_info{%s,idc="17",device_type="TestDevice"}' % dev] == '1'
+    assert samples['mesycontrol_parameter_raw{%s,device_type="TestDevice",name="temperature",address="1"}' % dev] == '21'
+    assert samples['mesycontrol_parameter_value{%s,device_type="TestDevice",name="temperature",address="1",unit="C"}' % dev] == '10.5'
+    # No unit conversion defined for 'current'.
+    assert not any(k.startswith('mesycontrol_parameter_value') and 'current' in k for k in samples)
+
+    assert '# TYPE mesycontrol_requests_total counter' in text
+    assert '# EOF' not in text
+
+    text = exporter.render(openmetrics=True)
+    assert '# TYPE mesycontrol_requests counter' in text
+    assert text.endswith('# EOF\n')
+
+    # Rendering never sends requests.
+    assert len(connection.requests) == n_requests
+
+def test_http_scrape():
+    app = get_app()
+    connection, mrc, exporter = make_setup()
+    assert exporter.listen('127.0.0.1', 0)
+
+    url    = 'http://127.0.0.1:%d/metrics' % exporter.server.server_port()
+    result = dict()
+
+    def scrape():
+        try:
+            req = urllib.request.Request(url, headers={'Accept': 'application/openmetrics-text'})
+            with urllib.request.urlopen(req, timeout=5) as response:
+                result['content_type'] = response.headers['Content-Type']
+                result['body'] = response.read().decode('utf-8')
+            try:
+                urllib.request.urlopen(url.replace('/metrics', '/other'), timeout=5)
+            except urllib.error.HTTPError as e:
+                result['other_status'] = e.code
+        except Exception as e:
+            result['error'] = e
+
+    t = threading.Thread(target=scrape)
+    t.start()
+
+    while t.is_alive():
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+
+    t.join()
+    exporter.server.close()
+
+    assert 'error' not in result, result.get('error')
+    assert result['content_type'].startswith('application/openmetrics-text')
+    assert 'mesycontrol_mrc_connected{url="%s"} 1' % connection.url in result['body']
+    assert result['other_status'] == 404
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import io
+import json
+
+from .. import device_profile
+from .. import hardware_controller
+from .. import hardware_model as hm
+from .. import monitor
+from .. import proto
+from .test_hw_model import FakeConnection
+
+profile_dict = {
+        'name': 'TestDevice',
+        'idc': 17,
+        'parameters': [
+            { 'address': 0, 'name': 'setting' },
+            { 'address': 1, 'name': 'temperature', 'poll': True,
+                'units': [{'label': 'raw'}, {'label': 'C', 'factor': 2.0}] },
+            { 'address': 2, 'name': 'current', 'poll': True },
+            ],
+        }
+
+class FakeRegistry(object):
+    def __init__(self):
+        self.profile = device_profile.from_dict(profile_dict)
+
+    def get_device_profile(self, idc):
+        if idc == 17:
+            return self.profile
+        return device_profile.make_generic_profile(idc)
+
+class ListSink(object):
+    def __init__(self):
+        self.events = list()
+
+    def handle_event(self, event):
+        self.events.append(event)
+
+def make_scanbus_notification(bus, idcs):
+    m = proto.Message()
+    m.type = proto.Message.NOTIFY_SCANBUS
+    m.scanbus_result.bus = bus
+
+    for addr in range(16):
+        entry = m.scanbus_result.entries.add()
+        entry.idc = idcs.get(addr, 0)
+
+    return m
+
+def make_polled_items_notification(bus, dev, par, values):
+    m = proto.Message()
+    m.type = proto.Message.NOTIFY_POLLED_ITEMS
+    item = m.notify_polled_items.items.add()
+    item.bus, item.dev, item.par = bus, dev, par
+    item.values.extend(values)
+    return m
+
+def get_poll_requests(connection):
+    return [[(i.bus, i.dev, i.par, i.count) for i in msg.request_set_poll_items.items]
+            for msg, f in connection.requests if msg.type == proto.Message.REQ_SET_POLL_ITEMS]
+
+def test_monitor():
+    connection = FakeConnection()
+    mrc        = hm.HardwareMrc(connection.url)
+    mrc.set_controller(hardware_controller.Controller(connection))
+    sink       = ListSink()
+    mon        = monitor.Monitor(mrc, FakeRegistry(), [sink])
+
+    mon.start()
+    assert sink.events[-1].kind == 'connected'
+
+    # Hot-plug: a device appears on bus 0.
+    connection.notification_received.emit(make_scanbus_notification(0, {3: 17}))
+    assert isinstance(sink.events[-1], monitor.DeviceEvent)
+    assert sink.events[-1][1:] == ('added', connection.url, 0, 3, 17)
+    assert sorted(get_poll_requests(connection)[-1]) == [(0, 3, 1, 1), (0, 3, 2, 1)]
+
+    # Pushed values are forwarded.
+    del sink.events[:]
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [10, 20]))
+    assert [(e.address, e.value, e.name) for e in sink.events] == [
+            (1, 10, 'temperature'), (2, 20, 'current')]
+    assert sink.events[0].unit.unit_value(10) == 5.0
+
+    d = monitor.event_to_dict(sink.events[0])
+    assert d['unit'] == 'C' and d['unit_value'] == 5.0
+    json.dumps(d)
+
+    # Unchanged values produce no events.
+    del sink.events[:]
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [10, 21]))
+    assert [(e.address, e.value) for e in sink.events] == [(2, 21)]
+
+    # The device is removed from the bus.
+    connection.notification_received.emit(make_scanbus_notification(0, {}))
+    assert sink.events[-1].kind == 'removed'
+    assert get_poll_requests(connection)[-1] == []
+    assert mon.get_polled_items() == []
+
+    mon.stop()
+
+def test_json_lines_sink():
+    fp   = io.StringIO()
+    sink = monitor.JsonLinesSink(fp)
+    sink.handle_event(monitor.DeviceEvent(1.0, 'added', 'mc://localhost', 0, 1, 17))
+    sink.handle_event(monitor.ConnectionEvent(2.0, 'error', 'mc://localhost', RuntimeError("x")))
+
+    lines = [json.loads(l) for l in fp.getvalue().splitlines()]
+    assert lines[0] == {'type': 'device', 'time': 1.0, 'kind': 'added', 'url': 'mc://localhost',
+            'bus': 0, 'device': 1, 'idc': 17}
+    assert lines[1]['info'] == 'x'
+
+def test_monitor_main_cleans_up_when_listen_fails(tmp_path, monkeypatch):
+    import socket
+
+    closed  = list()
+    stopped = list()
+
+    class RecordingSink(monitor.JsonLinesSink):
+        def close(self):
+            closed.append(self)
+            super(RecordingSink, self).close()
+
+    monkeypatch.setattr(monitor, 'JsonLinesSink', RecordingSink)
+    monkeypatch.setattr(monitor.Monitor, 'stop', lambda self: stopped.append(self))
+
+    # Occupy the metrics port.
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1)
+        port = sock.getsockname()[1]
+
+        ret = monitor.monitor_main(['mc://127.0.0.1:1', '--quiet',
+            '--jsonl', str(tmp_path / 'events.jsonl'), '--metrics', '127.0.0.1:%d' % port])
+
+    assert ret == 1
+    assert len(closed) == 1 and closed[0].fp.closed
+    assert len(stopped) == 1
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import glob
+import os
+import tempfile
+
+import numpy as np
+
+from .. import hardware_controller
+from .. import hardware_model as hm
+from .. import monitor
+from .. import recorder
+from .test_hw_model import FakeConnection
+from .test_monitor import FakeRegistry, make_scanbus_notification, make_polled_items_notification
+
+URL_A = 'mc://crate-a:23000'
+URL_B = 'mc://crate-b:23000'
+
+def test_record_and_query():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rec = recorder.Recorder(tmpdir, records_per_segment=16, segment_seconds=None)
+
+        for i in range(40):
+            rec.record(1000.0 + i, URL_A if i % 2 else URL_B, 0, 3, 1, i)
+
+        rec.handle_polled_values(monitor.PolledValuesEvent(2000.0, URL_A, 1, 5, 17, 2, [-7]))
+        rec.handle_event(monitor.ConnectionEvent(2001.0, 'connected', URL_A, None))
+
+        # 41 records with 16 per segment: two finished segments.
+        assert len(glob.glob(os.path.join(tmpdir, 'segment-*.npy'))) == 2
+        assert rec.get_mrc_urls() == [URL_B, URL_A]
+
+        result = rec.query()
+        assert len(result) == 41
+        assert list(result['value'][:40]) == list(range(40))
+
+        result = rec.query(1010.0, 1020.0, url=URL_A)
+        assert list(result['value']) == [11, 13, 15, 17, 19]
+
+        result = rec.query(url=URL_A, bus=1, dev=5, par=2)
+        assert len(result) == 1 and result['value'][0] == -7
+
+        assert len(rec.query(url='mc://unknown')) == 0
+
+        # Finished segments are plain .npy files.
+        data = np.load(sorted(glob.glob(os.path.join(tmpdir, 'segment-*.npy')))[0])
+        assert data.dtype == recorder.RECORD_DTYPE and len(data) == 16
+
+        rec.close()
+
+        # Reopening continues after the last record of the active segment.
+        rec = recorder.Recorder(tmpdir, records_per_segment=16, segment_seconds=None)
+        assert rec.get_mrc_urls() == [URL_B, URL_A]
+        rec.record(3000.0, URL_A, 0, 3, 1, 100)
+
+        result = rec.query(url=URL_A)
+        assert len(result) == 22
+        assert result['value'][-1] == 100
+        rec.close()
+
+def test_downsample():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rec = recorder.Recorder(tmpdir, records_per_segment=1000)
+
+        for i in range(100):
+            rec.record(500.0 + i * 0.5, URL_A, 0, 0, 10, i)
+
+        result = rec.downsample(10.0, t_start=500.0, url=URL_A, bus=0, dev=0, par=10)
+
+        assert len(result) == 5
+        assert list(result['time']) == [500.0, 510.0, 520.0, 530.0, 540.0]
+        assert list(result['min'])  == [0, 20, 40, 60, 80]
+        assert list(result['max'])  == [19, 39, 59, 79, 99]
+        assert list(result['mean']) == [9.5, 29.5, 49.5, 69.5, 89.5]
+        assert list(result['count']) == [20] * 5
+
+        assert len(rec.downsample(10.0, url=URL_B)) == 0
+        rec.close()
+
+def test_record_unchanged_polled_values():
+    # A stable value is pushed with every poll notification but changes only
+    # once. All samples must be recorded.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        connection = FakeConnection()
+        mrc        = hm.HardwareMrc(connection.url)
+        mrc.set_controller(hardware_controller.Controller(connection))
+        rec        = recorder.Recorder(tmpdir, records_per_segment=100)
+        mon        = monitor.Monitor(mrc, FakeRegistry(), [rec])
+
+        mon.start()
+        connection.notification_received.emit(make_scanbus_notification(0, {3: 17}))
+
+        for i in range(5):
+            connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [42, i]))
+
+        result = rec.query(url=connection.url, bus=0, dev=3, par=1)
+        assert list(result['value']) == [42] * 5
+        assert list(rec.query(par=2)['value']) == list(range(5))
+
+        result = rec.downsample(3600.0, url=connection.url, bus=0, dev=3, par=1)
+        assert len(result) == 1 and result['count'][0] == 5 and result['mean'][0] == 42.0
+
+        # Devices without a poll subscription are not recorded.
+        connection.notification_received.emit(make_polled_items_notification(0, 4, 1, [1]))
+        assert len(rec.query(dev=4)) == 0
+
+        mon.stop()
+        rec.close()
+
+def test_time_rollover_and_retention():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rec = recorder.Recorder(tmpdir, records_per_segment=1000, segment_seconds=60.0)
+
+        # One record every 10 seconds for 10 minutes.
+        for i in range(60):
+            rec.record(10000.0 + i * 10.0, URL_A, 0, 0, 0, i)
+
+        segments = sorted(glob.glob(os.path.join(tmpdir, 'segment-*.npy')))
+        assert len(segments) == 9
+
+        rec.retention_seconds = 300.0
+        deleted = rec.apply_retention(now=10000.0 + 600.0)
+        assert len(deleted) == 5
+
+        result = rec.query()
+        assert result['time'][0] == 10000.0 + 300.0
+
+        rec.max_bytes = os.path.getsize(rec._get_segments()[-1][0])
+        rec.apply_retention(now=10000.0 + 600.0)
+        assert len(rec._get_segments()) == 1
+        rec.close()
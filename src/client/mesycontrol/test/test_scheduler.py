@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import time
+import types
+
+from mesycontrol.qt import QtCore
+from .. import basic_model as bm
+from .. import hardware_controller
+from .. import hardware_model as hm
+from .. import scheduler
+from .. import script
+from .test_hw_model import FakeConnection
+from .test_monitor import FakeRegistry, make_scanbus_notification, make_polled_items_notification
+
+def get_app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+def test_periodic_tasks():
+    app   = get_app()
+    sched = scheduler.Scheduler()
+    calls = list()
+    t0    = time.monotonic()
+
+    def slow():
+        calls.append(('slow', time.monotonic() - t0))
+        # Longer than the interval of 'fast': its missed ticks are skipped.
+        time.sleep(0.06)
+
+    fast = sched.call_every(0.02, lambda: calls.append(('fast', time.monotonic() - t0)))
+    first_deadline = fast.deadline
+    sched.call_every(0.1, slow, delay=0)
+    sched.call_later(0.05, sched.stop)
+    sched.run(timeout=5.0)
+
+    # Stopped by the single shot task, which is gone afterwards.
+    assert time.monotonic() - t0 < 1.0
+    assert len(sched.get_tasks()) == 2
+
+    sched.run(timeout=0.3)
+    fast.cancel()
+    n_fast = sum(1 for name, t in calls if name == 'fast')
+    sched.run(timeout=0.05)
+
+    assert calls[0][0] == 'slow'
+    assert sum(1 for name, t in calls if name == 'fast') == n_fast
+    # The schedule does not drift: deadlines stay on the 20 ms grid, missed
+    # ticks are skipped.
+    ticks = (fast.deadline - first_deadline) / 0.02
+    assert abs(ticks - round(ticks)) < 1e-6
+    assert fast.runs < round(ticks)
+    assert 5 <= n_fast <= 17
+    sched.cancel_all()
+    assert not sched.get_tasks()
+
+def test_script_context_events():
+    app        = get_app()
+    connection = FakeConnection()
+    registry   = bm.MRCRegistry()
+    mrc        = hm.HardwareMrc(connection.url)
+    mrc.set_controller(hardware_controller.Controller(connection))
+    registry.add_mrc(mrc)
+
+    app_context = types.SimpleNamespace(
+            app_registry=types.SimpleNamespace(hw=registry),
+            device_registry=FakeRegistry(),
+            shutdown=lambda: None)
+    ctx    = script.ScriptContext(app_context)
+    events = list()
+
+    ctx.on_device_added(lambda device: events.append(('added', device.bus, device.address)))
+    connection.notification_received.emit(make_scanbus_notification(0, {3: 17}))
+    device = script.DeviceWrapper(mrc.get_device(0, 3), FakeRegistry())
+
+    ctx.on_parameter_change(device, 'temperature',
+            lambda device, address, value: events.append(('temperature', value)))
+    ctx.on_parameter_change(device, None,
+            lambda device, address, value: events.append(('any', address, value)))
+
+    def poll():
+        # Changes caused by a task are delivered after it returns, repeated
+        # changes of a parameter are coalesced.
+        for i in range(3):
+            connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [20 + i, 7]))
+        events.append(('poll',))
+        ctx.quit = True
+
+    ctx.every(10.0, poll, delay=0)
+    ctx.run(timeout=5.0)
+
+    assert events == [('added', 0, 3), ('poll',), ('temperature', 22), ('any', 1, 22), ('any', 2, 7)]
+
+    ctx.shutdown()
+    assert not ctx.get_scheduler().get_tasks()
+    connection.notification_received.emit(make_scanbus_notification(1, {0: 17}))
+    app.processEvents()
+    assert len(events) == 5
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+from nose.tools import assert_raises
+
+from mesycontrol import basic_model as bm
+from mesycontrol import future
+from mesycontrol import script
+from mesycontrol.qt import QtCore
+
+def get_app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+class FakeDevice(object):
+    """Completes requests from the Qt event loop and records them."""
+    def __init__(self, bus, address, idc=17):
+        self.bus, self.address, self.idc = bus, address, idc
+        self.memory   = dict((a, a * 10) for a in bm.PARAM_RANGE)
+        self.requests = list()
+        self.answer   = True
+
+    def _complete_later(self, f, result):
+        if self.answer:
+            QtCore.QTimer.singleShot(0, lambda: f.set_result(result))
+        return f
+
+    def read_multi(self, address, count):
+        self.requests.append(('read_multi', address, count))
+        return self._complete_later(bm.ResultFuture(), [
+            bm.ReadResult(self.bus, self.address, a, self.memory[a])
+            for a in range(address, address + count)])
+
+    def set_parameter(self, address, value):
+        self.requests.append(('set', address, value))
+        self.memory[address] = value
+        return self._complete_later(bm.ResultFuture(),
+                bm.SetResult(self.bus, self.address, address, value, value))
+
+class FakeProfile(object):
+    def __getitem__(self, name):
+        class P(object):
+            address = {'threshold': 5, 'gain': 7}[name]
+        return P()
+
+    def get_volatile_addresses(self):
+        return [1, 2]
+
+class FakeRegistry(object):
+    def get_device_profile(self, idc):
+        return FakeProfile()
+
+def test_wait_all():
+    app = get_app()
+
+    futures = [future.Future() for i in range(3)]
+    for i, f in enumerate(futures):
+        QtCore.QTimer.singleShot(i, lambda f=f: f.set_result(True))
+
+    assert future.wait_all(futures)
+    assert all(f.done() for f in futures)
+
+    # Already completed futures do not run the event loop.
+    assert future.wait_all(futures)
+    assert future.wait_all([])
+
+    assert not future.wait_all([future.Future()], timeout=0.01)
+
+def test_device_wrapper_batches():
+    app    = get_app()
+    device = FakeDevice(0, 3)
+    dw     = script.DeviceWrapper(device, FakeRegistry())
+
+    results = dw.read_parameters([1, 2, 3, 'threshold', 40])
+
+    # Consecutive addresses are read using a single request.
+    assert device.requests == [('read_multi', 1, 5), ('read_multi', 40, 1)]
+    assert sorted(results.keys(), key=str) == sorted([1, 2, 3, 'threshold', 40], key=str)
+    assert results['threshold'].address == 5
+    assert results[40].value == 400
+
+    device.requests = list()
+    results = dw.set_parameters({1: 11, 'gain': 77})
+    assert device.requests == [('set', 1, 11), ('set', 7, 77)]
+    assert results['gain'].value == 77
+
+    device.answer = False
+    assert_raises(TimeoutError, dw.read_parameters, [1], timeout=0.01)
+
+def test_mrc_wrapper_read_all():
+    app     = get_app()
+    devices = [FakeDevice(0, 1), FakeDevice(1, 15)]
+    mrc     = script.MRCWrapper(None, FakeRegistry())
+
+    results = mrc.read_all([script.DeviceWrapper(d) for d in devices])
+
+    assert sorted(results.keys()) == [(0, 1), (1, 15)]
+    assert sorted(results[(1, 15)].keys()) == [1, 2]
+
+    results = mrc.read_all([script.DeviceWrapper(devices[0])], addrs=[10, 200])
+    assert sorted(results[(0, 1)].keys()) == [10, 200]
+    assert results[(0, 1)][200].value == 2000
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+from .. import app_model as am
+from .. import basic_model as bm
+from .. import device_registry
+from .. import specialized_device
+from .. import util
+
+def test_parameter_observers_across_memory_clear():
+    hw     = bm.Device(0, 1, 17)
+    module = device_registry.VirtualDeviceModule(17)
+    device = am.Device(0, 1, hw_device=hw, hw_module=module, cfg_module=module)
+    spec   = specialized_device.DeviceBase(device, util.HARDWARE, util.HARDWARE)
+    calls  = list()
+    spec_calls  = list()
+    n_cleared   = list()
+
+    device.add_hw_parameter_observer(3, lambda a, v: calls.append((a, v)))
+    spec.add_parameter_observer(3, lambda a, v: spec_calls.append((a, v)))
+    device.hw_memory_cleared.connect(lambda: n_cleared.append(1))
+
+    hw.set_cached_parameter(3, 42)
+    hw.set_cached_parameter(4, 43)
+    assert calls == spec_calls == [(3, 42)]
+
+    # A single notification per observed address, carrying the new value.
+    hw.clear_cached_memory()
+    assert calls == spec_calls == [(3, 42), (3, None)]
+    assert len(n_cleared) == 1
+
+    hw.set_cached_memory({3: 7})
+    assert calls == spec_calls == [(3, 42), (3, None), (3, 7)]
+
+def test_memory_snapshot_follows_read_mode():
+    hw     = bm.Device(0, 1, 17)
+    cfg    = bm.Device(0, 1, 17)
+    module = device_registry.VirtualDeviceModule(17)
+    device = am.Device(0, 1, hw_device=hw, cfg_device=cfg, hw_module=module, cfg_module=module)
+    spec   = specialized_device.DeviceBase(device, util.HARDWARE, util.HARDWARE)
+
+    hw.set_cached_parameter(3, 1)
+    cfg.set_cached_parameter(3, 2)
+    snapshot = spec.get_memory_snapshot()
+    hw.set_cached_parameter(3, 5)
+
+    # The snapshot keeps the values it was taken with.
+    assert snapshot[3] == 1
+    assert spec.get_memory_snapshot()[3] == 5
+
+    spec.read_mode = util.CONFIG
+    assert spec.get_memory_snapshot()[3] == 2
+
+    # Comparing hardware and config does not take a snapshot.
+    hw.set_cached_parameter(3, 4)
+    hw_memory = hw.get_cached_memory_ref()
+    device.update_config_applied()
+    cfg.set_cached_parameter(3, 3)
+    hw.set_cached_parameter(3, 6)
+    assert hw.get_cached_memory_ref() is hw_memory
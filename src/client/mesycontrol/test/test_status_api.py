@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+import json
+import time
+import urllib.parse
+
+from mesycontrol.qt import QtCore
+from .. import app_model as am
+from .. import basic_model as bm
+from .. import config_model as cm
+from .. import device_profile
+from .. import device_registry
+from .. import future
+from .. import hardware_controller
+from .. import hardware_model as hm
+from .. import http_server
+from .. import status_api
+from .test_hw_model import FakeConnection
+from .test_monitor import profile_dict, make_scanbus_notification, make_polled_items_notification
+
+def get_app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+class FakeDeviceRegistry(device_registry.DeviceRegistry):
+    def get_device_module(self, idc):
+        ret = device_registry.VirtualDeviceModule(idc)
+        if idc == 17:
+            ret.profile = device_profile.from_dict(profile_dict)
+        return ret
+
+def make_request(path, headers=None):
+    url = urllib.parse.urlsplit(path)
+    query = dict((k, v[0]) for k, v in urllib.parse.parse_qs(url.query).items())
+    return http_server.Request('GET', urllib.parse.unquote(url.path), query, headers or dict())
+
+def make_setup():
+    connection   = FakeConnection()
+    app_registry = am.MRCRegistry(bm.MRCRegistry(), cm.Setup())
+    director     = am.Director(app_registry, FakeDeviceRegistry())
+    mrc          = hm.HardwareMrc(connection.url)
+    mrc.set_controller(hardware_controller.Controller(connection))
+    app_registry.hw.add_mrc(mrc)
+    api          = status_api.StatusApi(app_registry)
+
+    connection.notification_received.emit(make_scanbus_notification(0, {3: 17}))
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [21, 7]))
+
+    return connection, director, api
+
+def process_events(app, f, timeout=1.0):
+    t_end = time.monotonic() + timeout
+    while not f.done() and time.monotonic() < t_end:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+
+def test_resources():
+    connection, director, api = make_setup()
+    n_requests = len(connection.requests)
+
+    r = api.handle_mrcs(make_request('/mrcs'))
+    assert r.status == 200
+    body = json.loads(r.body)
+    mrc  = body['mrcs'][0]
+    assert mrc['url'] == connection.url and mrc['connected'] and not mrc['write_access']
+    assert mrc['devices'][0]['bus'] == 0 and mrc['devices'][0]['address'] == 3
+    assert mrc['devices'][0]['type'] == 'TestDevice'
+
+    # Unchanged resource: 304
+    etag = r.headers['ETag']
+    r = api.handle_mrcs(make_request('/mrcs', {'if-none-match': etag}))
+    assert r.status == 304
+
+    # The url can be given as is or percent-encoded.
+    for url in (connection.url, urllib.parse.quote(connection.url, safe='')):
+        r = api.handle_device(make_request('/devices/%s/0/3' % url))
+        assert r.status == 200
+        params = dict((p['address'], p) for p in json.loads(r.body)['parameters'])
+        assert params[1]['name'] == 'temperature'
+        assert params[1]['value'] == 21
+        assert params[1]['unit_value'] == 10.5 and params[1]['unit'] == 'C'
+        assert params[2]['value'] == 7 and 'unit' not in params[2]
+
+    assert api.handle_device(make_request('/devices/%s/1/3' % connection.url)).status == 404
+    assert api.handle_device(make_request('/devices/foo')).status == 400
+
+    # Serving never sends requests to the MRC.
+    assert len(connection.requests) == n_requests
+
+def test_long_poll():
+    app = get_app()
+    connection, director, api = make_setup()
+
+    path = '/devices/%s/0/3' % connection.url
+    etag = api.handle_device(make_request(path)).headers['ETag']
+
+    f = api.handle_device(make_request(path + '?wait=5', {'if-none-match': etag}))
+    assert isinstance(f, future.Future) and not f.done()
+
+    # Changes of other resources do not complete the request.
+    generation = api.generation
+    connection.notification_received.emit(make_scanbus_notification(1, {0: 17}))
+    process_events(app, f, 0.1)
+    assert not f.done()
+
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [22, 7]))
+    process_events(app, f)
+    assert f.done()
+    r = f.result()
+    assert r.status == 200 and r.headers['ETag'] != etag
+
+    # Change feed
+    r = api.handle_changes(make_request('/changes?since=%d' % generation))
+    body = json.loads(r.body)
+    assert body['generation'] == api.generation and not body['reset']
+    params = [c for c in body['changes'] if c['type'] == 'parameter']
+    assert params[-1]['url'] == connection.url
+    assert (params[-1]['bus'], params[-1]['address'], params[-1]['parameter']) == (0, 3, 1)
+    assert params[-1]['value'] == 22 and params[-1]['source'] == 'hw'
+
+    # Waiting for the next change
+    f = api.handle_changes(make_request('/changes?since=%d&timeout=5' % api.generation))
+    assert not f.done()
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [22, 8]))
+    process_events(app, f)
+    body = json.loads(f.result().body)
+    assert [c['value'] for c in body['changes']] == [8]
+
+    # A generation from before a restart is answered immediately.
+    r = api.handle_changes(make_request('/changes?since=%d&timeout=5' % (api.generation + 100)))
+    body = json.loads(r.body)
+    assert body['reset'] and body['generation'] == api.generation
+
+    # Timeouts
+    f = api.handle_changes(make_request('/changes?since=%d&timeout=0.01' % api.generation))
+    process_events(app, f)
+    assert json.loads(f.result().body)['changes'] == []
+
+    etag = api.handle_device(make_request(path)).headers['ETag']
+    f = api.handle_device(make_request(path + '?wait=0.01', {'if-none-match': etag}))
+    process_events(app, f)
+    assert f.result().status == 304
+
+def test_waiters_share_renders():
+    app = get_app()
+    connection, director, api = make_setup()
+
+    path    = '/devices/%s/0/3' % connection.url
+    etag    = api.handle_device(make_request(path)).headers['ETag']
+    renders = list()
+    device_to_dict = api.device_to_dict
+
+    def counting_device_to_dict(device, with_parameters=False):
+        renders.append(device)
+        return device_to_dict(device, with_parameters)
+
+    api.device_to_dict = counting_device_to_dict
+
+    waiters = [api.handle_device(make_request(path + '?wait=5', {'if-none-match': etag}))
+            for i in range(20)]
+    assert all(not f.done() for f in waiters)
+    assert len(renders) == 0
+
+    connection.notification_received.emit(make_polled_items_notification(0, 3, 1, [22, 7]))
+    process_events(app, waiters[-1])
+
+    # One render per change batch, not one per waiter.
+    assert all(f.done() for f in waiters)
+    assert len(renders) == 1
+    assert len(set(f.result().headers['ETag'] for f in waiters)) == 1
+
+    r = api.handle_device(make_request(path))
+    assert r.headers['ETag'] == waiters[0].result().headers['ETag']
+    assert len(renders) == 1
@@ -75,3 +75,16 @@ def test_make_logging_source_adapter():
 
     log = util.make_logging_source_adapter(__name__, test_instance)
     assert log.logger.name.endswith(test_instance.__class__.__name__)
+
+def test_freeze():
+    value = util.freeze({'a': [1, {'b': 2}], 'c': (3, [4])})
+
+    assert isinstance(value, util.FrozenDict)
+    assert isinstance(value['a'], util.FrozenList)
+    assert isinstance(value['a'][1], util.FrozenDict)
+    # Tuples keep their type, contained lists are frozen.
+    assert type(value['c']) is tuple
+    assert isinstance(value['c'][1], util.FrozenList)
+    assert value == {'a': [1, {'b': 2}], 'c': (3, [4])}
+    assert util.freeze(value) is value
+    assert_raises(TypeError, value['a'].append, 5)
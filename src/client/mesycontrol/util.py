@@ -21,14 +21,8 @@
 __author__ = 'Florian Lüke'
 __email__  = 'f.lueke@mesytec.com'
 
-from pyqtgraph.SignalProxy import SignalProxy
-
 from mesycontrol.qt import QtCore
-from mesycontrol.qt import QtGui
-from mesycontrol.qt import QtWidgets
 from mesycontrol.qt import Signal
-from mesycontrol.qt import Qt
-from mesycontrol.qt import QUiLoader
 
 QObject = QtCore.QObject
 QTimer  = QtCore.QTimer
@@ -41,8 +35,10 @@ import logging
 import math
 import os
 import re
+import shutil
 import signal
 import sys
+import tempfile
 
 from functools import reduce
 
@@ -50,6 +46,30 @@ HARDWARE = 1
 CONFIG   = 2
 COMBINED = 3
 
+# Widget helpers moved to mesycontrol.widget_util. They are resolved on first
+# access to keep this module importable without QtWidgets.
+_WIDGET_UTIL_NAMES = frozenset((
+    'make_title_label',
+    'hline',
+    'vline',
+    'make_spinbox',
+    'loadUi',
+    'DelayedSpinBox',
+    'DelayedDoubleSpinBox',
+    'FixedWidthVerticalToolBar',
+    'SimpleToolBar',
+    'make_apply_common_button_layout',
+    'make_icon',
+    'make_standard_icon',
+    'ReadOnlyCheckBox',
+    ))
+
+def __getattr__(name):
+    if name in _WIDGET_UTIL_NAMES:
+        from mesycontrol import widget_util
+        return getattr(widget_util, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
 RW_MODE_NAMES = {
         HARDWARE: 'hardware',
         CONFIG: 'config',
@@ -502,47 +522,6 @@ class ExceptionHookRegistry(object):
         for handler in self._handlers:
             handler(exc_type, exc_value, exc_trace)
 
-def make_title_label(title):
-    title_font = QtGui.QFont()
-    title_font.setBold(True)
-    label = QtWidgets.QLabel(title)
-    label.setFont(title_font)
-    label.setAlignment(Qt.AlignCenter)
-    return label
-
-def hline(parent=None):
-    ret = QtWidgets.QFrame(parent)
-    ret.setFrameShape(QtWidgets.QFrame.HLine)
-    ret.setFrameShadow(QtWidgets.QFrame.Sunken)
-    return ret
-
-def vline(parent=None):
-    ret = QtWidgets.QFrame(parent)
-    ret.setFrameShape(QtWidgets.QFrame.VLine)
-    ret.setFrameShadow(QtWidgets.QFrame.Sunken)
-    return ret
-
-def make_spinbox(min_value=None, max_value=None, value=None, limits=None,
-        prefix=None, suffix=None, single_step=None, parent=None):
-    ret = QtWidgets.QSpinBox(parent)
-    if min_value is not None:
-        ret.setMinimum(min_value)
-    if max_value is not None:
-        ret.setMaximum(max_value)
-    if limits is not None:
-        ret.setMinimum(limits[0])
-        ret.setMaximum(limits[1])
-    if prefix is not None:
-        ret.setPrefix(prefix)
-    if suffix is not None:
-        ret.setSuffix(suffix)
-    if single_step is not None:
-        ret.setSingleStep(single_step)
-    if value is not None:
-        ret.setValue(value)
-
-    return ret
-
 # http://code.activestate.com/recipes/576694/
 class OrderedSet(collections.abc.MutableSet):
 
@@ -602,13 +581,80 @@ class OrderedSet(collections.abc.MutableSet):
             return len(self) == len(other) and list(self) == list(other)
         return set(self) == set(other)
 
-def loadUi(filename, parentWidget=None):
-    """This version of PyQts uic.loadUi() adds support for loading from
-    resource files."""
-    f = QtCore.QFile(filename)
-    if not f.open(QtCore.QIODevice.ReadOnly | QtCore.QIODevice.Text):
-        raise RuntimeError(str(f.errorString()))
-    return QUiLoader().load(f, parentWidget)
+def _immutable(self, *args, **kwargs):
+    raise TypeError("'%s' object is immutable" % type(self).__name__)
+
+class FrozenList(list):
+    """Immutable list. Subclasses list so that isinstance checks and
+    comparisons with plain lists keep working. Use set() to obtain a modified
+    copy."""
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = reverse = sort = clear = _immutable
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+    def set(self, index, value):
+        """Returns a copy of this list with the item at index replaced by
+        value."""
+        ret = list(self)
+        ret[index] = freeze(value)
+        return FrozenList(ret)
+
+class FrozenDict(dict):
+    """Immutable dict. Subclasses dict so that isinstance checks and
+    comparisons with plain dicts keep working. Use set() and remove() to
+    obtain modified copies."""
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    update = pop = popitem = clear = setdefault = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self.items()))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def set(self, key, value):
+        """Returns a copy of this dict with key set to value. Values of other
+        keys are shared with the original."""
+        ret = dict(self)
+        ret[key] = freeze(value)
+        return FrozenDict(ret)
+
+    def remove(self, key):
+        """Returns a copy of this dict without the given key."""
+        ret = dict(self)
+        del ret[key]
+        return FrozenDict(ret)
+
+def freeze(value):
+    """Recursively converts lists and dicts contained in value to FrozenList
+    and FrozenDict instances. Tuples are kept, their items are frozen. Frozen
+    values are returned as is."""
+    if isinstance(value, (FrozenList, FrozenDict)):
+        return value
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    if isinstance(value, tuple):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    return value
 
 class ChannelGroupHelper(object):
     def __init__(self, num_channels, num_groups):
@@ -625,143 +671,42 @@ class ChannelGroupHelper(object):
     def channel_to_group(self, channel_num):
         return int(math.floor(channel_num / self.channels_per_group()))
 
-class DelayedSpinBox(QtWidgets.QSpinBox):
-    delayed_valueChanged = Signal(object)
-
-    def __init__(self, delay=0.5, parent=None):
-        super(DelayedSpinBox, self).__init__(parent)
-        self.log = make_logging_source_adapter(__name__, self)
-
-        def delayed_slt():
-            self.log.debug("delayed_slt invoked. value=%d" % self.value())
-            self.delayed_valueChanged.emit(self.value())
-
-        self.proxy = SignalProxy(signal=self.valueChanged,
-                slot=delayed_slt, delay=delay)
+def write_file_atomic(filename, write_fn, binary=False):
+    """Calls write_fn(fp) with a file object opened for writing and replaces
+    filename with the result. The data goes to a temporary file in the same
+    directory which is renamed over filename once write_fn returns. Text files
+    are opened using utf-8 encoding."""
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.%s.' % os.path.basename(filename), suffix='.tmp')
 
-class DelayedDoubleSpinBox(QtWidgets.QDoubleSpinBox):
-    delayed_valueChanged = Signal(object)
-
-    # Swapped order of arguments because of uic passing parent as first
-    # argument if used in a .ui file...
-    def __init__(self, parent=None, delay=0.5):
-        super(DelayedDoubleSpinBox, self).__init__(parent)
-        self.log = make_logging_source_adapter(__name__, self)
-
-        def delayed_slt():
-            self.log.debug("%s delayed_slt invoked. value=%d", self, self.value())
-            self.delayed_valueChanged.emit(self.value())
-
-        self.proxy = SignalProxy(signal=self.valueChanged,
-                slot=delayed_slt, delay=delay)
-
-        self.delayed_valueChanged.connect(self._on_delayed_valueChanged)
-
-    def blockSignals(self, b):
-        super(DelayedDoubleSpinBox, self).blockSignals(b)
-        self.log.debug("%s proxy.block=%s", self, b)
-        self.proxy.block = b
-
-    def _on_delayed_valueChanged(self, value):
-        self.log.debug("%s delayed_valueChanged(%s) emitted",
-                self, value)
+    try:
+        if binary:
+            fp = os.fdopen(fd, 'wb')
+        else:
+            fp = os.fdopen(fd, 'w', encoding='utf-8')
 
-    def setValue(self, value):
-        self.log.debug("%s setValue(%s)", self, value)
-        super(DelayedDoubleSpinBox, self).setValue(value)
+        with fp:
+            write_fn(fp)
+            fp.flush()
+            os.fsync(fp.fileno())
 
-class FixedWidthVerticalToolBar(QtWidgets.QWidget):
-    """Like a vertical QToolBar but having a fixed width. I did not manage to
-    get a QToolBar to have a fixed width. That's the only reason this class
-    exists."""
-    def __init__(self, parent=None):
-        super(FixedWidthVerticalToolBar, self).__init__(parent)
-        self.setLayout(QtWidgets.QVBoxLayout())
-        self.layout().setContentsMargins(0, 0, 0, 0)
-        self.layout().addStretch(1)
-
-    def addAction(self, action):
-        super(FixedWidthVerticalToolBar, self).addAction(action)
-        b = QtWidgets.QToolButton()
-        b.setDefaultAction(action)
-
-        self.layout().takeAt(self.layout().count()-1)
-        self.layout().addWidget(b, 0, Qt.AlignHCenter)
-        self.layout().addStretch(1)
-        self.setFixedWidth(self.sizeHint().width())
-
-class SimpleToolBar(QtWidgets.QWidget):
-    def __init__(self, orientation=Qt.Horizontal, parent=None):
-        super(SimpleToolBar, self).__init__(parent)
-        self.orientation = orientation
-        if orientation == Qt.Horizontal:
-            self.setLayout(QtWidgets.QHBoxLayout())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp)
         else:
-            self.setLayout(QtWidgets.QVBoxLayout())
-
-        self.layout().setSpacing(2)
-        self.layout().setContentsMargins(0, 0, 0, 0)
-        self.layout().addStretch(1)
-
-    # Adds the action to the widget, creates a toolbutton linked to the action,
-    # adds the toolbutton to the layout.
-    # Returns the button created for the action.
-    def addAction(self, action) -> QtWidgets.QToolButton:
-        super(SimpleToolBar, self).addAction(action)
-        b = QtWidgets.QToolButton()
-        b.setDefaultAction(action)
-        self.addWidget(b)
-        return b
-
-    def addWidget(self, widget):
-        # Remove the stretch from the last position in the layout.
-        self.layout().takeAt(self.layout().count()-1)
-        self.layout().addWidget(widget)
-        # Re-add the stretch as the last element in the layout.
-        self.layout().addStretch(1)
-        if self.orientation == Qt.Vertical:
-            self.setFixedWidth(self.sizeHint().width())
-
-def make_apply_common_button_layout(input_spinbox, tooltip, on_clicked):
-
-    # Wrapper to invoke the clicked handler without the boolean arg that's
-    # passed from QPushButton.clicked().
-    def _on_clicked():
-        on_clicked()
-
-    button = QtWidgets.QPushButton(clicked=_on_clicked)
-    button.setIcon(QtGui.QIcon(":/arrow-bottom.png"))
-    button.setMaximumHeight(input_spinbox.sizeHint().height())
-    button.setMaximumWidth(16)
-    button.setToolTip(tooltip)
-
-    layout = QtWidgets.QHBoxLayout()
-    layout.addWidget(input_spinbox)
-    layout.addWidget(button)
-    layout.setContentsMargins(0, 0, 0, 0)
-    layout.setSpacing(1)
-
-    return (layout, button)
-
-def make_icon(source):
-    return QtGui.QIcon(QtGui.QPixmap(source))
-
-def make_standard_icon(icon, option=None, widget=None):
-    return QtWidgets.QApplication.instance().style().standardIcon(icon, option, widget)
-
-class ReadOnlyCheckBox(QtWidgets.QCheckBox):
-    # Note: keyPressEvent and keyReleaseEvent do not need to be overriden
-    # because FocusPolicy is set to NoFocus
-
-    def __init__(self, *args, **kwargs):
-        super(ReadOnlyCheckBox, self).__init__(*args, **kwargs)
-        self.setFocusPolicy(Qt.NoFocus)
-
-    def mousePressEvent(self, event):
-        event.ignore()
-
-    def mouseReleaseEvent(self, event):
-        event.ignore()
+            os.chmod(tmp, 0o666 & ~get_umask())
+
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
 
 # Source: https://stackoverflow.com/a/44351664
 # Caution: this exhausts the iterator!
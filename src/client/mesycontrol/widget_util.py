@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# mesycontrol - Remote control for mesytec devices.
+# Copyright (C) 2015-2021 mesytec GmbH & Co. KG <info@mesytec.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = 'Florian Lüke'
+__email__  = 'f.lueke@mesytec.com'
+
+"""Widget helpers formerly part of mesycontrol.util. They live in a separate
+module so that the non-GUI parts of the package can be imported without
+QtWidgets and pyqtgraph. The names are still accessible via mesycontrol.util.
+"""
+
+from pyqtgraph.SignalProxy import SignalProxy
+
+from mesycontrol.qt import QtCore
+from mesycontrol.qt import QtGui
+from mesycontrol.qt import QtWidgets
+from mesycontrol.qt import Signal
+from mesycontrol.qt import Qt
+from mesycontrol.qt import QUiLoader
+
+from mesycontrol.util import make_logging_source_adapter
+
+def make_title_label(title):
+    title_font = QtGui.QFont()
+    title_font.setBold(True)
+    label = QtWidgets.QLabel(title)
+    label.setFont(title_font)
+    label.setAlignment(Qt.AlignCenter)
+    return label
+
+def hline(parent=None):
+    ret = QtWidgets.QFrame(parent)
+    ret.setFrameShape(QtWidgets.QFrame.HLine)
+    ret.setFrameShadow(QtWidgets.QFrame.Sunken)
+    return ret
+
+def vline(parent=None):
+    ret = QtWidgets.QFrame(parent)
+    ret.setFrameShape(QtWidgets.QFrame.VLine)
+    ret.setFrameShadow(QtWidgets.QFrame.Sunken)
+    return ret
+
+def make_spinbox(min_value=None, max_value=None, value=None, limits=None,
+        prefix=None, suffix=None, single_step=None, parent=None):
+    ret = QtWidgets.QSpinBox(parent)
+    if min_value is not None:
+        ret.setMinimum(min_value)
+    if max_value is not None:
+        ret.setMaximum(max_value)
+    if limits is not None:
+        ret.setMinimum(limits[0])
+        ret.setMaximum(limits[1])
+    if prefix is not None:
+        ret.setPrefix(prefix)
+    if suffix is not None:
+        ret.setSuffix(suffix)
+    if single_step is not None:
+        ret.setSingleStep(single_step)
+    if value is not None:
+        ret.setValue(value)
+
+    return ret
+
+
+def loadUi(filename, parentWidget=None):
+    """This version of PyQts uic.loadUi() adds support for loading from
+    resource files."""
+    f = QtCore.QFile(filename)
+    if not f.open(QtCore.QIODevice.ReadOnly | QtCore.QIODevice.Text):
+        raise RuntimeError(str(f.errorString()))
+    return QUiLoader().load(f, parentWidget)
+
+
+class DelayedSpinBox(QtWidgets.QSpinBox):
+    delayed_valueChanged = Signal(object)
+
+    def __init__(self, delay=0.5, parent=None):
+        super(DelayedSpinBox, self).__init__(parent)
+        self.log = make_logging_source_adapter(__name__, self)
+
+        def delayed_slt():
+            self.log.debug("delayed_slt invoked. value=%d" % self.value())
+            self.delayed_valueChanged.emit(self.value())
+
+        self.proxy = SignalProxy(signal=self.valueChanged,
+                slot=delayed_slt, delay=delay)
+
+class DelayedDoubleSpinBox(QtWidgets.QDoubleSpinBox):
+    delayed_valueChanged = Signal(object)
+
+    # Swapped order of arguments because of uic passing parent as first
+    # argument if used in a .ui file...
+    def __init__(self, parent=None, delay=0.5):
+        super(DelayedDoubleSpinBox, self).__init__(parent)
+        self.log = make_logging_source_adapter(__name__, self)
+
+        def delayed_slt():
+            self.log.debug("%s delayed_slt invoked. value=%d", self, self.value())
+            self.delayed_valueChanged.emit(self.value())
+
+        self.proxy = SignalProxy(signal=self.valueChanged,
+                slot=delayed_slt, delay=delay)
+
+        self.delayed_valueChanged.connect(self._on_delayed_valueChanged)
+
+    def blockSignals(self, b):
+        super(DelayedDoubleSpinBox, self).blockSignals(b)
+        self.log.debug("%s proxy.block=%s", self, b)
+        self.proxy.block = b
+
+    def _on_delayed_valueChanged(self, value):
+        self.log.debug("%s delayed_valueChanged(%s) emitted",
+                self, value)
+
+    def setValue(self, value):
+        self.log.debug("%s setValue(%s)", self, value)
+        super(DelayedDoubleSpinBox, self).setValue(value)
+
+class FixedWidthVerticalToolBar(QtWidgets.QWidget):
+    """Like a vertical QToolBar but having a fixed width. I did not manage to
+    get a QToolBar to have a fixed width. That's the only reason this class
+    exists."""
+    def __init__(self, parent=None):
+        super(FixedWidthVerticalToolBar, self).__init__(parent)
+        self.setLayout(QtWidgets.QVBoxLayout())
+        self.layout().setContentsMargins(0, 0, 0, 0)
+        self.layout().addStretch(1)
+
+    def addAction(self, action):
+        super(FixedWidthVerticalToolBar, self).addAction(action)
+        b = QtWidgets.QToolButton()
+        b.setDefaultAction(action)
+
+        self.layout().takeAt(self.layout().count()-1)
+        self.layout().addWidget(b, 0, Qt.AlignHCenter)
+        self.layout().addStretch(1)
+        self.setFixedWidth(self.sizeHint().width())
+
+class SimpleToolBar(QtWidgets.QWidget):
+    def __init__(self, orientation=Qt.Horizontal, parent=None):
+        super(SimpleToolBar, self).__init__(parent)
+        self.orientation = orientation
+        if orientation == Qt.Horizontal:
+            self.setLayout(QtWidgets.QHBoxLayout())
+        else:
+            self.setLayout(QtWidgets.QVBoxLayout())
+
+        self.layout().setSpacing(2)
+        self.layout().setContentsMargins(0, 0, 0, 0)
+        self.layout().addStretch(1)
+
+    # Adds the action to the widget, creates a toolbutton linked to the action,
+    # adds the toolbutton to the layout.
+    # Returns the button created for the action.
+    def addAction(self, action) -> QtWidgets.QToolButton:
+        super(SimpleToolBar, self).addAction(action)
+        b = QtWidgets.QToolButton()
+        b.setDefaultAction(action)
+        self.addWidget(b)
+        return b
+
+    def addWidget(self, widget):
+        # Remove the stretch from the last position in the layout.
+        self.layout().takeAt(self.layout().count()-1)
+        self.layout().addWidget(widget)
+        # Re-add the stretch as the last element in the layout.
+        self.layout().addStretch(1)
+        if self.orientation == Qt.Vertical:
+            self.setFixedWidth(self.sizeHint().width())
+
+def make_apply_common_button_layout(input_spinbox, tooltip, on_clicked):
+
+    # Wrapper to invoke the clicked handler without the boolean arg that's
+    # passed from QPushButton.clicked().
+    def _on_clicked():
+        on_clicked()
+
+    button = QtWidgets.QPushButton(clicked=_on_clicked)
+    button.setIcon(QtGui.QIcon(":/arrow-bottom.png"))
+    button.setMaximumHeight(input_spinbox.sizeHint().height())
+    button.setMaximumWidth(16)
+    button.setToolTip(tooltip)
+
+    layout = QtWidgets.QHBoxLayout()
+    layout.addWidget(input_spinbox)
+    layout.addWidget(button)
+    layout.setContentsMargins(0, 0, 0, 0)
+    layout.setSpacing(1)
+
+    return (layout, button)
+
+def make_icon(source):
+    return QtGui.QIcon(QtGui.QPixmap(source))
+
+def make_standard_icon(icon, option=None, widget=None):
+    return QtWidgets.QApplication.instance().style().standardIcon(icon, option, widget)
+
+class ReadOnlyCheckBox(QtWidgets.QCheckBox):
+    # Note: keyPressEvent and keyReleaseEvent do not need to be overriden
+    # because FocusPolicy is set to NoFocus
+
+    def __init__(self, *args, **kwargs):
+        super(ReadOnlyCheckBox, self).__init__(*args, **kwargs)
+        self.setFocusPolicy(Qt.NoFocus)
+
+    def mousePressEvent(self, event):
+        event.ignore()
+
+    def mouseReleaseEvent(self, event):
+        event.ignore()